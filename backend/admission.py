@@ -0,0 +1,297 @@
+"""
+Admission control for the expensive endpoints.
+
+Each expensive stage runs a limited number of requests at once and keeps a
+bounded queue of the ones waiting for a slot:
+
+- extract: OCR and entity extraction of a document, which run together in
+  one worker job
+- pdf: rendering filled forms to PDF
+
+A request that finds its stage's queue full is refused at once with 503
+and a Retry-After estimate, instead of joining a backlog that would time
+out anyway. Each client is also limited to a steady request rate with a
+token bucket, and is answered 429 with Retry-After when it sends more.
+
+Queue depth, slots in use and wait time are exported as metrics (see
+observability) and reported by stats().
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+from fastapi import HTTPException
+from job_queue import OCR_WORKERS
+from observability import metrics
+
+# Extractions running at once; more than the worker processes only queues work in the pool
+EXTRACT_MAX_CONCURRENT = int(os.environ.get("EXTRACT_MAX_CONCURRENT", str(max(1, OCR_WORKERS))))
+# Extractions waiting for a slot before new ones are refused
+EXTRACT_MAX_QUEUED = int(os.environ.get("EXTRACT_MAX_QUEUED", str(4 * EXTRACT_MAX_CONCURRENT)))
+PDF_MAX_CONCURRENT = int(os.environ.get("PDF_MAX_CONCURRENT", "4"))
+PDF_MAX_QUEUED = int(os.environ.get("PDF_MAX_QUEUED", "32"))
+
+# Requests per second each client may send to the expensive endpoints, with
+# bursts of up to RATE_LIMIT_BURST requests. 0 disables the limit.
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", "2"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "20"))
+# Header identifying the client behind a reverse proxy, e.g. X-Forwarded-For;
+# by default the client is the address the connection comes from
+RATE_LIMIT_CLIENT_HEADER = os.environ.get("RATE_LIMIT_CLIENT_HEADER", "")
+# Clients whose buckets are remembered; the least recently seen are forgotten first
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_WAIT_SECONDS = metrics.histogram("admission_wait_seconds", "Time admitted requests waited for a slot",
+                                           ["stage"])
+ADMISSION_REJECTED = metrics.counter("admission_rejected_total", "Requests refused because a stage's queue was full",
+                                     ["stage"])
+RATE_LIMITED = metrics.counter("rate_limited_total", "Requests refused by the per-client rate limit", ["route"])
+
+
+class Admission:
+    """
+    A request's place in a stage: queued when admitted, waiting and then
+    holding a slot inside ``async with``, and done once the block exits
+    """
+
+    def __init__(self, limiter: "StageLimiter"):
+        self.limiter = limiter
+        self.state = "queued"
+        self.started = 0.0
+
+    async def __aenter__(self) -> "Admission":
+        await self.limiter._acquire(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.limiter._release(self)
+
+    def cancel(self):
+        """
+        Give up a place that was never used, e.g. when the request failed before running
+
+        Does nothing once ``async with`` has been entered; the place is then
+        given up when the block exits.
+        """
+        if self.state == "queued":
+            self.limiter._dequeue(self)
+
+
+class StageLimiter:
+    """
+    Concurrency limit and bounded wait queue of one expensive stage
+
+    Not thread-safe; used from the event loop only.
+    """
+
+    def __init__(self, stage: str, max_concurrent: int, max_queued: int):
+        self.stage = stage
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Futures of the requests waiting for a slot, first come first served
+        self.waiters: Deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held, for Retry-After
+        self.average_hold_seconds = 1.0
+
+    def admit(self) -> Admission:
+        """
+        Take a place in the stage, refusing the request if the queue is full
+
+        Returns:
+            Admission to enter with ``async with`` when the work starts
+
+        Raises:
+            HTTPException: 503 with Retry-After if no place is left
+        """
+        if self.running + self.queued >= self.max_concurrent + self.max_queued:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc(self.stage)
+            retry_after = self.retry_after()
+            logger.warning("Refused %s request: %d running, %d queued", self.stage, self.running, self.queued)
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy: too many {self.stage} requests waiting. Retry in {retry_after} seconds",
+                headers={"Retry-After": str(retry_after)},
+            )
+        self.queued += 1
+        self.admitted += 1
+        return Admission(self)
+
+    def admit_many(self, count: int) -> List[Admission]:
+        """
+        Take places for several pieces of work at once, refusing all of them
+        if the queue cannot hold them all
+
+        Raises:
+            HTTPException: 503 with Retry-After if not enough places are left
+        """
+        admissions: List[Admission] = []
+        try:
+            for _ in range(count):
+                admissions.append(self.admit())
+        except HTTPException:
+            for admission in admissions:
+                admission.cancel()
+            raise
+        return admissions
+
+    def retry_after(self) -> int:
+        """Seconds until a place is likely to free up, from the average slot hold time"""
+        waves = (self.queued + 1) / self.max_concurrent
+        return max(1, math.ceil(self.average_hold_seconds * waves))
+
+    async def _acquire(self, admission: Admission):
+        if admission.state != "queued":
+            raise RuntimeError(f"Cannot enter a {self.stage} admission that is {admission.state}")
+        admission.state = "waiting"
+        start = time.perf_counter()
+        if self.running < self.max_concurrent and not self.waiters:
+            self.running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                # The releasing request hands its slot over, so running is already counted
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.running -= 1
+                    self._wake_next()
+                else:
+                    self.waiters.remove(waiter)
+                self._dequeue(admission)
+                raise
+        self._dequeue(admission, "running")
+        admission.started = time.perf_counter()
+        ADMISSION_WAIT_SECONDS.observe(admission.started - start, self.stage)
+
+    def _release(self, admission: Admission):
+        if admission.state != "running":
+            return
+        admission.state = "done"
+        held = time.perf_counter() - admission.started
+        self.average_hold_seconds += 0.1 * (held - self.average_hold_seconds)
+        self.running -= 1
+        self._wake_next()
+
+    def _wake_next(self):
+        while self.waiters and self.running < self.max_concurrent:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.running += 1
+                waiter.set_result(None)
+
+    def _dequeue(self, admission: Admission, state: str = "done"):
+        """Take an admission out of the queue, counting it only once whatever the path"""
+        if admission.state not in ("queued", "waiting"):
+            return
+        admission.state = state
+        self.queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "average_hold_seconds": round(self.average_hold_seconds, 3),
+        }
+
+
+class ClientRateLimiter:
+    """
+    Token bucket per client: each request takes a token, and tokens refill
+    at a steady rate up to the burst size
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT_PER_SECOND, burst: int = RATE_LIMIT_BURST,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        # Client -> (tokens, time of the last refill), least recently seen first
+        self.buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, client: str) -> Optional[int]:
+        """
+        Take a token from a client's bucket
+
+        Returns:
+            None if the request may go ahead, otherwise the seconds until
+            the client has a token again
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        tokens, last = self.buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        if allowed:
+            return None
+        self.limited += 1
+        return max(1, math.ceil((1 - tokens) / self.rate))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "per_second": self.rate,
+            "burst": self.burst,
+            "clients": len(self.buckets),
+            "limited": self.limited,
+        }
+
+
+def client_key(headers, client_host: Optional[str]) -> str:
+    """Identify the client of a request, for the rate limit"""
+    if RATE_LIMIT_CLIENT_HEADER:
+        value = headers.get(RATE_LIMIT_CLIENT_HEADER)
+        if value:
+            # X-Forwarded-For lists the original client first
+            return value.split(",")[0].strip()
+    return client_host or "unknown"
+
+
+extract_limiter = StageLimiter("extract", EXTRACT_MAX_CONCURRENT, EXTRACT_MAX_QUEUED)
+pdf_limiter = StageLimiter("pdf", PDF_MAX_CONCURRENT, PDF_MAX_QUEUED)
+rate_limiter = ClientRateLimiter()
+
+LIMITERS = {limiter.stage: limiter for limiter in (extract_limiter, pdf_limiter)}
+
+
+def stats() -> Dict[str, Any]:
+    """Slots in use, queue depth and counters of every stage, and the rate limit"""
+    return {
+        "stages": {stage: limiter.stats() for stage, limiter in LIMITERS.items()},
+        "rate_limit": rate_limiter.stats(),
+    }
+
+
+def _collect_admission():
+    yield ("admission_running", "gauge", "Requests holding a slot of an expensive stage", ["stage"],
+           [((stage,), limiter.running) for stage, limiter in LIMITERS.items()])
+    yield ("admission_queue_depth", "gauge", "Admitted requests waiting for a slot of an expensive stage", ["stage"],
+           [((stage,), limiter.queued) for stage, limiter in LIMITERS.items()])
+
+
+metrics.add_collector(_collect_admission)
@@ -0,0 +1,96 @@
+"""
+Benchmark for the rule-based entity extractors.
+
+Times per-document extraction over a set of representative OCR outputs.
+Run from the backend directory:
+
+    python benchmarks/bench_entity_extraction.py [--repeat N] [--module NAME]
+
+--module selects the module providing the extract_* functions, so another
+implementation (for example an older revision of the extractors saved under
+a different name) can be timed on the same documents.
+"""
+import argparse
+import importlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Representative OCR output, as produced by clean_extracted_text
+SAMPLE_DOCUMENTS = {
+    "aadhaar": (
+        "Government of India Unique Identification Authority of India Name: Ravi Kumar Sharma "
+        "DOB: 15-08-1985 Male Father's Name: Mohan Lal Sharma Address: 12, MG Road, Shivaji Nagar, "
+        "Pune, Maharashtra 411005 1234 5678 9012 Aadhaar - Aam Aadmi ka Adhikar"
+    ),
+    "pan": (
+        "INCOME TAX DEPARTMENT GOVT. OF INDIA Permanent Account Number Card ABCDE1234F "
+        "Name RAHUL VERMA Father's Name SURESH VERMA Date of Birth 01/01/1990 Signature"
+    ),
+    "voter": (
+        "ELECTION COMMISSION OF INDIA IDENTITY CARD ABC1234567 Elector's Name: Sita Devi "
+        "Husband's Name: Ram Lal Sex: Female Date of Birth: 12-05-1978 Address: House No 42, "
+        "Sector 15, Noida, Uttar Pradesh 201301"
+    ),
+    "freeform": (
+        "To whom it may concern. This is to certify that the applicant resides at the address "
+        "mentioned below and is known to the undersigned for several years. " * 12
+        + "Applicant Name: Anita Rao Guardian: K Rao Place: Mysore Karnataka 570001 Date 03-03-2001"
+    ),
+}
+
+EXTRACTORS = [
+    "extract_name",
+    "extract_date_of_birth",
+    "extract_gender",
+    "extract_address",
+    "extract_aadhaar_number",
+    "extract_pan_number",
+    "extract_voter_id",
+    "extract_parent_name",
+]
+
+
+def extract_all(module, text: str) -> dict:
+    """Run every extractor on a document the way extract_entities_from_text does"""
+    clean_text = text.lower()
+    scan_fields = getattr(module, "scan_fields", None)
+    if scan_fields is None:
+        return {name: getattr(module, name)(clean_text) for name in EXTRACTORS}
+    fields = scan_fields(clean_text)
+    results = {}
+    for name in EXTRACTORS:
+        extractor = getattr(module, name)
+        if name in ("extract_gender", "extract_address"):
+            results[name] = extractor(clean_text)
+        else:
+            results[name] = extractor(clean_text, fields)
+    return results
+
+
+def run(module_name: str, repeat: int):
+    module = importlib.import_module(module_name)
+    print(f"Module: {module_name}, {repeat} runs per document")
+    print(f"{'document':<10} {'chars':>6} {'mean us':>10} {'p50 us':>10} {'p95 us':>10}")
+    for doc_name, text in SAMPLE_DOCUMENTS.items():
+        extract_all(module, text)  # warm up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extract_all(module, text)
+            samples.append((time.perf_counter() - start) * 1e6)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{doc_name:<10} {len(text):>6} {statistics.mean(samples):>10.1f} "
+              f"{statistics.median(samples):>10.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rule-based entity extraction")
+    parser.add_argument("--repeat", type=int, default=200, help="Runs per document")
+    parser.add_argument("--module", default="entity_extraction", help="Module providing the extractors")
+    args = parser.parse_args()
+    run(args.module, args.repeat)
@@ -0,0 +1,76 @@
+"""
+Benchmark for mapping extracted entities to form fields.
+
+Maps many synthetic entity sets, with a varying subset of entities present,
+to every form type and reports the time per mapping. Run from the backend
+directory:
+
+    python benchmarks/bench_form_mapping.py [--sets N] [--repeat N] [--module NAME]
+
+--module selects the module providing map_entities_to_form, so another
+implementation (for example an older revision saved under a different name)
+can be timed on the same entity sets.
+"""
+import argparse
+import importlib
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORM_TYPES = ["income_certificate", "birth_certificate", "ration_card", "unknown_form"]
+
+SAMPLE_VALUES = {
+    "name": ["Ravi Kumar Sharma", "Sita Devi", "Rahul Verma", "Anita Rao"],
+    "parent_name": ["Mohan Lal Sharma", "Ram Lal", "Suresh Verma", "K Rao"],
+    "dob": ["15-08-1985", "12-05-1978", "01/01/1990", "03-03-2001"],
+    "gender": ["Male", "Female"],
+    "address": ["12, MG Road, Shivaji Nagar, Pune, Maharashtra 411005",
+                "House No 42, Sector 15, Noida, Uttar Pradesh 201301"],
+    "aadhaar": ["1234 5678 9012", "2345 6789 0123"],
+    "pan": ["ABCDE1234F"],
+    "voter_id": ["ABC1234567"],
+}
+
+
+def make_entity_sets(count: int, seed: int = 7):
+    """Entity sets as produced by extraction, each missing some entities"""
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        entities = {}
+        for name, values in SAMPLE_VALUES.items():
+            if rng.random() < 0.75:
+                entities[name] = {"value": rng.choice(values), "confidence": round(rng.uniform(0.5, 1.0), 2)}
+        sets.append(entities)
+    return sets
+
+
+def run(module_name: str, sets: int, repeat: int):
+    module = importlib.import_module(module_name)
+    entity_sets = make_entity_sets(sets)
+    print(f"Module: {module_name}, {sets} entity sets, {repeat} runs")
+    print(f"{'form':<20} {'mean us':>10} {'p50 us':>10} {'p95 us':>10}")
+    for form_type in FORM_TYPES:
+        module.map_entities_to_form(entity_sets[0], form_type)  # warm up, compiles templates
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for entities in entity_sets:
+                module.map_entities_to_form(entities, form_type)
+            samples.append((time.perf_counter() - start) / len(entity_sets) * 1e6)
+        samples.sort()
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        print(f"{form_type:<20} {statistics.mean(samples):>10.2f} {statistics.median(samples):>10.2f} {p95:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark form mapping")
+    parser.add_argument("--sets", type=int, default=10000, help="Number of entity sets")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over all entity sets")
+    parser.add_argument("--module", default="form_mapping", help="Module providing map_entities_to_form")
+    args = parser.parse_args()
+    run(args.module, args.sets, args.repeat)
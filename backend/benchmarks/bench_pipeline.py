@@ -0,0 +1,251 @@
+"""
+Stage-level benchmark of the document pipeline on a synthetic corpus.
+
+Times each stage separately on every document of a corpus rendered by
+synthetic_corpus.py:
+
+- ocr: extract_text_from_image, with the OCR cache disabled
+- entities: extract_entities_from_text on the OCR text
+- mapping: map_entities_to_form, for every form type
+- pdf: generate_pdf_form into memory, for every form type
+
+and writes p50/p95 latencies per stage, overall and per document type,
+resolution and noise level, to a JSON file. Run from the backend directory:
+
+    python benchmarks/bench_pipeline.py [--corpus DIR] [--output results.json] [--compare baseline.json]
+
+Without --corpus, a corpus is generated into a temporary directory, which
+is kept so later runs can reuse it (see synthetic_corpus.py for the options
+selecting it). --compare prints the change in p50 and p95 of each stage
+against an earlier results file.
+--stages skips stages, for example the OCR stage where no OCR engine is
+installed; later stages then read the text the document was rendered with.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_corpus import add_corpus_arguments, generate_corpus, load_corpus, parse_choices  # noqa: E402
+
+STAGES = ["ocr", "entities", "mapping", "pdf"]
+
+RESULTS_VERSION = 1
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of samples sorted in ascending order"""
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def summarize(samples: List[float], errors: int = 0) -> Dict[str, Any]:
+    """Latency statistics, in milliseconds, of a list of samples in seconds"""
+    summary: Dict[str, Any] = {"count": len(samples), "errors": errors}
+    if samples:
+        ordered = sorted(sample * 1000 for sample in samples)
+        summary.update({
+            "mean_ms": round(sum(ordered) / len(ordered), 3),
+            "p50_ms": round(percentile(ordered, 0.50), 3),
+            "p95_ms": round(percentile(ordered, 0.95), 3),
+            "max_ms": round(ordered[-1], 3),
+        })
+    return summary
+
+
+def git_commit() -> Optional[str]:
+    """Commit the benchmarked code is at, if it is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """Collects the duration of every call of each stage, grouped by document attributes"""
+
+    def __init__(self):
+        self.samples: Dict[str, Dict[str, List[float]]] = {stage: {} for stage in STAGES}
+        self.errors: Dict[str, Dict[str, int]] = {stage: {} for stage in STAGES}
+
+    def time(self, stage: str, groups: List[str], function, *args):
+        """
+        Call a stage function, recording its duration under each group
+
+        Returns:
+            The function's result, or None if it raised
+        """
+        start = time.perf_counter()
+        try:
+            result = function(*args)
+        except Exception as e:
+            print(f"  {stage} failed on {groups[1]}: {e}")
+            for group in groups:
+                self.errors[stage][group] = self.errors[stage].get(group, 0) + 1
+            return None
+        elapsed = time.perf_counter() - start
+        for group in groups:
+            self.samples[stage].setdefault(group, []).append(elapsed)
+        return result
+
+    def summary(self, stage: str) -> Dict[str, Dict[str, Any]]:
+        groups = sorted(set(self.samples[stage]) | set(self.errors[stage]))
+        return {group: summarize(self.samples[stage].get(group, []), self.errors[stage].get(group, 0))
+                for group in groups}
+
+
+def run_document(timer: StageTimer, corpus_dir: str, document: Dict[str, Any], stages: List[str],
+                 form_types: List[str]):
+    """Run one document through every selected stage, each fed the previous stage's output"""
+    from ocr_utils import extract_text_from_image, extract_entities_from_text
+    from form_mapping import map_entities_to_form
+    from pdf_generator import generate_pdf_form
+
+    document_type = document["document_type"]
+    # Free-form documents have no type of their own, like an upload without one
+    ocr_type = None if document_type == "freeform" else document_type
+    groups = ["all", document["file"], f"type:{document_type}",
+              f"resolution:{document['resolution']}", f"noise:{document['noise']}"]
+
+    text = None
+    if "ocr" in stages:
+        text = timer.time("ocr", groups, extract_text_from_image,
+                          os.path.join(corpus_dir, document["file"]), None, ocr_type)
+    if not text:
+        text = document["text"]
+
+    entities = None
+    if "entities" in stages:
+        entities = timer.time("entities", groups, extract_entities_from_text, text, ocr_type)
+    if entities is None:
+        entities = {name: {"value": value, "confidence": 1.0} for name, value in document["truth"].items()}
+
+    for form_type in form_types:
+        form_data = None
+        if "mapping" in stages:
+            mapped = timer.time("mapping", groups, map_entities_to_form, entities, form_type)
+            form_data = mapped[0] if mapped else None
+        if form_data is None:
+            form_data, _ = map_entities_to_form(entities, form_type)
+        if "pdf" in stages:
+            timer.time("pdf", groups, generate_pdf_form, form_data, form_type, io.BytesIO())
+
+
+def run(corpus_dir: str, documents: List[Dict[str, Any]], stages: List[str], repeat: int) -> Dict[str, Any]:
+    """Benchmark every document, returning the results file contents"""
+    from ocr_cache import ocr_cache
+    from ocr_utils import OCR_CONFIG
+    from template_registry import template_registry
+
+    # Every run must do the OCR work, not read the previous run's result
+    ocr_cache.enabled = False
+    form_types = sorted(template_registry.all())
+
+    print(f"Corpus: {corpus_dir}, {len(documents)} documents, stages: {', '.join(stages)}, {repeat} run(s)")
+    # Untimed pass over one document, so model loading is not counted
+    run_document(StageTimer(), corpus_dir, documents[0], stages, form_types)
+
+    timer = StageTimer()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for document in documents:
+            run_document(timer, corpus_dir, document, stages, form_types)
+    total_seconds = time.perf_counter() - started
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "ocr_config": OCR_CONFIG,
+        },
+        "corpus": {
+            "directory": corpus_dir,
+            "documents": len(documents),
+            "document_types": sorted({document["document_type"] for document in documents}),
+            "resolutions": sorted({document["resolution"] for document in documents}),
+            "noise_levels": sorted({document["noise"] for document in documents}),
+        },
+        "form_types": form_types,
+        "repeat": repeat,
+        "total_seconds": round(total_seconds, 3),
+        "stages": {},
+        "documents": {},
+    }
+    for stage in stages:
+        summary = timer.summary(stage)
+        files = {document["file"] for document in documents}
+        results["stages"][stage] = {
+            "overall": summary.get("all", summarize([])),
+            "by_group": {group: stats for group, stats in summary.items() if group != "all" and group not in files},
+        }
+        for file_name in files:
+            if file_name in summary:
+                results["documents"].setdefault(file_name, {})[stage] = summary[file_name]
+    return results
+
+
+def print_results(results: Dict[str, Any]):
+    print(f"{'stage':<10} {'group':<20} {'count':>6} {'errors':>6} {'p50 ms':>10} {'p95 ms':>10}")
+    for stage, stage_results in results["stages"].items():
+        rows = [("all", stage_results["overall"])] + sorted(stage_results["by_group"].items())
+        for group, stats in rows:
+            print(f"{stage:<10} {group:<20} {stats['count']:>6} {stats['errors']:>6} "
+                  f"{stats.get('p50_ms', float('nan')):>10.2f} {stats.get('p95_ms', float('nan')):>10.2f}")
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the overall p50 and p95 of each stage next to a baseline's"""
+    print(f"\nAgainst baseline from {baseline.get('created')} (commit {baseline['environment'].get('git_commit')})")
+    print(f"{'stage':<10} {'base p50':>10} {'p50':>10} {'change':>8} {'base p95':>10} {'p95':>10} {'change':>8}")
+    for stage, stage_results in results["stages"].items():
+        base = baseline["stages"].get(stage, {}).get("overall", {})
+        current = stage_results["overall"]
+        row = f"{stage:<10}"
+        for key in ("p50_ms", "p95_ms"):
+            if key in base and key in current and base[key] > 0:
+                change = f"{(current[key] / base[key] - 1) * 100:+.0f}%"
+                row += f" {base[key]:>10.2f} {current[key]:>10.2f} {change:>8}"
+            else:
+                row += f" {'-':>10} {current.get(key, float('nan')):>10.2f} {'-':>8}"
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on a synthetic corpus")
+    parser.add_argument("--corpus", help="Directory of a corpus from synthetic_corpus.py; generated if missing")
+    parser.add_argument("--stages", type=lambda value: parse_choices(value, STAGES), default=STAGES,
+                        help="Comma-separated stages to time: " + ", ".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus")
+    parser.add_argument("--output", default="bench_pipeline_results.json", help="File to write the results to")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus or tempfile.mkdtemp(prefix="synthetic_corpus_")
+    documents = load_corpus(corpus_dir)
+    if documents is None:
+        print(f"Generating corpus in {corpus_dir}")
+        documents = generate_corpus(corpus_dir, args.per_combination, args.types,
+                                    args.resolutions, args.noise, args.seed)
+
+    results = run(corpus_dir, documents, args.stages, args.repeat)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
@@ -0,0 +1,90 @@
+"""
+Benchmark for the image preprocessing stage.
+
+Times every preprocessing step on a synthetic phone-sized photo of a skewed
+document, or on the given image files. With --ocr, also runs the OCR
+engines with and without preprocessing and prints each engine's time and
+score, to weigh latency against accuracy. Run from the backend directory:
+
+    python benchmarks/bench_preprocessing.py [IMAGE ...] [--steps resize,grayscale,deskew] [--ocr]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont  # noqa: E402
+
+from image_preprocessing import PREPROCESS_STEPS, preprocess_image  # noqa: E402
+
+SAMPLE_LINES = [
+    "GOVERNMENT OF INDIA",
+    "Name: Ravi Kumar Sharma",
+    "DOB: 15-08-1985   Gender: Male",
+    "Father's Name: Mohan Lal Sharma",
+    "Address: 12, MG Road, Shivaji Nagar, Pune, Maharashtra 411005",
+    "1234 5678 9012",
+]
+
+
+def make_sample_photo(path: str, size=(4000, 3000), skew: float = 3.0):
+    """Write a 12 megapixel JPEG of a slightly rotated document"""
+    image = Image.new("RGB", size, (236, 232, 224))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=size[0] // 40)
+    for index, line in enumerate(SAMPLE_LINES):
+        draw.text((size[0] // 10, size[1] // 8 + index * size[1] // 9), line, fill=(30, 30, 30), font=font)
+    image.rotate(skew, expand=False, fillcolor=(236, 232, 224)).save(path, quality=90)
+
+
+def time_steps(path: str, steps, repeat: int):
+    reports = [preprocess_image(path, steps)[1] for _ in range(repeat)]
+    print(f"{os.path.basename(path)}: {reports[0]['input_size']} -> {reports[0]['output_size']}, "
+          f"skew {reports[0]['skew_degrees']} degrees")
+    for step in reports[0]["timings"]:
+        samples = [report["timings"][step] * 1000 for report in reports]
+        print(f"  {step:<10} mean {statistics.mean(samples):>8.1f} ms   max {max(samples):>8.1f} ms")
+    total = [report["seconds"] * 1000 for report in reports]
+    print(f"  {'total':<10} mean {statistics.mean(total):>8.1f} ms")
+
+
+def compare_ocr(path: str, steps):
+    from ocr_utils import OCR_ENGINES
+    from ocr_orchestrator import score_result
+
+    image, _ = preprocess_image(path, steps)
+    for label, source in (("original", path), ("preprocessed", image)):
+        for name, engine in OCR_ENGINES.items():
+            start = time.perf_counter()
+            try:
+                output = engine(source)
+            except Exception as e:
+                print(f"  {label:<13} {name:<10} failed: {e}")
+                continue
+            seconds = time.perf_counter() - start
+            score = score_result(output["text"], output["confidence"])
+            print(f"  {label:<13} {name:<10} {seconds:>7.2f} s   score {score:.2f}   {len(output['text'])} chars")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing")
+    parser.add_argument("images", nargs="*", help="Images to preprocess (default: a synthetic photo)")
+    parser.add_argument("--steps", default=",".join(PREPROCESS_STEPS), help="Comma-separated steps to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per image")
+    parser.add_argument("--ocr", action="store_true", help="Also compare OCR with and without preprocessing")
+    args = parser.parse_args()
+
+    steps = [step for step in args.steps.split(",") if step]
+    paths = args.images
+    if not paths:
+        sample = os.path.join(tempfile.gettempdir(), "bench_preprocessing_sample.jpg")
+        make_sample_photo(sample)
+        paths = [sample]
+    for path in paths:
+        time_steps(path, steps, args.repeat)
+        if args.ocr:
+            compare_ocr(path, steps)
@@ -0,0 +1,71 @@
+"""
+Benchmark for server startup and model loading.
+
+Each measurement runs in a fresh interpreter, so module and model caches of
+earlier runs do not hide the cold-start cost. Reports the time to import the
+API (what uvicorn pays before it can answer /health), the time to import the
+OCR module, and the load and warm-up time of every registered model.
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py [--repeat N] [--skip-models]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import json, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+MODELS_SNIPPET = """
+import json, time
+import ocr_utils
+from model_registry import model_registry
+start = time.perf_counter()
+status = model_registry.warm_up()
+print(json.dumps({"seconds": time.perf_counter() - start, "models": status}))
+"""
+
+
+def run_snippet(snippet: str) -> dict:
+    """Run a snippet in a fresh interpreter and parse the JSON it prints last"""
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=BACKEND_DIR, check=True,
+        capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_import(module: str, repeat: int):
+    samples = [run_snippet(IMPORT_SNIPPET.format(module=module))["seconds"] for _ in range(repeat)]
+    print(f"import {module:<10} mean {statistics.mean(samples) * 1000:>9.1f} ms   "
+          f"min {min(samples) * 1000:>9.1f} ms")
+
+
+def time_models():
+    result = run_snippet(MODELS_SNIPPET)
+    print(f"model warm-up total {result['seconds']:>8.2f} s")
+    for name, status in result["models"].items():
+        load = status["load_seconds"] or 0.0
+        warm = status.get("warm_up_seconds") or 0.0
+        state = "available" if status["available"] else f"unavailable ({status['error']})"
+        print(f"  {name:<10} load {load:>7.2f} s   warm-up {warm:>7.2f} s   {state}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark server startup and model loading")
+    parser.add_argument("--repeat", type=int, default=5, help="Cold imports per module")
+    parser.add_argument("--skip-models", action="store_true", help="Do not load the models")
+    args = parser.parse_args()
+    time_import("main", args.repeat)
+    time_import("ocr_utils", args.repeat)
+    if not args.skip_models:
+        time_models()
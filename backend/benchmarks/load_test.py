@@ -0,0 +1,341 @@
+"""
+End-to-end load test of the upload, extract, fill-form and PDF flow.
+
+Each simulated citizen takes a document through the steps of the web app
+on a running server:
+
+- POST /upload with a document of a synthetic corpus (see synthetic_corpus.py)
+- POST /extract with the document type it was rendered as
+- POST /fill-form for one form type, taken in turn from --forms
+- POST /generate-pdf with the filled form data, streaming the PDF back
+
+and writes throughput, error rate and latency percentiles per endpoint, and
+of the whole flow, to a JSON file. Start the server, then run from the
+backend directory:
+
+    python benchmarks/load_test.py [--url URL] [--corpus DIR] [--concurrency N] [--rate PER_SECOND]
+                                   [--sessions N | --duration SECONDS] [--output FILE] [--compare FILE]
+
+Without --rate, --concurrency citizens each start a new flow as soon as
+their last one finishes (closed loop), which finds the throughput of the
+server. With --rate, flows arrive at random at that average rate whether or
+not earlier ones have finished (open loop), at most --concurrency at a time;
+a flow's latency counts from its arrival, so time spent waiting for a slot
+is not hidden. Every upload gets a unique trailer after the end of the
+image, so the OCR cache does not answer repeated documents unless
+--reuse-uploads is given. Needs httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import git_commit, percentile  # noqa: E402
+from synthetic_corpus import add_corpus_arguments, generate_corpus, load_corpus  # noqa: E402
+
+ENDPOINTS = ["/upload", "/extract", "/fill-form", "/generate-pdf"]
+
+RESULTS_VERSION = 1
+
+
+class LoadRecorder:
+    """Outcome and latency of every request and flow"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {name: [] for name in ENDPOINTS + ["flow"]}
+        self.errors: Dict[str, int] = {name: 0 for name in ENDPOINTS + ["flow"]}
+        self.statuses: Dict[str, Dict[str, int]] = {name: {} for name in ENDPOINTS + ["flow"]}
+
+    def record(self, name: str, seconds: float, status: str, ok: bool):
+        statuses = self.statuses[name]
+        statuses[status] = statuses.get(status, 0) + 1
+        if ok:
+            self.samples[name].append(seconds)
+        else:
+            self.errors[name] += 1
+
+    def summary(self, name: str, wall_seconds: float) -> Dict[str, Any]:
+        """Throughput, error rate and latency statistics, in milliseconds, of one endpoint"""
+        samples = self.samples[name]
+        total = len(samples) + self.errors[name]
+        summary: Dict[str, Any] = {
+            "requests": total,
+            "errors": self.errors[name],
+            "error_rate": round(self.errors[name] / total, 4) if total else 0.0,
+            "throughput_per_second": round(len(samples) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+            "statuses": dict(sorted(self.statuses[name].items())),
+        }
+        if samples:
+            ordered = sorted(sample * 1000 for sample in samples)
+            summary.update({
+                "mean_ms": round(sum(ordered) / len(ordered), 3),
+                "p50_ms": round(percentile(ordered, 0.50), 3),
+                "p90_ms": round(percentile(ordered, 0.90), 3),
+                "p95_ms": round(percentile(ordered, 0.95), 3),
+                "p99_ms": round(percentile(ordered, 0.99), 3),
+                "max_ms": round(ordered[-1], 3),
+            })
+        return summary
+
+
+class Citizen:
+    """Runs flows through the server, taking documents and form types in turn"""
+
+    def __init__(self, client: httpx.AsyncClient, documents: List[Dict[str, Any]], files: Dict[str, bytes],
+                 form_types: List[str], unique_uploads: bool):
+        self.client = client
+        self.documents = documents
+        self.files = files
+        self.form_types = form_types
+        self.unique_uploads = unique_uploads
+        self.flows = 0
+
+    async def request(self, recorder: LoadRecorder, endpoint: str, **kwargs) -> Optional[httpx.Response]:
+        """
+        Send one POST request, recording its latency and outcome
+
+        Returns:
+            The response if it succeeded, otherwise None
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(endpoint, **kwargs)
+            # Read the whole body, so a streamed PDF counts until its last byte
+            await response.aread()
+        except httpx.HTTPError as e:
+            recorder.record(endpoint, time.perf_counter() - start, type(e).__name__, False)
+            return None
+        elapsed = time.perf_counter() - start
+        ok = response.status_code < 400
+        recorder.record(endpoint, elapsed, str(response.status_code), ok)
+        return response if ok else None
+
+    async def run_flow(self, recorder: LoadRecorder, arrived_at: float):
+        """Take one document through every endpoint, stopping at the first failure"""
+        index = self.flows
+        self.flows += 1
+        document = self.documents[index % len(self.documents)]
+        form_type = self.form_types[index % len(self.form_types)]
+        content = self.files[document["file"]]
+        if self.unique_uploads:
+            # Image decoders ignore bytes after the end of the image, but the content hash does not
+            content += uuid.uuid4().bytes
+
+        completed = False
+        response = await self.request(recorder, "/upload",
+                                      files={"file": (document["file"], content, "image/jpeg")})
+        if response is not None:
+            document_id = response.json()["document_id"]
+            # Free-form documents have no type of their own
+            document_type = None if document["document_type"] == "freeform" else document["document_type"]
+            response = await self.request(recorder, "/extract",
+                                          json={"document_id": document_id, "document_type": document_type})
+        if response is not None:
+            response = await self.request(recorder, "/fill-form",
+                                          json={"document_id": document_id, "form_type": form_type})
+        if response is not None:
+            form_data = response.json()["filled_form_data"]
+            response = await self.request(recorder, "/generate-pdf",
+                                          json={"document_id": document_id, "form_type": form_type,
+                                                "form_data": form_data, "stream": True})
+            completed = response is not None
+        recorder.record("flow", time.perf_counter() - arrived_at, "ok" if completed else "failed", completed)
+
+
+async def closed_loop(citizens: List[Citizen], recorder: LoadRecorder, sessions: Optional[int],
+                      deadline: Optional[float]):
+    """Each citizen starts its next flow as soon as its last one finishes"""
+    started = 0
+
+    async def run_citizen(citizen: Citizen):
+        nonlocal started
+        while (sessions is None or started < sessions) and (deadline is None or time.perf_counter() < deadline):
+            started += 1
+            await citizen.run_flow(recorder, time.perf_counter())
+
+    await asyncio.gather(*(run_citizen(citizen) for citizen in citizens))
+
+
+async def open_loop(citizens: List[Citizen], recorder: LoadRecorder, rate: float, sessions: Optional[int],
+                    deadline: Optional[float], seed: int):
+    """Flows arrive at random at an average rate, each waiting for a free citizen"""
+    rng = random.Random(seed)
+    idle: asyncio.Queue = asyncio.Queue()
+    for citizen in citizens:
+        idle.put_nowait(citizen)
+
+    async def arrive(arrived_at: float):
+        citizen = await idle.get()
+        try:
+            await citizen.run_flow(recorder, arrived_at)
+        finally:
+            idle.put_nowait(citizen)
+
+    flows = []
+    next_arrival = time.perf_counter()
+    while (sessions is None or len(flows) < sessions) and (deadline is None or next_arrival < deadline):
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        flows.append(asyncio.create_task(arrive(next_arrival)))
+        # Poisson arrivals: exponentially distributed gaps
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*flows)
+
+
+async def run(url: str, corpus_dir: str, documents: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """Run the load test, returning the results file contents"""
+    files = {}
+    for document in documents:
+        with open(os.path.join(corpus_dir, document["file"]), "rb") as f:
+            files[document["file"]] = f.read()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        form_types = args.forms
+        if not form_types:
+            response = await client.get("/templates")
+            response.raise_for_status()
+            form_types = sorted(response.json())
+
+        def make_citizen(offset: int) -> Citizen:
+            # Offsets spread the citizens over the corpus instead of all starting on its first document
+            citizen = Citizen(client, documents, files, form_types, not args.reuse_uploads)
+            citizen.flows = offset
+            return citizen
+
+        print(f"Server: {url}, corpus: {corpus_dir} ({len(documents)} documents), forms: {', '.join(form_types)}")
+        # Untimed flows, so model loading and first-request work are not counted
+        warm_up = LoadRecorder()
+        for index in range(args.warmup):
+            await make_citizen(index).run_flow(warm_up, time.perf_counter())
+        if args.warmup and warm_up.errors["flow"] == args.warmup:
+            failed = {endpoint: statuses for endpoint, statuses in warm_up.statuses.items() if statuses}
+            raise SystemExit(f"Every warm-up flow failed: {failed}")
+
+        citizens = [make_citizen(index * len(documents) // args.concurrency) for index in range(args.concurrency)]
+        recorder = LoadRecorder()
+        mode = f"open loop at {args.rate}/s" if args.rate else "closed loop"
+        print(f"Running {mode} with {args.concurrency} concurrent citizens")
+        started = time.perf_counter()
+        deadline = started + args.duration if args.duration else None
+        if args.rate:
+            await open_loop(citizens, recorder, args.rate, args.sessions, deadline, args.seed)
+        else:
+            await closed_loop(citizens, recorder, args.sessions, deadline)
+        wall_seconds = time.perf_counter() - started
+
+    return {
+        "version": RESULTS_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "url": url,
+        },
+        "load": {
+            "mode": "open" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "rate_per_second": args.rate,
+            "sessions": args.sessions,
+            "duration_seconds": args.duration,
+            "unique_uploads": not args.reuse_uploads,
+            "form_types": form_types,
+        },
+        "corpus": {
+            "directory": corpus_dir,
+            "documents": len(documents),
+            "document_types": sorted({document["document_type"] for document in documents}),
+            "resolutions": sorted({document["resolution"] for document in documents}),
+            "noise_levels": sorted({document["noise"] for document in documents}),
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "flow": recorder.summary("flow", wall_seconds),
+        "endpoints": {endpoint: recorder.summary(endpoint, wall_seconds) for endpoint in ENDPOINTS},
+    }
+
+
+def print_results(results: Dict[str, Any]):
+    print(f"{'endpoint':<14} {'requests':>8} {'errors':>8} {'per s':>8} "
+          f"{'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    rows = list(results["endpoints"].items()) + [("flow", results["flow"])]
+    for name, stats in rows:
+        print(f"{name:<14} {stats['requests']:>8} {stats['error_rate']:>8.1%} {stats['throughput_per_second']:>8.2f} "
+              f"{stats.get('p50_ms', float('nan')):>10.1f} {stats.get('p95_ms', float('nan')):>10.1f} "
+              f"{stats.get('p99_ms', float('nan')):>10.1f}")
+    for name, stats in rows:
+        if stats["errors"]:
+            print(f"{name} responses: " + ", ".join(f"{status} x{count}" for status, count in stats["statuses"].items()))
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print the throughput and p50, p95 and p99 of each endpoint next to a baseline's"""
+    print(f"\nAgainst baseline from {baseline.get('created')} (commit {baseline['environment'].get('git_commit')}, "
+          f"{baseline['load']['mode']} loop, concurrency {baseline['load']['concurrency']})")
+    print(f"{'endpoint':<14} {'per s':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}")
+    rows = list(results["endpoints"].items()) + [("flow", results["flow"])]
+    for name, current in rows:
+        base = baseline["flow"] if name == "flow" else baseline["endpoints"].get(name, {})
+        row = f"{name:<14}"
+        for key in ("throughput_per_second", "p50_ms", "p95_ms", "p99_ms"):
+            if key in base and key in current and base[key] > 0:
+                row += f" {current[key]:>9.1f} {(current[key] / base[key] - 1) * 100:>+5.0f}%"
+            else:
+                row += f" {current.get(key, float('nan')):>9.1f} {'-':>6}"
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the upload to PDF flow of a running server")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server")
+    parser.add_argument("--corpus", help="Directory of a corpus from synthetic_corpus.py; generated if missing")
+    parser.add_argument("--concurrency", type=int, default=8, help="Flows in progress at once")
+    parser.add_argument("--rate", type=float, help="Average flows started per second; closed loop if not given")
+    parser.add_argument("--sessions", type=int, help="Flows to run; 50 unless --duration is given")
+    parser.add_argument("--duration", type=float, help="Seconds to keep starting flows for")
+    parser.add_argument("--forms", type=lambda value: [name for name in value.split(",") if name],
+                        help="Comma-separated form types to fill; every template on the server by default")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed flows run first")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a request counts as failed")
+    parser.add_argument("--reuse-uploads", action="store_true",
+                        help="Upload corpus files unchanged, so repeated documents may be answered from the OCR cache")
+    parser.add_argument("--output", default="load_test_results.json", help="File to write the results to")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be positive")
+    if args.sessions is None and args.duration is None:
+        args.sessions = 50
+
+    corpus_dir = args.corpus or tempfile.mkdtemp(prefix="synthetic_corpus_")
+    documents = load_corpus(corpus_dir)
+    if documents is None:
+        print(f"Generating corpus in {corpus_dir}")
+        documents = generate_corpus(corpus_dir, args.per_combination, args.types,
+                                    args.resolutions, args.noise, args.seed)
+
+    results = asyncio.run(run(args.url.rstrip("/"), corpus_dir, documents, args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
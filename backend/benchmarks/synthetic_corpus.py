@@ -0,0 +1,300 @@
+"""
+Offline generator of synthetic identity documents for benchmarking.
+
+Renders Aadhaar, PAN and voter ID cards and free-form letters with PIL,
+filled with random but well-formed personal details, at several resolutions
+and noise levels. Cards follow the field regions of the layout templates in
+layouts/*.json, so layout OCR finds its fields, and lie on a darker
+background the way a photographed card does. Noise adds sensor grain, blur,
+a slight rotation and JPEG compression.
+
+Each document is saved with its ground truth: the values printed on it and
+the text as rendered, line by line. Run from the backend directory:
+
+    python benchmarks/synthetic_corpus.py OUTPUT_DIR [--per-combination N] [--seed N]
+
+writes the images and a corpus.json manifest to OUTPUT_DIR.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layout_ocr import load_layouts  # noqa: E402
+
+DOCUMENT_TYPES = ["aadhaar", "pan", "voter", "freeform"]
+
+# Width in pixels of the card, or of the page for free-form documents
+RESOLUTIONS = {"low": 640, "medium": 1280, "high": 2560}
+
+# sigma: standard deviation of the grain; blur: Gaussian blur radius in
+# pixels at medium resolution; rotate: largest rotation in degrees
+NOISE_LEVELS = {
+    "clean": {"sigma": 0, "blur": 0.0, "rotate": 0.0, "jpeg_quality": 95},
+    "light": {"sigma": 6, "blur": 0.6, "rotate": 0.8, "jpeg_quality": 80},
+    "heavy": {"sigma": 18, "blur": 1.2, "rotate": 2.5, "jpeg_quality": 45},
+}
+
+MANIFEST_NAME = "corpus.json"
+
+FIRST_NAMES = ["Ravi", "Sita", "Rahul", "Anita", "Suresh", "Priya", "Arjun", "Kavita", "Mohan", "Lakshmi",
+               "Vikram", "Neha", "Imran", "Fatima", "Harpreet", "Deepak", "Meena", "Gopal", "Asha", "Kiran"]
+LAST_NAMES = ["Sharma", "Verma", "Rao", "Devi", "Kumar", "Singh", "Patel", "Nair", "Iyer", "Khan",
+              "Reddy", "Das", "Gupta", "Joshi", "Mehta", "Pillai", "Yadav", "Ghosh", "Kaur", "Mishra"]
+STREETS = ["MG Road", "Station Road", "Gandhi Nagar", "Civil Lines", "Main Bazaar", "Nehru Street",
+           "Park Avenue", "Temple Road", "Lake View Colony", "Sector 15"]
+LOCALITIES = [
+    ("Shivaji Nagar", "Pune", "Maharashtra", "411005"),
+    ("Indiranagar", "Bengaluru", "Karnataka", "560038"),
+    ("Salt Lake", "Kolkata", "West Bengal", "700091"),
+    ("Anna Nagar", "Chennai", "Tamil Nadu", "600040"),
+    ("Gomti Nagar", "Lucknow", "Uttar Pradesh", "226010"),
+    ("Banjara Hills", "Hyderabad", "Telangana", "500034"),
+    ("Navrangpura", "Ahmedabad", "Gujarat", "380009"),
+    ("Kakkanad", "Kochi", "Kerala", "682030"),
+    ("Malviya Nagar", "Jaipur", "Rajasthan", "302017"),
+    ("Sector 62", "Noida", "Uttar Pradesh", "201309"),
+]
+LETTER_PARAGRAPHS = [
+    "This is to certify that the applicant named below is known to the undersigned and "
+    "has been residing at the address given below for the last several years.",
+    "The applicant has requested this letter in support of an application for a government "
+    "certificate. The particulars below were verified against the documents produced.",
+    "This letter is issued on the request of the applicant for official purposes only and "
+    "does not confer any other right.",
+]
+
+PAPER_COLOR = (246, 244, 236)
+INK_COLOR = (28, 28, 32)
+BACKGROUND_COLOR = (92, 86, 80)
+HEADERS = {
+    "aadhaar": ("GOVERNMENT OF INDIA", (255, 153, 51)),
+    "pan": ("INCOME TAX DEPARTMENT   GOVT. OF INDIA", (120, 170, 220)),
+    "voter": ("ELECTION COMMISSION OF INDIA", (200, 200, 200)),
+}
+
+
+def make_person(rng: random.Random) -> Dict[str, str]:
+    """Random personal details in the formats printed on Indian identity documents"""
+    last_name = rng.choice(LAST_NAMES)
+    gender = rng.choice(["Male", "Female"])
+    locality, city, state, pin_code = rng.choice(LOCALITIES)
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {last_name}",
+        "parent_name": f"{rng.choice(FIRST_NAMES)} {last_name}",
+        "dob": f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(1950, 2005)}",
+        "gender": gender,
+        "address": f"{rng.randint(1, 250)}, {rng.choice(STREETS)}, {locality}, {city}, {state} {pin_code}",
+        "aadhaar": " ".join(str(rng.randint(2000, 9999)) if i == 0 else f"{rng.randint(0, 9999):04d}"
+                            for i in range(3)),
+        "pan": "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3)) + "P"
+               + last_name[0] + f"{rng.randint(0, 9999):04d}" + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ"),
+        "voter_id": "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3))
+                    + f"{rng.randint(0, 9999999):07d}",
+    }
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    return ImageFont.load_default(size=max(8, int(size)))
+
+
+def render_card(document_type: str, person: Dict[str, str], layout: Dict[str, Any],
+                width: int) -> Tuple[Image.Image, List[str]]:
+    """
+    Draw an identity card with each field in its layout region
+
+    Labels go to the left of the region when there is room, above it
+    otherwise, the way the real cards print them.
+
+    Returns:
+        The card and the lines of text printed on it
+    """
+    height = int(width / layout["aspect_ratio"])
+    card = Image.new("RGB", (width, height), PAPER_COLOR)
+    draw = ImageDraw.Draw(card)
+    header, header_color = HEADERS[document_type]
+    draw.rectangle([0, 0, width, int(height * 0.12)], fill=header_color)
+    draw.text((int(width * 0.04), int(height * 0.02)), header, fill=INK_COLOR, font=_font(height * 0.07))
+    lines = [header]
+
+    for field in layout["fields"]:
+        x0, y0, x1, y1 = field["region"]
+        value = person.get(field["name"], "")
+        if document_type == "pan":
+            value = value.upper()  # PAN cards print names in capitals
+        font = _font((y1 - y0) * height * 0.65)
+        value_y = int((y0 + (y1 - y0) * 0.15) * height)
+        if field["label"]:
+            label_font = _font((y1 - y0) * height * 0.45)
+            if x0 >= 0.2:
+                draw.text((int(width * 0.03), value_y), f"{field['label']}:", fill=INK_COLOR, font=label_font)
+            else:
+                draw.text((int(x0 * width), int((y0 - 0.03) * height)), field["label"],
+                          fill=INK_COLOR, font=_font(height * 0.025))
+            lines.append(f"{field['label']}: {value}")
+        else:
+            lines.append(value)
+        draw.text((int(x0 * width), value_y), value, fill=INK_COLOR, font=font)
+    return card, lines
+
+
+def render_letter(person: Dict[str, str], width: int, rng: random.Random) -> Tuple[Image.Image, List[str]]:
+    """
+    Draw a free-form letter: paragraphs of prose followed by labelled details
+
+    Returns:
+        The page and the lines of text printed on it
+    """
+    height = int(width * 1.414)
+    page = Image.new("RGB", (width, height), PAPER_COLOR)
+    draw = ImageDraw.Draw(page)
+    font_size = width / 48
+    font = _font(font_size)
+    chars_per_line = 70
+
+    lines = ["TO WHOM IT MAY CONCERN", ""]
+    for paragraph in rng.sample(LETTER_PARAGRAPHS, len(LETTER_PARAGRAPHS)):
+        words = paragraph.split()
+        line = ""
+        for word in words:
+            if line and len(line) + 1 + len(word) > chars_per_line:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    lines.extend([
+        f"Applicant Name: {person['name']}",
+        f"Father's Name: {person['parent_name']}",
+        f"Date of Birth: {person['dob']}   Gender: {person['gender']}",
+        f"Address: {person['address']}",
+        f"Aadhaar No: {person['aadhaar']}",
+    ])
+
+    y = height * 0.06
+    for line in lines:
+        draw.text((int(width * 0.08), int(y)), line, fill=INK_COLOR, font=font)
+        y += font_size * 1.6
+    return page, lines
+
+
+def add_noise(image: Image.Image, noise: Dict[str, Any], scale: float, rng: random.Random) -> Image.Image:
+    """Rotate, blur and add grain, as a phone photo of a printed document would"""
+    if noise["rotate"]:
+        angle = rng.uniform(-noise["rotate"], noise["rotate"])
+        image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=BACKGROUND_COLOR)
+    if noise["blur"]:
+        image = image.filter(ImageFilter.GaussianBlur(noise["blur"] * scale))
+    if noise["sigma"]:
+        pixels = np.asarray(image, dtype=np.int16)
+        grain = np.random.default_rng(rng.randrange(2 ** 32)).normal(0, noise["sigma"], pixels.shape)
+        image = Image.fromarray(np.clip(pixels + grain, 0, 255).astype(np.uint8))
+    return image
+
+
+def render_document(document_type: str, person: Dict[str, str], width: int, noise: Dict[str, Any],
+                    layouts: Dict[str, Dict[str, Any]], rng: random.Random) -> Tuple[Image.Image, List[str]]:
+    """Render one document at a resolution and noise level, returning the image and its lines of text"""
+    if document_type == "freeform":
+        image, lines = render_letter(person, width, rng)
+    else:
+        card, lines = render_card(document_type, person, layouts[document_type], width)
+        # Lay the card on a table, with a margin for locate_document to find
+        margin = int(width * 0.08)
+        image = Image.new("RGB", (card.width + 2 * margin, card.height + 2 * margin), BACKGROUND_COLOR)
+        image.paste(card, (margin, margin))
+    return add_noise(image, noise, width / RESOLUTIONS["medium"], rng), lines
+
+
+def generate_corpus(output_dir: str, per_combination: int = 1, document_types: List[str] = DOCUMENT_TYPES,
+                    resolutions: List[str] = list(RESOLUTIONS), noise_levels: List[str] = list(NOISE_LEVELS),
+                    seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Render documents of every type at every resolution and noise level
+
+    Args:
+        output_dir: Directory to write the images and the manifest to
+        per_combination: Documents per type, resolution and noise level
+        document_types: Types to render, from DOCUMENT_TYPES
+        resolutions: Resolutions to render at, from RESOLUTIONS
+        noise_levels: Noise levels to apply, from NOISE_LEVELS
+        seed: Seed of the random details and noise; the same seed gives the same corpus
+
+    Returns:
+        Manifest entries, also written to corpus.json in output_dir
+    """
+    rng = random.Random(seed)
+    layouts = load_layouts()
+    os.makedirs(output_dir, exist_ok=True)
+    documents = []
+    for document_type in document_types:
+        for resolution in resolutions:
+            for noise_level in noise_levels:
+                noise = NOISE_LEVELS[noise_level]
+                for index in range(per_combination):
+                    person = make_person(rng)
+                    image, lines = render_document(document_type, person, RESOLUTIONS[resolution],
+                                                   noise, layouts, rng)
+                    file_name = f"{document_type}_{resolution}_{noise_level}_{index}.jpg"
+                    image.save(os.path.join(output_dir, file_name), quality=noise["jpeg_quality"])
+                    documents.append({
+                        "file": file_name,
+                        "document_type": document_type,
+                        "resolution": resolution,
+                        "noise": noise_level,
+                        "size": list(image.size),
+                        "truth": person,
+                        "text": "\n".join(lines),
+                    })
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"seed": seed, "documents": documents}, f, indent=2)
+    return documents
+
+
+def load_corpus(corpus_dir: str) -> Optional[List[Dict[str, Any]]]:
+    """Read the manifest of a generated corpus, or None if the directory has none"""
+    path = os.path.join(corpus_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["documents"]
+
+
+def parse_choices(value: str, choices) -> List[str]:
+    """Split a comma-separated option, rejecting unknown values"""
+    selected = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in selected if item not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown value(s) {', '.join(unknown)}; choose from {', '.join(choices)}")
+    return selected
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser):
+    """Options selecting what to render, shared with the pipeline benchmark"""
+    parser.add_argument("--per-combination", type=int, default=1,
+                        help="Documents per type, resolution and noise level")
+    parser.add_argument("--types", type=lambda value: parse_choices(value, DOCUMENT_TYPES),
+                        default=DOCUMENT_TYPES, help="Comma-separated document types")
+    parser.add_argument("--resolutions", type=lambda value: parse_choices(value, RESOLUTIONS),
+                        default=list(RESOLUTIONS), help="Comma-separated resolutions: " + ", ".join(
+                            f"{name} ({width} px)" for name, width in RESOLUTIONS.items()))
+    parser.add_argument("--noise", type=lambda value: parse_choices(value, NOISE_LEVELS),
+                        default=list(NOISE_LEVELS), help="Comma-separated noise levels: " + ", ".join(NOISE_LEVELS))
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated details and noise")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic document corpus")
+    parser.add_argument("output_dir", help="Directory to write the corpus to")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    documents = generate_corpus(args.output_dir, args.per_combination, args.types,
+                                args.resolutions, args.noise, args.seed)
+    print(f"Wrote {len(documents)} documents to {args.output_dir}")
@@ -0,0 +1,248 @@
+"""
+Storage of uploaded documents and their extraction results.
+
+Every upload gets a record with its file path, content hash, document type
+and, once extracted, its text and entities. Records expire after
+DOCUMENT_TTL_SECONDS of inactivity.
+
+Two stores are available through DOCUMENT_STORE:
+
+- "sqlite" (default): records live in a SQLite database in WAL mode, so they
+  survive restarts and are shared by all server processes on the node
+  (uvicorn --workers N) without one worker's writes blocking the others'
+  reads
+- "memory": a dictionary in the server process, for development and tests
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+DOCUMENT_STORE = os.environ.get("DOCUMENT_STORE", "sqlite")
+DOCUMENT_STORE_PATH = os.environ.get("DOCUMENT_STORE_PATH", os.path.join("cache", "documents.sqlite3"))
+# Records not read or written for this long are deleted
+DOCUMENT_TTL_SECONDS = float(os.environ.get("DOCUMENT_TTL_SECONDS", str(24 * 60 * 60)))
+# How long a write waits for another process's write to finish
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+
+
+class DocumentStore(ABC):
+    """
+    Interface of the document stores
+
+    Records are plain JSON-serialisable dictionaries. get() returns a copy,
+    so changes go through update().
+    """
+
+    def __init__(self, ttl_seconds: float = DOCUMENT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def create(self, document_id: str, record: Dict[str, Any]):
+        """Add a new document record"""
+
+    @abstractmethod
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document record, or None if it does not exist or has expired"""
+
+    @abstractmethod
+    def update(self, document_id: str, **fields: Any) -> bool:
+        """
+        Set fields of a document record
+
+        Returns:
+            False if the document does not exist or has expired
+        """
+
+    @abstractmethod
+    def delete(self, document_id: str) -> bool:
+        """Remove a document record, returning whether it existed"""
+
+    @abstractmethod
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        """
+        Delete expired records
+
+        Returns:
+            The deleted records, so their files can be removed
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Number of stored documents and store settings"""
+
+    def __contains__(self, document_id: str) -> bool:
+        return self.get(document_id) is not None
+
+
+class MemoryDocumentStore(DocumentStore):
+    """Document store in a dictionary of the current process"""
+
+    def __init__(self, ttl_seconds: float = DOCUMENT_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, document_id: str, now: float) -> bool:
+        return document_id in self._records and self._expires_at[document_id] > now
+
+    def create(self, document_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._records[document_id] = json.loads(json.dumps(record))
+            self._expires_at[document_id] = time.time() + self.ttl_seconds
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            if not self._live(document_id, now):
+                return None
+            self._expires_at[document_id] = now + self.ttl_seconds
+            return json.loads(json.dumps(self._records[document_id]))
+
+    def update(self, document_id: str, **fields: Any) -> bool:
+        now = time.time()
+        with self._lock:
+            if not self._live(document_id, now):
+                return False
+            self._records[document_id].update(json.loads(json.dumps(fields)))
+            self._expires_at[document_id] = now + self.ttl_seconds
+            return True
+
+    def delete(self, document_id: str) -> bool:
+        with self._lock:
+            self._expires_at.pop(document_id, None)
+            return self._records.pop(document_id, None) is not None
+
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            expired = [document_id for document_id, expires_at in self._expires_at.items() if expires_at <= now]
+            for document_id in expired:
+                del self._expires_at[document_id]
+            return [self._records.pop(document_id) for document_id in expired]
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            # Expired records stay until purged, but get() no longer returns them
+            documents = sum(1 for expires_at in self._expires_at.values() if expires_at > now)
+            return {"backend": "memory", "documents": documents, "ttl_seconds": self.ttl_seconds}
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """
+    Document store in a SQLite database shared by all processes on the node
+
+    Each thread has its own connection. Updates read and rewrite the record
+    inside an immediate transaction, so concurrent updates from different
+    workers never lose each other's fields.
+    """
+
+    def __init__(self, path: str = DOCUMENT_STORE_PATH, ttl_seconds: float = DOCUMENT_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, creating the database if needed"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "document_id TEXT PRIMARY KEY, record TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_expires_at ON documents (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def create(self, document_id: str, record: Dict[str, Any]):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO documents (document_id, record, created_at, expires_at) VALUES (?, ?, ?, ?)",
+            (document_id, json.dumps(record), now, now + self.ttl_seconds),
+        )
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT record FROM documents WHERE document_id = ? AND expires_at > ?", (document_id, now)
+        ).fetchone()
+        if row is None:
+            return None
+        # Extending the expiry is a write; rather than wait for another
+        # process's write to finish, a read skips it this time
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            conn.execute("UPDATE documents SET expires_at = ? WHERE document_id = ?",
+                         (now + self.ttl_seconds, document_id))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_SECONDS * 1000}")
+        return json.loads(row[0])
+
+    def update(self, document_id: str, **fields: Any) -> bool:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT record FROM documents WHERE document_id = ? AND expires_at > ?", (document_id, now)
+            ).fetchone()
+            if row is not None:
+                record = json.loads(row[0])
+                record.update(fields)
+                conn.execute("UPDATE documents SET record = ?, expires_at = ? WHERE document_id = ?",
+                             (json.dumps(record), now + self.ttl_seconds, document_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def delete(self, document_id: str) -> bool:
+        cursor = self._connect().execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+        return cursor.rowcount > 0
+
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT record FROM documents WHERE expires_at <= ?", (now,)).fetchall()
+            conn.execute("DELETE FROM documents WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        count = self._connect().execute(
+            "SELECT COUNT(*) FROM documents WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "documents": count, "ttl_seconds": self.ttl_seconds}
+
+
+def create_document_store(backend: str = DOCUMENT_STORE) -> DocumentStore:
+    """Create the document store selected by DOCUMENT_STORE"""
+    if backend == "sqlite":
+        return SQLiteDocumentStore()
+    if backend == "memory":
+        return MemoryDocumentStore()
+    raise ValueError(f"Unknown document store: {backend}")
+
+
+document_store = create_document_store()
@@ -0,0 +1,660 @@
+"""
+Rule-based entity extraction for OCR text.
+
+All patterns are compiled once at import. The labelled fields (name, parent
+name, date of birth, Aadhaar, PAN, voter ID and gender) are found with a few
+combined-alternation scans over the lower-cased text instead of one regex
+pass per pattern. Candidates come back in the same order the old
+per-pattern loops tried them: by pattern priority, then by position. Where
+several patterns of a scan match at the same position, only the
+highest-priority one is reported.
+
+Extraction runs in time linear in the length of the text, so long or noisy
+OCR output cannot stall a worker. Label values are read up to a bounded
+length, and the fallback searches whose regexes would backtrack over the
+rest of the text from every candidate position are done as single forward
+passes that return the same matches. Place names are recognised with the
+gazetteer, which finds all of them in a single pass.
+"""
+import bisect
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from gazetteer import PlaceMatch, get_gazetteer
+
+# A scan hit is (pattern priority, position in text, captured value)
+ScanHit = Tuple[int, int, str]
+
+# Opening parenthesis of a capturing group in a pattern
+CAPTURING_GROUP_RE = re.compile(r'(?<!\\)\((?!\?)')
+
+
+def _compile_scan(fields: Dict[str, Sequence[str]], overlapping: bool = True,
+                  prefilter: Optional[str] = None) -> "re.Pattern":
+    """
+    Combine the ordered patterns of one or more fields into a single regex
+
+    Every pattern must contain exactly one capturing group holding the value.
+    The group is renamed to "<field>__<priority>" so a match can be traced
+    back to the field and pattern that produced it.
+
+    Patterns are written in lower case and run against lower-cased text,
+    which allows a cheap first-character check (the prefilter, derived from
+    the patterns unless given) so most positions fail without trying every
+    alternative. Overlapping scans wrap the alternatives in a lookahead so a
+    match does not hide candidates that start inside it, such as "name:"
+    inside "father's name:".
+    """
+    alternatives = []
+    first_chars = set()
+    for field, patterns in fields.items():
+        for priority, pattern in enumerate(patterns):
+            named = CAPTURING_GROUP_RE.sub(f"(?P<{field}__{priority}>", pattern, count=1)
+            alternatives.append(f"(?:{named})")
+            first_chars.add(pattern[0] if pattern[0].isalpha() else None)
+    combined = "|".join(alternatives)
+    if prefilter is None:
+        prefilter = "" if None in first_chars else "[" + "".join(sorted(first_chars)) + "]"
+    if prefilter:
+        prefilter = f"(?={prefilter})"
+    if not overlapping:
+        return re.compile(prefilter + "(?:" + combined + ")")
+    return re.compile(prefilter + "(?=" + combined + ")")
+
+
+def _run_scan(regex: "re.Pattern", text: str, lower_text: Optional[str] = None) -> Dict[str, List[ScanHit]]:
+    """
+    Run a combined scan and group the hits per field, ordered by priority then position
+
+    The scan runs on the lower-cased text, but values are taken from the
+    original text so callers see the same casing as before.
+    """
+    if lower_text is None:
+        lower_text = text.lower()
+    if len(lower_text) != len(text):
+        # Lower-casing changed some offsets, so values cannot be mapped back
+        text = lower_text
+    hits: Dict[str, List[ScanHit]] = {}
+    for match in regex.finditer(lower_text):
+        group = match.lastgroup
+        field, priority = group.rsplit("__", 1)
+        start, end = match.span(group)
+        start -= SCAN_VALUE_PREFIXES.get(group, 0)
+        hits.setdefault(field, []).append((int(priority), start, text[start:end]))
+    for field_hits in hits.values():
+        field_hits.sort()
+    return hits
+
+
+# Label values are captured up to this many characters. Longer values are
+# not names anyway, and unbounded values made every label rescan the rest
+# of the text.
+NAME_VALUE_MAX_CHARS = 200
+
+# Name labels commonly found in Indian documents, in priority order
+_NAME_VALUE = r'([a-z][a-z\s.\-\(\)]{1,' + str(NAME_VALUE_MAX_CHARS - 1) + '})'
+NAME_PATTERNS = [
+    r'name[:\s]+' + _NAME_VALUE,
+    r'nama[:\s]+' + _NAME_VALUE,
+    r'full\s+name[:\s]+' + _NAME_VALUE,
+    r'father[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'mother[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'spouse[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'husband[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'wife[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'candidate[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'applicant[\'\s]*s?\s+name[:\s]+' + _NAME_VALUE,
+    r'surname[:\s]+' + _NAME_VALUE,
+    r'given\s+name[:\s]+' + _NAME_VALUE,
+    r'first\s+name[:\s]+' + _NAME_VALUE,
+    r'last\s+name[:\s]+' + _NAME_VALUE,
+    r'holder\s+name[:\s]+' + _NAME_VALUE,
+    r'cardholder\s+name[:\s]+' + _NAME_VALUE,
+    r'holder[:\s]+' + _NAME_VALUE,
+    r'guardian[:\s]+' + _NAME_VALUE,
+]
+
+_PARENT_VALUE = r'([a-z][a-z\s]{1,' + str(NAME_VALUE_MAX_CHARS - 1) + '})'
+PARENT_NAME_PATTERNS = [
+    r'father[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+    r'mother[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+    r'guardian[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+    r'parent[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+    r'husband[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+    r'wife[\'\s]*s?\s+name[:\s]+' + _PARENT_VALUE,
+]
+
+# Aadhaar: 12 digits with or without spaces/dashes
+AADHAAR_PATTERNS = [
+    r'(\d{4}[\s-]?\d{4}[\s-]?\d{4})',
+]
+
+# PAN and voter IDs start with letters, which are matched by lookbehind so
+# the patterns are anchored on the first digit; the letters are added back
+# to the value using SCAN_VALUE_PREFIXES. The "VOTER-" form always contains
+# a plain voter ID, so it needs no pattern of its own.
+PAN_PATTERNS = [
+    r'(?<=[a-z]{5})(\d{4}[a-z])',  # 5 letters + 4 digits + 1 letter
+]
+
+VOTER_ID_PATTERNS = [
+    r'(?<=[a-z]{3})(\d{7})',  # 3 letters + 7 digits
+]
+
+# Common date patterns in Indian documents
+DOB_PATTERNS = [
+    r'date of birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
+    r'dob[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
+    r'birth[:\s]+date[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
+    r'date[:\s]+of[:\s]+birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
+    r'birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
+    r'(\d{2}[-/]\d{2}[-/]\d{4})',  # General date pattern
+    r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})',  # Less strict date pattern
+    r'(\d{2}-\d{2}-\d{2})',  # DD-MM-YY format
+    r'(\d{4}[-/]\d{2}[-/]\d{2})',  # YYYY-MM-DD format
+]
+
+# Name and parent name labels overlap ("father's name"), so they get their
+# own overlapping scans.
+NAME_SCAN = _compile_scan({"name": NAME_PATTERNS})
+PARENT_NAME_SCAN = _compile_scan({"parent_name": PARENT_NAME_PATTERNS})
+
+# Identifiers and dates hardly ever overlap each other, so one plain scan
+# covers them all, identifiers first as the more specific patterns. Every
+# alternative starts at a digit or at the "d"/"b" of a date label, so all
+# other positions are skipped by the prefilter.
+FIELD_SCAN = _compile_scan({
+    "aadhaar": AADHAAR_PATTERNS,
+    "pan": PAN_PATTERNS,
+    "voter_id": VOTER_ID_PATTERNS,
+    "dob": DOB_PATTERNS,
+}, overlapping=False, prefilter=r'[\ddb]')
+
+# Letters that precede the captured digits of lookbehind-anchored patterns
+SCAN_VALUE_PREFIXES = {"pan__0": 5, "voter_id__0": 3}
+
+# Gender indicators, checked in order of priority: male, female, other.
+# A single "m"/"f" counts unless it is an abbreviation such as "m.a". The
+# leading word boundary and first-letter check let most positions fail fast.
+GENDER_SCAN = re.compile(
+    r'\b(?=[bdfghmostw])(?:'
+    r'(?P<male>\bmale\b|\bm\b(?!\.[^\W\d_])|\bgentleman\b|\bman\b|\bboy\b|\bhusband\b|\bson\b|\bhe\b|\bmasculine\b|\bmales\b)'
+    r'|(?P<female>\bfemale\b|\bf\b(?!\.[^\W\d_])|\bwomen\b|\bgirl\b|\bwife\b|\bdaughter\b|\bshe\b|\bfemales\b|\bwoman\b|\bfem\b)'
+    r'|(?P<other>\bother\b|\btransgender\b|\btrans\b))'
+)
+GENDER_PRIORITY = ["male", "female", "other"]
+
+PAN_INDICATOR_RE = re.compile(r'pan|permanent account number|income tax')
+PAN_CONTEXT_RE = re.compile(r'pan|card|number|income|tax|govt|government')
+PAN_CONTEXT_WINDOW = 50
+
+# Fallbacks for names without a recognised label
+POTENTIAL_NAME_RE = re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z.\-\(\)]*)+)\b')
+# Fields that commonly come before or after a name
+_NAME_FIELD_WORDS = (
+    r'address|father|mother|dob|date|yob|year|gender|sex|age|ward|house|street|locality|city|state|pin|code|post|po|ps|district|village|taluka|tehsil|zone|circle|region|location|ward|building|house|door|flat|floor|apartment|residence|domicile|resident|citizen|id|number|no\.?'
+)
+_NAME_BOUNDARY = r'(?:' + _NAME_FIELD_WORDS + r'|\d{4,}|\\n|\\r|\\t|\\v)'
+NAME_TO_ADDRESS_RE = re.compile(r'name[:\s]*([A-Z][a-zA-Z\s.\-\(\)]+?)' + _NAME_BOUNDARY, re.IGNORECASE)
+NAME_LABEL_RE = re.compile(r'name[:\s]*', re.IGNORECASE)
+NAME_BOUNDARY_RE = re.compile(_NAME_BOUNDARY, re.IGNORECASE)
+NAME_START_RE = re.compile(r'[A-Z]', re.IGNORECASE)
+NAME_CHARS_RE = re.compile(r'[a-zA-Z\s.\-\(\)]*', re.IGNORECASE)
+# A name following another field: a letter and at least ten more name characters
+_NAME_AFTER_FIELD = r'[A-Z][a-zA-Z\s.\-\(\)]{10,}'
+NAME_AFTER_FIELD_RE = re.compile(_NAME_AFTER_FIELD, re.IGNORECASE)
+# A name starting within the text of a field, as "st..." after the "po" of
+# "post". Fields other than numbers are at most 9 characters long, and no
+# name starts within a number.
+NAME_WITHIN_FIELD_RE = re.compile(
+    r'(?:' + _NAME_FIELD_WORDS + r'|\\n|\\r|\\t|\\v)[\s\S]{0,16}?(' + _NAME_AFTER_FIELD + ')', re.IGNORECASE
+)
+
+# Address labels, in priority order. A label's value runs to the end of its
+# line, which must come within ADDRESS_MAX_CHARS characters.
+ADDRESS_MAX_CHARS = 300
+ADDRESS_LABELS = [
+    'address',
+    'permanent address',
+    'current address',
+    'residential address',
+    'addr',
+    'location',
+    'place',
+]
+ADDRESS_LABEL_PATTERNS = [
+    (re.compile(label, re.IGNORECASE),
+     re.compile(label + r'[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)', re.IGNORECASE | re.DOTALL))
+    for label in ADDRESS_LABELS
+]
+# 6-digit postal code followed by location
+POSTAL_CODE_FIRST_RE = re.compile(r'(\d{6})[\s\n]+([A-Za-z\s,\.\n\r\-]+?)', re.IGNORECASE | re.DOTALL)
+# Location followed by 6-digit postal code: a run of place characters ending
+# in whitespace, directly followed by the code
+PLACE_RUN_RE = re.compile(r'[A-Za-z\s,\.\n\r\-]+', re.IGNORECASE)
+POSTAL_CODE_RE = re.compile(r'\d{6}')
+# Address blocks: runs of at least ADDRESS_BLOCK_MIN_CHARS address
+# characters up to a blank line or the start of another field
+ADDRESS_BLOCK_MIN_CHARS = 30
+ADDRESS_BLOCK_RUN_RE = re.compile(r'[A-Za-z0-9\s,.\n\r\-]+', re.IGNORECASE)
+ADDRESS_BLOCK_END_RE = re.compile(
+    r'\n[^\S\n]*\n|DOB|Date|Gender|Age|Name|Father|Mother|Wife|Husband|Income|Annual|Signature|\d{12}|[A-Z]{3}[0-9]{7}',
+    re.IGNORECASE
+)
+# Longest block end that can start inside a run and extend past it (\d{12})
+ADDRESS_BLOCK_END_MAX_OVERHANG = 12
+POTENTIAL_ADDRESS_RE = re.compile(r'([A-Za-z0-9\s,.#\n\r\-]{20,})', re.DOTALL)
+
+WHITESPACE_RE = re.compile(r'\s+')
+DIGITS_RE = re.compile(r'\d+')
+AADHAAR_SEPARATOR_RE = re.compile(r'[\s-]')
+
+# Confidence heuristics
+DATE_VALUE_RE = re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}')
+AADHAAR_VALUE_RE = re.compile(r'\d{4}\s\d{4}\s\d{4}')
+PAN_VALUE_RE = re.compile(r'[A-Z]{5}[0-9]{4}[A-Z]')
+
+DOB_FORMATS = [
+    '%d-%m-%Y',  # DD-MM-YYYY
+    '%d/%m/%Y',  # DD/MM/YYYY
+    '%d-%m-%y',  # DD-MM-YY
+    '%d/%m/%y',  # DD/MM/YY
+    '%Y-%m-%d',  # YYYY-MM-DD
+    '%Y/%m/%d',  # YYYY/MM/DD
+]
+
+
+def scan_fields(text: str) -> Dict[str, List[ScanHit]]:
+    """
+    Find candidates for all labelled fields in a few passes over the text
+
+    Args:
+        text: Text to scan
+
+    Returns:
+        Dictionary mapping field name to its candidate hits, each a
+        (pattern priority, position, value) tuple in the order to try them
+    """
+    lower_text = text.lower()
+    hits = _run_scan(NAME_SCAN, text, lower_text)
+    hits.update(_run_scan(PARENT_NAME_SCAN, text, lower_text))
+    hits.update(_run_scan(FIELD_SCAN, text, lower_text))
+    return hits
+
+
+def _names_before_fields(text: str) -> List[str]:
+    """
+    Find capitalised words between a "name" label and the next field
+
+    Gives the same matches as NAME_TO_ADDRESS_RE.findall(text). A label the
+    regex fails at has no field anywhere in the run of name characters
+    after it, so the later labels in that run would rescan it and fail too;
+    they are skipped instead.
+    """
+    matches = []
+    # Labels whose value starts before this position cannot match
+    dead_end = 0
+    pos = 0
+    while True:
+        label = NAME_LABEL_RE.search(text, pos)
+        if label is None:
+            return matches
+        value_start = label.end()
+        if value_start >= dead_end:
+            match = NAME_TO_ADDRESS_RE.match(text, label.start())
+            if match is not None:
+                matches.append(match.group(1))
+                pos = match.end()
+                continue
+            if NAME_START_RE.match(text, value_start):
+                dead_end = NAME_CHARS_RE.match(text, value_start).end()
+        pos = label.start() + 1
+
+
+def _names_after_fields(text: str) -> List[str]:
+    """
+    Find runs of name characters that follow another field
+
+    Gives the same matches as a lazy "field, anything, name" regex, whose
+    findall rescanned the rest of the text from every field that no name
+    followed. Here each field is found once and the name after it with a
+    forward search. When no name starts after the field, the regex could
+    still match a name starting within the field's own text by
+    backtracking to a shorter field, which is checked with a bounded
+    regex instead.
+    """
+    matches = []
+    pos = 0
+    while True:
+        field = NAME_BOUNDARY_RE.search(text, pos)
+        if field is None:
+            return matches
+        name = NAME_AFTER_FIELD_RE.search(text, field.end())
+        if name is None:
+            name = NAME_WITHIN_FIELD_RE.search(text, field.start())
+            if name is None:
+                return matches
+            matches.append(name.group(1))
+        else:
+            matches.append(name.group())
+        pos = name.end()
+
+
+def _labelled_addresses(label_re: "re.Pattern", value_re: "re.Pattern", text: str) -> List[str]:
+    """
+    Find the values after an address label, each running to the end of its
+    line. Lines longer than ADDRESS_MAX_CHARS are not addresses, so the
+    value regex only looks that far instead of to the end of the text.
+    """
+    matches = []
+    pos = 0
+    while True:
+        label = label_re.search(text, pos)
+        if label is None:
+            return matches
+        window_end = label.end() + ADDRESS_MAX_CHARS
+        match = value_re.match(text, label.start(), window_end)
+        # At the window end, "$" matches although the line goes on
+        if match is not None and not (
+            match.end(1) == window_end < len(text) and text[window_end] not in '\n\r'
+        ):
+            matches.append(match.group(1))
+            pos = match.end()
+        else:
+            pos = label.start() + 1
+
+
+def _places_before_postal_codes(text: str) -> Iterator[Tuple[str, str]]:
+    """
+    Find (location, postal code) pairs where a postal code follows a location
+
+    Gives the same matches as the lazy regex
+    ([A-Za-z\s,\.\n\r\-]+?)[\s\n]+(\d{6}), which tried every split of
+    every run of place characters. A run matches exactly when it ends in
+    whitespace right before a postal code; the location is the run without
+    that whitespace.
+    """
+    for run in PLACE_RUN_RE.finditer(text):
+        start, end = run.span()
+        place = run.group().rstrip()
+        if end - start < 2 or len(place) == end - start or not POSTAL_CODE_RE.match(text, end):
+            continue
+        yield text[start:start + max(1, len(place))], text[end:end + 6]
+
+
+def _address_blocks(text: str) -> List[str]:
+    """
+    Find blocks of at least ADDRESS_BLOCK_MIN_CHARS address characters that
+    end at a blank line or at the start of another field
+
+    Each run of address characters is searched forward once for block ends,
+    rather than retrying a lazy regex from every position of a run that has
+    no block end.
+    """
+    blocks = []
+    # A block end of non-ASCII digits can start at the end of one run and reach into the next
+    start = 0
+    for run in ADDRESS_BLOCK_RUN_RE.finditer(text):
+        start, run_end = max(start, run.start()), run.end()
+        while run_end - start >= ADDRESS_BLOCK_MIN_CHARS:
+            block_end = ADDRESS_BLOCK_END_RE.search(
+                text, start + ADDRESS_BLOCK_MIN_CHARS, run_end + ADDRESS_BLOCK_END_MAX_OVERHANG
+            )
+            if block_end is None or block_end.start() > run_end:
+                break
+            blocks.append(text[start:block_end.start()])
+            if text[block_end.start()] == '\n':
+                # A blank line takes all whitespace up to its last newline with it
+                whitespace_end = WHITESPACE_RE.match(text, block_end.start()).end()
+                start = text.rfind('\n', block_end.start() + 1, whitespace_end) + 1
+            else:
+                start = block_end.end()
+    return blocks
+
+
+def _mentions_place(places: List[PlaceMatch], place_starts: List[int], start: int, end: int) -> bool:
+    """Whether one of the places found in the text lies within text[start:end]"""
+    index = bisect.bisect_left(place_starts, start)
+    return index < len(places) and places[index].end <= end
+
+
+def extract_name(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract name using pattern matching"""
+    if fields is None:
+        fields = {"name": _run_scan(NAME_SCAN, text).get("name", [])}
+
+    # Return the first match that looks like a name (not too long, has spaces)
+    for _, _, match in fields.get("name", []):
+        # Clean the match by removing extra punctuation at the end
+        clean_match = match.strip().rstrip(':.,;').strip()
+        if 3 <= len(clean_match) <= 100 and len(clean_match.split()) >= 1:
+            return clean_match
+
+    # If pattern matching fails, look for sequences of capitalized words
+    # that might represent names
+    potential_names = POTENTIAL_NAME_RE.findall(text)
+    if potential_names:
+        # Return the most likely name (longest or most structured)
+        return max(potential_names, key=len).strip()
+
+    # Look for capitalized words between 'name' and 'address' or other common fields
+    name_to_address_matches = _names_before_fields(text)
+    if name_to_address_matches:
+        # Return the longest match
+        return max(name_to_address_matches, key=len).strip()
+
+    # Look for capitalized words between other common fields
+    address_to_name_matches = _names_after_fields(text)
+    if address_to_name_matches:
+        # Return the shortest match (most likely to be a name)
+        return min(address_to_name_matches, key=len).strip()
+
+    return ""
+
+
+def extract_date_of_birth(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract date of birth using regex patterns"""
+    if fields is None:
+        fields = _run_scan(FIELD_SCAN, text)
+
+    current_year = datetime.now().year
+    for _, _, match in fields.get("dob", []):
+        # Validate if it's a reasonable date of birth
+        try:
+            # Handle different date formats
+            date_str = match.replace('/', '-').replace(' ', '').strip()
+            if len(date_str.split('-')[-1]) == 2:  # YY format
+                date_obj = datetime.strptime(date_str, '%d-%m-%y')
+            else:  # YYYY or DD-MM-YYYY format
+                if len(date_str) == 10 and date_str[2] == '-':
+                    date_obj = datetime.strptime(date_str, '%d-%m-%Y')
+                elif len(date_str) == 10 and date_str[4] == '-':
+                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+                else:
+                    continue
+
+            # Check if the date is reasonable (not in the future, not too old)
+            if 1900 <= date_obj.year <= current_year:
+                return match
+        except ValueError:
+            continue
+
+    return ""
+
+
+def extract_gender(text: str) -> str:
+    """Extract gender"""
+    found = set()
+    for match in GENDER_SCAN.finditer(text.lower()):
+        found.add(match.lastgroup)
+        if match.lastgroup == GENDER_PRIORITY[0]:
+            break
+
+    # Return the gender with the highest priority among the indicators found
+    for gender in GENDER_PRIORITY:
+        if gender in found:
+            return gender.capitalize()
+
+    return ""
+
+
+def extract_address(text: str) -> str:
+    """Extract address"""
+    # Look for address indicators
+    for label_re, value_re in ADDRESS_LABEL_PATTERNS:
+        matches = _labelled_addresses(label_re, value_re, text)
+        if matches:
+            # Return the longest address match
+            longest_match = max(matches, key=len)
+            # Clean up the match to remove extra whitespace
+            return WHITESPACE_RE.sub(' ', longest_match.strip())
+
+    # Look for postal code patterns followed by addresses
+    for matches in (POSTAL_CODE_FIRST_RE.findall(text), _places_before_postal_codes(text)):
+        for match in matches:
+            # Combine both parts of the match
+            combined = " ".join(match).strip()
+            if len(combined) > 10:  # Only return if it's a substantial address
+                return WHITESPACE_RE.sub(' ', combined)
+
+    # Look for complete address blocks that span multiple lines
+    # Usually addresses have multiple components like house no, street, city, state, pin code
+    multi_line_matches = _address_blocks(text)
+    if multi_line_matches:
+        # Return the longest match
+        longest_addr = max(multi_line_matches, key=len)
+        return WHITESPACE_RE.sub(' ', longest_addr.strip())
+
+    # Look for text blocks that contain Indian locations, found in one pass over the text
+    places = get_gazetteer().find_places(text)
+    place_starts = [place.start for place in places]
+    para_start = 0
+    for para in text.split('\n\n'):  # Split by double newlines for better paragraph detection
+        if len(para) > 20 and _mentions_place(places, place_starts, para_start, para_start + len(para)):
+            return WHITESPACE_RE.sub(' ', para.strip())
+        para_start += len(para) + 2
+
+    # Look for blocks that might be addresses (contain numbers and Indian location indicators)
+    for block in POTENTIAL_ADDRESS_RE.finditer(text):
+        addr = block.group(1)
+        if len(addr.split()) > 5 and (_mentions_place(places, place_starts, block.start(), block.end())
+                                      or len(DIGITS_RE.findall(addr)) >= 2):
+            return WHITESPACE_RE.sub(' ', addr.strip())
+
+    return ""
+
+
+def extract_aadhaar_number(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract Aadhaar number"""
+    if fields is None:
+        fields = _run_scan(FIELD_SCAN, text)
+
+    for _, _, match in fields.get("aadhaar", []):
+        # Validate Aadhaar format (basic validation)
+        clean_match = AADHAAR_SEPARATOR_RE.sub('', match)
+        if len(clean_match) == 12 and clean_match.isdigit():
+            # Format with spaces for readability
+            return f"{clean_match[:4]} {clean_match[4:8]} {clean_match[8:]}"
+
+    return ""
+
+
+def extract_pan_number(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract PAN number"""
+    if fields is None:
+        fields = _run_scan(FIELD_SCAN, text)
+
+    matches = fields.get("pan", [])
+    if not matches:
+        return ""
+
+    # If there are PAN indicators in the text, return the first potential PAN
+    lower_text = text.lower()
+    if PAN_INDICATOR_RE.search(lower_text):
+        return matches[0][2].upper()
+
+    # Otherwise check whether a match is in a context that suggests it's a PAN
+    for _, start_idx, match in matches:
+        context_start = max(0, start_idx - PAN_CONTEXT_WINDOW)
+        context_end = min(len(lower_text), start_idx + len(match) + PAN_CONTEXT_WINDOW)
+        if PAN_CONTEXT_RE.search(lower_text, context_start, context_end):
+            return match.upper()
+
+    return ""
+
+
+def extract_voter_id(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract Voter ID"""
+    if fields is None:
+        fields = _run_scan(FIELD_SCAN, text)
+
+    matches = fields.get("voter_id", [])
+    if matches:
+        return matches[0][2].upper()
+
+    return ""
+
+
+def extract_parent_name(text: str, fields: Optional[Dict[str, List[ScanHit]]] = None) -> str:
+    """Extract parent/guardian name"""
+    if fields is None:
+        fields = _run_scan(PARENT_NAME_SCAN, text)
+
+    # Return the first match that looks like a name
+    for _, _, match in fields.get("parent_name", []):
+        if 3 <= len(match.strip()) <= 100 and len(match.split()) >= 1:
+            return match.strip()
+
+    return ""
+
+
+def calculate_age_from_dob(dob_str: str) -> int:
+    """
+    Calculate age from date of birth string
+    """
+    if not dob_str:
+        return None
+
+    dob_str = dob_str.strip()
+
+    for fmt in DOB_FORMATS:
+        try:
+            dob = datetime.strptime(dob_str, fmt)
+            today = datetime.now()
+            age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+            return age
+        except ValueError:
+            continue
+
+    return None
+
+
+def calculate_confidence(entity_value: str, text: str) -> float:
+    """
+    Calculate a basic confidence score based on entity characteristics
+    """
+    if not entity_value:
+        return 0.0
+
+    # Base confidence
+    confidence = 0.7
+
+    # Increase confidence based on entity validation
+    if entity_value in text:
+        confidence += 0.2
+
+    # For dates, validate format
+    if DATE_VALUE_RE.match(entity_value):
+        confidence = min(0.95, confidence + 0.15)
+
+    # For Aadhaar numbers
+    if AADHAAR_VALUE_RE.match(entity_value):
+        confidence = min(0.95, confidence + 0.2)
+
+    # For PAN numbers
+    if PAN_VALUE_RE.match(entity_value):
+        confidence = min(0.95, confidence + 0.2)
+
+    # Ensure confidence is within bounds
+    return min(0.99, max(0.1, confidence))
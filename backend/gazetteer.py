@@ -0,0 +1,206 @@
+"""
+Offline gazetteer of Indian places and PIN codes.
+
+The data file (data/gazetteer.json) lists states and union territories,
+districts and cities with their common alternative names, and an index from
+PIN code prefixes to state and district.
+
+All names are compiled into one Aho-Corasick automaton, so finding every
+place mentioned in a text is a single pass over it, however many names the
+gazetteer holds. Names match whole words only, ignoring case; any single
+whitespace character may separate the words of a name. PIN codes are looked
+up by their full 6 digits, then their first 3 (sorting district) and first 2
+(postal circle) digits, each a dictionary lookup.
+"""
+import json
+import os
+import re
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional
+
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.json")
+)
+
+# More specific places win when several share a name, e.g. Delhi the city over Delhi the territory
+PLACE_KINDS = ["city", "district", "state"]
+
+# 6-digit PIN code, optionally written with a space after the third digit
+PIN_CODE_RE = re.compile(r'(?<!\d)([1-9]\d{2})\s?(\d{3})(?!\d)')
+
+# Map every ASCII whitespace character to a space, so names match across line breaks
+_WHITESPACE_TO_SPACE = str.maketrans("\t\n\r\x0b\x0c", "     ")
+
+
+class Place(NamedTuple):
+    name: str
+    kind: str
+    district: Optional[str]
+    state: str
+
+
+class PlaceMatch(NamedTuple):
+    start: int
+    end: int
+    place: Place
+
+
+class Gazetteer:
+    """
+    Place names compiled into an Aho-Corasick automaton, and the PIN code index
+    """
+
+    def __init__(self, places: List[Dict[str, Any]], pin_codes: Dict[str, Optional[Dict[str, str]]]):
+        # Place of each name; a name used by several places keeps the most specific
+        names: Dict[str, Place] = {}
+        for entry in places:
+            place = Place(entry["name"], entry["kind"], entry.get("district"), entry["state"])
+            for name in [entry["name"]] + entry.get("aliases", []):
+                key = " ".join(name.lower().split())
+                known = names.get(key)
+                if known is None or PLACE_KINDS.index(place.kind) < PLACE_KINDS.index(known.kind):
+                    names[key] = place
+        self.names = names
+        self.pin_codes = pin_codes
+        self._build_automaton()
+
+    def _build_automaton(self):
+        """
+        Build the automaton as a complete transition table, so scanning does
+        one dictionary lookup per character and never follows failure links
+        """
+        goto: List[Dict[str, int]] = [{}]
+        # Per state: (length, place) of every name ending there
+        outputs: List[List[tuple]] = [[]]
+        for name, place in self.names.items():
+            state = 0
+            for char in name:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append((len(name), place))
+
+        # Breadth-first, so the failure state of a state is complete before its children
+        fail = [0] * len(goto)
+        transitions: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions[state] = dict(transitions[fail[state]])
+            transitions[state].update(goto[state])
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for char, child in goto[state].items():
+                fail[child] = transitions[fail[state]].get(char, 0) if state else 0
+                queue.append(child)
+        self._transitions = transitions
+        self._outputs = [sorted(output, reverse=True) for output in outputs]
+
+    def find_places(self, text: str) -> List[PlaceMatch]:
+        """
+        Find the places mentioned in a text
+
+        Where names overlap, such as "navi mumbai" and "mumbai", the
+        longest wins.
+
+        Args:
+            text: Text to scan
+
+        Returns:
+            Non-overlapping matches in order of position
+        """
+        folded = text.lower()
+        if len(folded) != len(text):
+            # Lower-casing changed some offsets; names are ASCII, so fold ASCII letters only
+            folded = "".join(char.lower() if char.isascii() else char for char in text)
+        folded = folded.translate(_WHITESPACE_TO_SPACE)
+
+        transitions = self._transitions
+        outputs = self._outputs
+        found = []
+        state = 0
+        for index, char in enumerate(folded):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                end = index + 1
+                if end < len(folded) and folded[end].isalnum():
+                    continue
+                for length, place in outputs[state]:
+                    start = end - length
+                    if start == 0 or not folded[start - 1].isalnum():
+                        found.append(PlaceMatch(start, end, place))
+                        break  # Outputs are longest first
+
+        # Keep the leftmost-longest of overlapping matches
+        found.sort(key=lambda match: (match.start, -match.end))
+        matches = []
+        for match in found:
+            if not matches or match.start >= matches[-1].end:
+                matches.append(match)
+        return matches
+
+    def lookup_pin(self, pin_code: str) -> Optional[Dict[str, str]]:
+        """
+        Get the state, and district if known, of a PIN code
+
+        Returns:
+            Dictionary with "state" and optionally "district", or None if the
+            code is invalid or not in the index
+        """
+        digits = "".join(pin_code.split())
+        if len(digits) != 6 or not digits.isdigit() or digits[0] == "0":
+            return None
+        for prefix in (digits, digits[:3], digits[:2]):
+            if prefix in self.pin_codes:
+                return self.pin_codes[prefix]
+        return None
+
+    def find_pin_codes(self, text: str) -> List[str]:
+        """Find the 6-digit PIN codes in a text, without spaces"""
+        return [first + last for first, last in PIN_CODE_RE.findall(text)]
+
+    def place_from_address(self, address: str) -> Optional[str]:
+        """
+        Get the town or district an address is in
+
+        The last city or district named in the address wins; without one,
+        the district of its PIN code.
+
+        Returns:
+            Name of the place, or None if neither identifies one
+        """
+        for match in reversed(self.find_places(address)):
+            if match.place.kind != "state":
+                return match.place.name
+        for pin_code in reversed(self.find_pin_codes(address)):
+            location = self.lookup_pin(pin_code)
+            if location and location.get("district"):
+                return location["district"]
+        return None
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH) -> Gazetteer:
+    """Load the gazetteer data file"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    states = {entry["name"] for entry in data["places"] if entry["kind"] == "state"}
+    for entry in data["places"]:
+        if entry["kind"] not in PLACE_KINDS:
+            raise ValueError(f"Unknown kind of place '{entry['kind']}' for {entry['name']} in {path}")
+        if entry["state"] not in states:
+            raise ValueError(f"Unknown state '{entry['state']}' for {entry['name']} in {path}")
+    return Gazetteer(data["places"], data["pin_codes"])
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Get the gazetteer, loading it on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = load_gazetteer()
+    return _gazetteer
@@ -0,0 +1,592 @@
+"""
+Background job queue for OCR and entity extraction.
+
+The OCR engines and spaCy are synchronous and CPU bound, so running them
+inside a request handler blocks the event loop for every other user. This
+module runs those stages in a pool of worker processes instead. Each worker
+loads the OCR and NLP models once when it starts, runs a dummy inference to
+warm them up, and keeps them warm for all the jobs it handles afterwards.
+
+Metrics recorded while a worker runs a job are sent back with its result
+and merged into the server's metrics (see observability). Extraction jobs
+can also report their progress while they run, as events put on a queue
+made by JobQueue.event_queue().
+"""
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from observability import (buffer_observations, configure_logging, drain_observations, metrics,
+                           observe_stage, span)
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes. 0 runs jobs on a background thread in the
+# server process, which is handy for development on small machines.
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", os.cpu_count() or 1))
+
+# Number of finished jobs whose status and result are kept for polling
+MAX_FINISHED_JOBS = int(os.environ.get("MAX_FINISHED_JOBS", "1000"))
+
+JOB_SECONDS = metrics.histogram("job_duration_seconds", "Time from submitting a job to its completion",
+                                ["kind", "status"])
+JOB_WAIT_SECONDS = metrics.histogram("job_queue_wait_seconds", "Time a job waited for a free worker", ["kind"])
+
+
+def _init_worker(status_queue=None):
+    """
+    Initialise a worker process by loading and warming up the OCR and NLP models
+
+    Args:
+        status_queue: Queue the worker reports its model status to once warm
+    """
+    configure_logging()
+    buffer_observations()
+    # Models are loaded exactly once per worker instead of on the first job
+    status = warm_up_worker()
+    if status_queue is not None:
+        status_queue.put(status)
+
+
+def warm_up_worker() -> Dict[str, Any]:
+    """
+    Load the OCR and NLP models in the current process and run a dummy inference
+
+    Returns:
+        Process ID and the status of each model
+    """
+    import ocr_utils  # noqa: F401  (registers the models)
+    from model_registry import model_registry
+
+    return {"pid": os.getpid(), "models": model_registry.warm_up()}
+
+
+def _run_observed(kind: str, submitted_at: float, fn: Callable[..., Any], *args: Any) -> Tuple[Any, list]:
+    """
+    Run a job function, returning its result with the metrics recorded meanwhile
+
+    Executed inside a worker process, where metrics are buffered; in-process
+    workers record them directly and return none.
+    """
+    JOB_WAIT_SECONDS.observe(max(0.0, time.time() - submitted_at), kind)
+    result = fn(*args)
+    return result, drain_observations()
+
+
+def _event_reporters(events) -> Tuple[Optional[Callable[..., None]], Optional[Callable[..., None]]]:
+    """
+    Callbacks putting OCR engine results and entities on an event queue as
+    (event, data) tuples, or None for both without a queue
+    """
+    if events is None:
+        return None, None
+
+    def on_engine_result(engine: str, result: Dict[str, Any]):
+        events.put(("ocr", {"engine": engine, "status": result["status"], "text": result.get("text", ""),
+                            "score": result.get("score"), "seconds": result.get("seconds")}))
+
+    def on_entity(name: str, entity: Dict[str, Any]):
+        events.put(("entity", {"field": name, **entity}))
+
+    return on_engine_result, on_entity
+
+
+def run_extraction(file_path: str, document_type: Optional[str] = None,
+                   content_hash: Optional[str] = None, events=None) -> Dict[str, Any]:
+    """
+    Run OCR and entity extraction for a single document
+
+    Executed inside a worker process.
+
+    Args:
+        file_path: Path to the uploaded document
+        document_type: Type of document (aadhaar, pan, voter) to help with extraction
+        content_hash: SHA-256 of the file contents, used as the OCR cache key
+        events: Queue from JobQueue.event_queue() to report progress on: an
+            "ocr" event per whole-page OCR engine as it finishes, a "text"
+            event with the chosen text, then an "entity" event per entity
+
+    Returns:
+        Dictionary with the extracted text, entities, stage timings and the
+        report of which OCR engines ran; for PDFs, the per-page results
+        (each with its own OCR report) instead of a single report
+    """
+    from ocr_utils import extract_text_with_report, extract_entities_from_text
+    from pdf_ingest import is_pdf, extract_pdf_text
+
+    on_engine_result, on_entity = _event_reporters(events)
+    start = time.perf_counter()
+    pages = None
+    with span("ocr"):
+        if is_pdf(file_path):
+            pdf = extract_pdf_text(file_path, content_hash)
+            extracted_text, ocr_report, pages = pdf["text"], None, pdf["pages"]
+        else:
+            extracted_text, ocr_report = extract_text_with_report(file_path, content_hash, document_type,
+                                                                  on_engine_result)
+    ocr_done = time.perf_counter()
+    if events is not None:
+        events.put(("text", {"text": extracted_text, "engine": ocr_report.get("engine") if ocr_report else None,
+                             "cached": bool(ocr_report and ocr_report.get("cached"))}))
+    with span("ner"):
+        entities = extract_entities_from_text(extracted_text, document_type, on_entity=on_entity)
+    ner_done = time.perf_counter()
+
+    return {
+        "extracted_text": extracted_text,
+        "entities": entities,
+        "timings": {
+            "ocr": ocr_done - start,
+            "ner": ner_done - ocr_done,
+        },
+        "ocr": ocr_report,
+        "pages": pages,
+    }
+
+
+def run_entity_extraction(text: str, document_type: Optional[str] = None, events=None) -> Dict[str, Any]:
+    """
+    Run entity extraction on text that was already read
+
+    Executed inside a worker process, for example after the pages of a PDF
+    were read in parallel.
+
+    Args:
+        text: Text of the document
+        document_type: Type of document (aadhaar, pan, voter) to help with extraction
+        events: Queue from JobQueue.event_queue() to put an "entity" event on per entity
+
+    Returns:
+        Dictionary with the entities and the NER timing
+    """
+    from ocr_utils import extract_entities_from_text
+
+    _, on_entity = _event_reporters(events)
+    start = time.perf_counter()
+    with span("ner"):
+        entities = extract_entities_from_text(text, document_type, on_entity=on_entity)
+    return {"entities": entities, "timings": {"ner": time.perf_counter() - start}}
+
+
+def run_batch_extraction(items: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Dict[str, Any]]:
+    """
+    Run OCR and entity extraction for a batch of documents
+
+    Executed inside a worker process. OCR runs over the batch at once and
+    spaCy parses all texts with nlp.pipe, so the per-document model overhead
+    is shared across the batch.
+
+    Args:
+        items: (file_path, document_type, content_hash) of each document
+
+    Returns:
+        List with the result of each document, in the same shape as
+        run_extraction returns; timings are the batch totals split evenly
+    """
+    from ocr_utils import extract_texts_with_report, extract_entities_batch
+    from pdf_ingest import is_pdf, extract_pdf_text
+
+    start = time.perf_counter()
+    # PDFs are read page by page; images go through the engines as one batch
+    ocr_results: List[Tuple[str, Optional[Dict[str, Any]], Optional[List[Dict[str, Any]]]]] = [None] * len(items)
+    image_indices = []
+    for index, (file_path, _, content_hash) in enumerate(items):
+        if is_pdf(file_path):
+            pdf = extract_pdf_text(file_path, content_hash)
+            ocr_results[index] = (pdf["text"], None, pdf["pages"])
+        else:
+            image_indices.append(index)
+    image_results = extract_texts_with_report([items[index][0] for index in image_indices],
+                                              [items[index][2] for index in image_indices],
+                                              [items[index][1] for index in image_indices])
+    for index, (text, report) in zip(image_indices, image_results):
+        ocr_results[index] = (text, report, None)
+    ocr_done = time.perf_counter()
+    texts = [text for text, _, _ in ocr_results]
+    entities = extract_entities_batch(texts, [item[1] for item in items])
+    ner_done = time.perf_counter()
+    for _ in items:
+        observe_stage("ocr", (ocr_done - start) / len(items))
+        observe_stage("ner", (ner_done - ocr_done) / len(items))
+
+    return [
+        {
+            "extracted_text": text,
+            "entities": document_entities,
+            "timings": {
+                "ocr": (ocr_done - start) / len(items),
+                "ner": (ner_done - ocr_done) / len(items),
+            },
+            "ocr": report,
+            "pages": pages,
+        }
+        for (text, report, pages), document_entities in zip(ocr_results, entities)
+    ]
+
+
+class JobQueue:
+    """
+    Tracks extraction jobs and dispatches them to a pool of workers
+    """
+
+    def __init__(self, max_workers: int = OCR_WORKERS):
+        self.max_workers = max_workers
+        self.executor: Optional[Executor] = None
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.warm_up_task: Optional[asyncio.Task] = None
+        self.warm_workers: Dict[int, Dict[str, Any]] = {}
+        self.warm_up_error: Optional[str] = None
+        self.status_queue = None
+        # Serves the event queues of worker processes; started on first use
+        self.manager = None
+        self.manager_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker pool"""
+        if self.executor is not None:
+            return
+        if self.max_workers > 0:
+            # Spawn rather than fork so workers do not inherit the server's
+            # threads and each loads its own copy of the models
+            context = multiprocessing.get_context("spawn")
+            self.status_queue = context.Queue()
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.status_queue,),
+            )
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-job")
+        if self.max_workers > 0:
+            logger.info("Job queue started with %d worker process(es)", self.max_workers)
+        else:
+            logger.info("Job queue started in-process")
+
+    def shutdown(self):
+        """Stop the worker pool, cancelling jobs that have not started"""
+        if self.executor is None:
+            return
+        if self.warm_up_task is not None:
+            self.warm_up_task.cancel()
+            self.warm_up_task = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
+
+    def warm_up(self):
+        """
+        Start every worker and load its models in the background
+
+        Must be called from within the running event loop. Progress is
+        reported by readiness().
+        """
+        if self.executor is None:
+            self.start()
+        if self.warm_up_task is None:
+            self.warm_up_task = asyncio.get_running_loop().create_task(self._warm_up())
+
+    async def _warm_up(self):
+        """Make the pool spawn every worker and collect the status each one reports"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            if self.status_queue is None:
+                # In-process mode: load the models on the job thread
+                worker = await loop.run_in_executor(self.executor, warm_up_worker)
+                self.warm_workers[worker["pid"]] = worker["models"]
+            else:
+                # Workers are spawned on demand, so submit one trivial call per
+                # worker. Each worker reports from its initializer, because a
+                # fast worker may well answer all of these calls itself.
+                for _ in range(self.max_workers):
+                    loop.run_in_executor(self.executor, os.getpid)
+                while len(self.warm_workers) < self.max_workers:
+                    try:
+                        worker = await loop.run_in_executor(None, self.status_queue.get, True, 1.0)
+                    except queue.Empty:
+                        continue
+                    self.warm_workers[worker["pid"]] = worker["models"]
+        except Exception as e:
+            self.warm_up_error = str(e)
+            logger.error("Worker warm-up failed: %s", e)
+            return
+        logger.info("Workers warmed up in %.2fs", time.perf_counter() - start)
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Report whether the workers have finished loading their models
+
+        Returns:
+            Dictionary with ready and degraded flags, worker counts and the
+            model status of each warmed-up worker
+        """
+        task = self.warm_up_task
+        ready = task is not None and task.done() and self.warm_up_error is None
+        # A missing model is not fatal (extraction falls back to the other
+        # engine or to the rule-based extractors) but is reported
+        degraded = any(not status["available"] for models in self.warm_workers.values()
+                       for status in models.values())
+        return {
+            "ready": ready,
+            "degraded": degraded,
+            "warm_workers": len(self.warm_workers),
+            "expected_workers": max(1, self.max_workers),
+            "error": self.warm_up_error,
+            "workers": [
+                {"pid": pid, "models": models} for pid, models in self.warm_workers.items()
+            ],
+        }
+
+    def event_queue(self):
+        """
+        Make a queue a job can report its progress on while it runs
+
+        Worker processes cannot share a plain queue with the server, so in
+        process mode the queue lives in a manager process, started on first
+        use. Blocks, so call it from a thread.
+        """
+        if self.max_workers == 0:
+            return queue.Queue()
+        with self.manager_lock:
+            if self.manager is None:
+                self.manager = multiprocessing.get_context("spawn").Manager()
+            return self.manager.Queue()
+
+    def submit(self, fn: Callable[..., Any], *args: Any, kind: str = "extract",
+               document_id: Optional[str] = None,
+               on_success: Optional[Callable[[Any], Any]] = None,
+               admission=None) -> str:
+        """
+        Queue a job for execution in the worker pool
+
+        Must be called from within the running event loop.
+
+        Args:
+            fn: Picklable top-level function to run in a worker
+            *args: Arguments for the function
+            kind: Kind of job, reported in the job status
+            document_id: Document the job belongs to, if any
+            on_success: Called on the event loop with the result when the job succeeds;
+                if it returns an awaitable, the job is done once that finishes too
+            admission: Place in an admission-controlled stage (see admission); the
+                job stays queued until it gets a slot, and holds it until done
+
+        Returns:
+            Job ID that can be used to query the job status
+        """
+        if self.executor is None:
+            self.start()
+
+        if admission is not None:
+            job_id = str(uuid.uuid4())
+            return self._add_job(self._run_admitted(job_id, admission, kind, fn, *args), kind, document_id,
+                                 on_success, queued=True, job_id=job_id)
+        future = self.executor.submit(_run_observed, kind, time.time(), fn, *args)
+        return self._add_job(self._unwrap(future), kind, document_id, on_success, future)
+
+    async def _run_admitted(self, job_id: str, admission, kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """Wait for a slot of the job's stage, then run it in the pool"""
+        async with admission:
+            future = self.executor.submit(_run_observed, kind, time.time(), fn, *args)
+            self.jobs[job_id]["future"] = future
+            return await self._unwrap(future)
+
+    async def run(self, fn: Callable[..., Any], *args: Any, kind: str = "step") -> Any:
+        """
+        Run a function in the worker pool without tracking it as a job
+
+        For the many small steps of a job submitted with submit_async, which
+        would otherwise crowd the job list.
+        """
+        if self.executor is None:
+            self.start()
+        return await self._unwrap(self.executor.submit(_run_observed, kind, time.time(), fn, *args))
+
+    async def _unwrap(self, future) -> Any:
+        """Wait for a job run by _run_observed, merge its metrics and return its result"""
+        result, observations = await asyncio.wrap_future(future)
+        metrics.merge(observations)
+        return result
+
+    def submit_async(self, awaitable: Awaitable[Any], kind: str,
+                     document_id: Optional[str] = None,
+                     on_success: Optional[Callable[[Any], Any]] = None,
+                     progress: Optional[Dict[str, Any]] = None,
+                     admission=None) -> str:
+        """
+        Track a coroutine that coordinates several worker jobs as one job
+
+        Must be called from within the running event loop.
+
+        Args:
+            awaitable: Coroutine producing the job result
+            kind: Kind of job, reported in the job status
+            document_id: Document the job belongs to, if any
+            on_success: Called on the event loop with the result when the job succeeds;
+                if it returns an awaitable, the job is done once that finishes too
+            progress: Dictionary the coroutine updates as it goes, reported in the job status
+            admission: Place in an admission-controlled stage (see admission); the
+                coroutine starts once it gets a slot, and holds it until done
+
+        Returns:
+            Job ID that can be used to query the job status
+        """
+        if admission is not None:
+            job_id = str(uuid.uuid4())
+            return self._add_job(self._await_admitted(job_id, admission, awaitable), kind, document_id,
+                                 on_success, progress=progress, queued=True, job_id=job_id)
+        return self._add_job(awaitable, kind, document_id, on_success, progress=progress)
+
+    async def _await_admitted(self, job_id: str, admission, awaitable: Awaitable[Any]) -> Any:
+        """Wait for a slot of the job's stage, then run the coroutine"""
+        try:
+            async with admission:
+                self.jobs[job_id]["status"] = "running"
+                return await awaitable
+        finally:
+            # Close the coroutine if it never started, e.g. when the server stopped first
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+
+    def _add_job(self, awaitable: Awaitable[Any], kind: str, document_id: Optional[str],
+                 on_success: Optional[Callable[[Any], Any]], future=None,
+                 progress: Optional[Dict[str, Any]] = None, queued: bool = False,
+                 job_id: Optional[str] = None) -> str:
+        """Register a job and start tracking its outcome"""
+        job_id = job_id or str(uuid.uuid4())
+        self.jobs[job_id] = {
+            "job_id": job_id,
+            "kind": kind,
+            "document_id": document_id,
+            # Coordinating coroutines start running right away, unless waiting for admission
+            "status": "queued" if future is not None or queued else "running",
+            "created_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "progress": progress,
+            "future": future,
+        }
+        self.tasks[job_id] = asyncio.get_running_loop().create_task(
+            self._track(job_id, awaitable, on_success)
+        )
+        return job_id
+
+    async def _track(self, job_id: str, awaitable: Awaitable[Any], on_success):
+        """
+        Wait for a job without blocking the loop and record its outcome
+
+        Returns a (result, error) tuple so a failed job that nobody awaits
+        does not leave an unretrieved task exception behind.
+        """
+        job = self.jobs[job_id]
+        try:
+            result = await awaitable
+            if on_success is not None:
+                stored = on_success(result)
+                if inspect.isawaitable(stored):
+                    await stored
+            job["status"] = "completed"
+            job["result"] = result
+            return result, None
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            return None, e
+        finally:
+            job["finished_at"] = time.time()
+            JOB_SECONDS.observe(job["finished_at"] - job["created_at"], job["kind"], job["status"])
+            job.pop("future", None)
+            self.tasks.pop(job_id, None)
+            self._prune()
+
+    def _prune(self):
+        """Forget the oldest finished jobs once more than MAX_FINISHED_JOBS are kept"""
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def wait(self, job_id: str) -> Any:
+        """
+        Wait for a job to finish and return its result
+
+        Raises the job's exception if it failed.
+        """
+        task = self.tasks.get(job_id)
+        if task is not None:
+            result, error = await asyncio.shield(task)
+            if error is not None:
+                raise error
+            return result
+        job = self.jobs[job_id]
+        if job["status"] == "failed":
+            raise RuntimeError(job["error"])
+        return job["result"]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the public status of a job, or None if it is unknown"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        status = job["status"]
+        future = job.get("future")
+        if status == "queued" and future is not None and future.running():
+            status = "running"
+        return {
+            "job_id": job["job_id"],
+            "kind": job["kind"],
+            "document_id": job["document_id"],
+            "status": status,
+            "created_at": job["created_at"],
+            "finished_at": job["finished_at"],
+            "result": job["result"],
+            "error": job["error"],
+            "progress": dict(job["progress"]) if job["progress"] is not None else None,
+        }
+
+    def pending_count(self) -> int:
+        """Number of jobs that are queued or running"""
+        return len(self.tasks)
+
+    def depths(self) -> Dict[Tuple[str, str], int]:
+        """Number of unfinished jobs by kind and status (queued or running)"""
+        counts: Dict[Tuple[str, str], int] = {}
+        for job_id in list(self.tasks):
+            job = self.get(job_id)
+            if job is not None:
+                key = (job["kind"], job["status"])
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+def next_event(events, timeout: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Take the next event off an event queue, or None if none comes within the timeout"""
+    try:
+        return events.get(True, timeout)
+    except queue.Empty:
+        return None
+
+
+job_queue = JobQueue()
+
+
+def _collect_queue_depths():
+    yield ("jobs_in_flight", "gauge", "Unfinished jobs by kind and status (queued or running)",
+           ["kind", "status"], [(key, count) for key, count in sorted(job_queue.depths().items())])
+    yield ("warm_workers", "gauge", "Worker processes that have loaded their models", [],
+           [((), len(job_queue.warm_workers))])
+
+
+metrics.add_collector(_collect_queue_depths)
@@ -0,0 +1,190 @@
+"""
+Region-of-interest OCR for document types with a known layout.
+
+Aadhaar, PAN and voter cards print each field at a fixed place. The layout
+templates in layouts/*.json give, per document type, the card's aspect ratio
+and for each field a region in coordinates normalised to the card (0-1),
+the Tesseract page segmentation mode and character whitelist to read it
+with, and a pattern a correct reading must match.
+
+When the card can be located in the image and enough fields read
+correctly, only those small crops are OCR'd. Otherwise the caller falls
+back to whole-page OCR.
+"""
+import glob
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+LAYOUT_OCR_ENABLED = os.environ.get("LAYOUT_OCR_ENABLED", "1") not in ("0", "false", "False")
+LAYOUTS_DIR = os.environ.get("LAYOUTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts"))
+
+# Pixels that differ from the background by more than this belong to the card
+BACKGROUND_DIFFERENCE = 30
+# Share of a row or column that must be card for it to count as part of the card
+CARD_COVERAGE = 0.25
+# Extra margin around each field region, as a fraction of the card size
+REGION_PADDING = 0.01
+# Crops shorter than this are enlarged, since Tesseract reads small text poorly
+MIN_CROP_HEIGHT = 40
+
+# Reads one cropped field: (crop, psm, whitelist) -> {"text", "confidence"}
+FieldReader = Callable[[np.ndarray, int, Optional[str]], Dict[str, Any]]
+
+_layouts: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def load_layouts(directory: str = LAYOUTS_DIR) -> Dict[str, Dict[str, Any]]:
+    """
+    Load and validate the layout templates
+
+    Returns:
+        Layouts by document type, with each field pattern compiled
+    """
+    layouts = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            layout = json.load(f)
+        for field in layout["fields"]:
+            x0, y0, x1, y1 = field["region"]
+            if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+                raise ValueError(f"Invalid region for field '{field['name']}' in {path}")
+            field["compiled_pattern"] = re.compile(field["pattern"])
+        layouts[layout["document_type"]] = layout
+    return layouts
+
+
+def get_layout(document_type: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Get the layout template of a document type, if there is one and layout OCR is enabled"""
+    global _layouts
+    if not LAYOUT_OCR_ENABLED or not document_type:
+        return None
+    if _layouts is None:
+        _layouts = load_layouts()
+    return _layouts.get(document_type.lower())
+
+
+def layout_cache_config(layout: Dict[str, Any]) -> Dict[str, Any]:
+    """Part of the layout that determines the OCR output, for the cache key"""
+    return {
+        "document_type": layout["document_type"],
+        "version": layout["version"],
+        "fields": [{key: value for key, value in field.items() if key != "compiled_pattern"}
+                   for field in layout["fields"]],
+    }
+
+
+def _aspect_matches(width: int, height: int, layout: Dict[str, Any]) -> bool:
+    ratio = width / height
+    return abs(ratio - layout["aspect_ratio"]) / layout["aspect_ratio"] <= layout["aspect_tolerance"]
+
+
+def locate_document(gray: np.ndarray, layout: Dict[str, Any]) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Find the card in an image
+
+    A scan cropped to the card is used as is. Otherwise the background is
+    estimated from the image border and the card is the block of rows and
+    columns that mostly differ from it.
+
+    Args:
+        gray: Grayscale image, already deskewed
+        layout: Layout template of the expected document type
+
+    Returns:
+        (left, top, right, bottom) of the card in pixels, or None if no
+        region with the card's aspect ratio was found
+    """
+    height, width = gray.shape
+    if _aspect_matches(width, height, layout):
+        return 0, 0, width, height
+
+    margin = max(2, min(height, width) // 50)
+    border = np.concatenate([gray[:margin].ravel(), gray[-margin:].ravel(),
+                             gray[:, :margin].ravel(), gray[:, -margin:].ravel()])
+    background = float(np.median(border))
+    card = np.abs(gray.astype(np.int16) - int(background)) > BACKGROUND_DIFFERENCE
+
+    rows = np.nonzero(card.mean(axis=1) > CARD_COVERAGE)[0]
+    columns = np.nonzero(card.mean(axis=0) > CARD_COVERAGE)[0]
+    if len(rows) == 0 or len(columns) == 0:
+        return None
+    left, top, right, bottom = int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1
+    if not _aspect_matches(right - left, bottom - top, layout):
+        return None
+    return left, top, right, bottom
+
+
+def crop_field(gray: np.ndarray, box: Tuple[int, int, int, int], region: List[float]) -> np.ndarray:
+    """Cut a field region, given in card coordinates, out of the image"""
+    left, top, right, bottom = box
+    card_width, card_height = right - left, bottom - top
+    x0, y0, x1, y1 = region
+    crop = gray[
+        max(top, int(top + (y0 - REGION_PADDING) * card_height)):min(bottom, int(top + (y1 + REGION_PADDING) * card_height)),
+        max(left, int(left + (x0 - REGION_PADDING) * card_width)):min(right, int(left + (x1 + REGION_PADDING) * card_width)),
+    ]
+    if 0 < crop.shape[0] < MIN_CROP_HEIGHT:
+        scale = MIN_CROP_HEIGHT / crop.shape[0]
+        crop = np.asarray(Image.fromarray(crop).resize(
+            (max(1, round(crop.shape[1] * scale)), MIN_CROP_HEIGHT), Image.Resampling.BICUBIC))
+    return crop
+
+
+def read_layout(gray: np.ndarray, layout: Dict[str, Any], read_field: FieldReader) -> Dict[str, Any]:
+    """
+    OCR the fields of a known layout
+
+    Args:
+        gray: Grayscale image, already deskewed
+        layout: Layout template of the document type
+        read_field: Reads one cropped field
+
+    Returns:
+        Dictionary with "aligned" (whether the layout could be used), the
+        labelled text of the fields that read correctly, per-field results,
+        the card position and the time taken; "reason" says why alignment
+        failed
+    """
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"document_type": layout["document_type"], "aligned": False,
+                              "text": "", "fields": {}, "box": None}
+
+    box = locate_document(gray, layout)
+    if box is None:
+        result["reason"] = "card not found"
+        result["seconds"] = time.perf_counter() - start
+        return result
+    result["box"] = list(box)
+
+    lines = []
+    valid_count = 0
+    for field in layout["fields"]:
+        crop = crop_field(gray, box, field["region"])
+        if crop.size == 0:
+            output = {"text": "", "confidence": None}
+        else:
+            output = read_field(crop, field.get("psm", 7), field.get("whitelist"))
+        value = " ".join(output["text"].split())
+        valid = bool(field["compiled_pattern"].search(value))
+        result["fields"][field["name"]] = {"value": value, "confidence": output["confidence"], "valid": valid}
+        if valid:
+            valid_count += 1
+            lines.append(f"{field['label']}: {value}" if field.get("label") else value)
+        elif field.get("required"):
+            result["reason"] = f"required field '{field['name']}' not read"
+            result["seconds"] = time.perf_counter() - start
+            return result
+
+    if valid_count < layout.get("min_valid_fields", 1):
+        result["reason"] = f"only {valid_count} field(s) read"
+    else:
+        result["aligned"] = True
+        result["text"] = "\n".join(lines)
+    result["seconds"] = time.perf_counter() - start
+    return result
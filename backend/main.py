@@ -1,21 +1,54 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uuid
+import logging
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
 import json
 import base64
-from ocr_utils import extract_text_from_image, extract_entities_from_text
+import hashlib
+import asyncio
+import time
+from observability import configure_logging, metrics, request_id_var, span
+from admission import (extract_limiter, pdf_limiter, rate_limiter, client_key, RATE_LIMITED,
+                       stats as admission_stats)
+from job_queue import job_queue, next_event, run_extraction, run_batch_extraction, run_entity_extraction
+import pdf_ingest
+from pdf_ingest import is_pdf, page_count, extract_pdf_page
+from ocr_cache import ocr_cache
+from document_store import document_store
+from storage_manager import storage, STORAGE_PDFS_DIR, STORAGE_SWEEP_INTERVAL
+from ocr_orchestrator import engine_stats
 from form_mapping import map_entities_to_form
-from pdf_generator import create_downloadable_pdf
+from template_registry import template_registry
+from pdf_generator import (create_downloadable_pdf, render_pdf, pdf_cache_key, safe_form_type,
+                           merge_pdfs, zip_pdfs)
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="AI-Powered Form Filling Assistant", 
               description="An AI system for extracting information from government documents and filling forms",
               version="1.0.0")
 
+# Upload limits
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Allowance for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+# Batch extraction limits. Each batch is split into chunks of
+# EXTRACT_BATCH_SIZE documents, one worker job per chunk.
+MAX_BATCH_DOCUMENTS = int(os.environ.get("MAX_BATCH_DOCUMENTS", "50"))
+EXTRACT_BATCH_SIZE = int(os.environ.get("EXTRACT_BATCH_SIZE", "4"))
+
+# Most forms accepted by one bulk PDF request
+MAX_BULK_PDF_FORMS = int(os.environ.get("MAX_BULK_PDF_FORMS", "500"))
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,7 +60,9 @@ app.add_middleware(
 
 # Serve static files from frontend
 app.mount("/static", StaticFiles(directory="../frontend"), name="static")
-app.mount("/temp", StaticFiles(directory="temp"), name="temp")
+# Generated PDFs are served from their storage directory
+os.makedirs(STORAGE_PDFS_DIR, exist_ok=True)
+app.mount("/temp", StaticFiles(directory=STORAGE_PDFS_DIR), name="temp")
 
 class DocumentUploadResponse(BaseModel):
     document_id: str
@@ -36,16 +71,42 @@ class DocumentUploadResponse(BaseModel):
 class ExtractionRequest(BaseModel):
     document_id: str
     document_type: Optional[str] = None
+    wait: bool = True  # When False, return a job ID immediately instead of the result
 
 class ExtractionResponse(BaseModel):
     document_id: str
     extracted_text: str
     entities: Dict[str, Any]
 
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    document_id: Optional[str] = None
+    status: str
+    created_at: float
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+
 class FormFillRequest(BaseModel):
     document_id: str
     form_type: str
 
+class GeneratePDFRequest(FormFillRequest):
+    # Form data as edited by the user; mapped from the extracted entities when omitted
+    form_data: Optional[Dict[str, Any]] = None
+    stream: bool = False  # Return the PDF itself instead of a path to download it from
+
+class BulkPDFItem(BaseModel):
+    document_id: str
+    form_type: str
+    form_data: Optional[Dict[str, Any]] = None
+
+class BulkPDFRequest(BaseModel):
+    items: List[BulkPDFItem]
+    output: str = "zip"  # "zip" for one PDF per form, "merged" for a single PDF
+
 class FormFillResponse(BaseModel):
     document_id: str
     form_type: str
@@ -60,8 +121,128 @@ class VoiceInputResponse(BaseModel):
     text: str
     message: str
 
-# In-memory storage for documents and extracted data
-document_storage: Dict[str, Dict[str, Any]] = {}
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads whose declared size is over the limit before the body is read"""
+    limits = {
+        "/upload": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+        "/extract-batch": MAX_BATCH_DOCUMENTS * (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    }
+    if request.method == "POST" and request.url.path in limits:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and \
+                int(content_length) > limits[request.url.path]:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Maximum size is {MAX_UPLOAD_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+# Endpoints that start OCR, NER or PDF work, subject to the per-client rate limit
+RATE_LIMITED_PATHS = {"/extract", "/extract-pages", "/extract-stream", "/extract-batch", "/generate-pdf",
+                      "/generate-pdf/bulk"}
+
+@app.middleware("http")
+async def limit_client_rate(request: Request, call_next):
+    """Refuse expensive requests from clients over their rate limit with 429"""
+    if request.method == "POST" and request.url.path in RATE_LIMITED_PATHS:
+        client = client_key(request.headers, request.client.host if request.client else None)
+        retry_after = rate_limiter.check(client)
+        if retry_after is not None:
+            RATE_LIMITED.inc(request.url.path)
+            logger.info("Rate limited client %s on %s", client, request.url.path)
+            return JSONResponse(
+                status_code=429,
+                content={"detail": f"Too many requests. Retry in {retry_after} seconds"},
+                headers={"Retry-After": str(retry_after)}
+            )
+    return await call_next(request)
+
+HTTP_REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds",
+                                         "Time to the response headers of HTTP requests",
+                                         ["method", "route", "status"])
+HTTP_IN_FLIGHT = metrics.gauge("http_requests_in_flight", "HTTP requests being handled")
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """
+    Time every request by route and tag its log records with a request ID
+
+    The ID is taken from the X-Request-ID header if the client sent one and
+    is echoed back in the response. Streamed responses are timed until their
+    headers are sent.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(request_id)
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # The route template, not the path, so document IDs do not create new series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, route, str(status))
+        request_id_var.reset(token)
+
+# How often expired documents and their files are cleaned up
+DOCUMENT_PURGE_INTERVAL = float(os.environ.get("DOCUMENT_PURGE_INTERVAL", "600"))
+
+# Load the OCR and NLP models in every worker at startup. When disabled,
+# each worker loads them lazily on its first job instead.
+WARM_UP_MODELS = os.environ.get("WARM_UP_MODELS", "1") not in ("0", "false", "False")
+
+background_tasks: List[asyncio.Task] = []
+
+@app.on_event("startup")
+async def start_job_queue():
+    """Start the OCR worker pool and warm up the models in the background"""
+    job_queue.start()
+    if WARM_UP_MODELS:
+        job_queue.warm_up()
+    background_tasks.append(asyncio.create_task(purge_expired_documents()))
+    background_tasks.append(asyncio.create_task(sweep_storage()))
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    """Stop the OCR worker pool"""
+    for task in background_tasks:
+        task.cancel()
+    job_queue.shutdown()
+
+def remove_expired_documents() -> int:
+    """Delete expired document records and their uploaded files"""
+    expired = document_store.purge_expired()
+    for record in expired:
+        try:
+            os.remove(record["file_path"])
+        except OSError:
+            pass  # Already removed, e.g. by another server process
+    return len(expired)
+
+async def purge_expired_documents():
+    """Periodically remove expired documents"""
+    while True:
+        try:
+            removed = await run_in_threadpool(remove_expired_documents)
+            if removed:
+                logger.info("Removed %d expired document(s)", removed)
+        except Exception:
+            logger.exception("Document cleanup failed")
+        await asyncio.sleep(DOCUMENT_PURGE_INTERVAL)
+
+async def sweep_storage():
+    """Periodically evict expired and least recently used files from disk"""
+    while True:
+        try:
+            await run_in_threadpool(storage.sweep_all)
+        except Exception:
+            logger.exception("Storage sweep failed")
+        await asyncio.sleep(STORAGE_SWEEP_INTERVAL)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -69,91 +250,572 @@ async def read_root():
     with open("../frontend/index.html", "r", encoding="utf-8") as f:
         return HTMLResponse(content=f.read())
 
-@app.post("/upload", response_model=DocumentUploadResponse)
-async def upload_document(file: UploadFile = File(...)):
-    """Upload a document (PDF, image) for processing"""
+async def save_upload(file: UploadFile, file_path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, int]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks
+    
+    File writes run in the thread pool so the event loop is never blocked,
+    and the content hash and size are computed while streaming. The partial
+    file is removed if the upload exceeds max_bytes.
+    
+    Returns:
+        Tuple of (sha256 hex digest, size in bytes)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    out = await run_in_threadpool(open, file_path, "wb")
     try:
-        # Generate a unique document ID
-        document_id = str(uuid.uuid4())
-        
-        # Read the file content
-        file_content = await file.read()
-        
-        # Save the file temporarily
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size is {max_bytes} bytes"
+                )
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(os.remove, file_path)
+        raise
+    await run_in_threadpool(out.close)
+    return digest.hexdigest(), size
+
+async def store_upload(file: UploadFile, document_type: Optional[str] = None) -> str:
+    """
+    Save an uploaded file and register it in the document storage
+
+    Returns:
+        ID of the new document
+    """
+    # Generate a unique document ID
+    document_id = str(uuid.uuid4())
+    
+    with span("upload"):
+        # Stream the file to disk
         file_extension = file.filename.split('.')[-1].lower()
-        file_path = f"temp_{document_id}.{file_extension}"
-        
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        file_path = await run_in_threadpool(storage.path_for, "uploads", f"{document_id}.{file_extension}")
+        content_hash, file_size = await save_upload(file, file_path)
+        await run_in_threadpool(storage.record_write, "uploads", file_size)
         
         # Store document info
-        document_storage[document_id] = {
+        await run_in_threadpool(document_store.create, document_id, {
             "file_path": file_path,
             "filename": file.filename,
             "file_type": file.content_type,
-            "upload_time": str(uuid.uuid4()),  # Using this as a simple timestamp
-            "document_type": None  # Will be set later when user selects document type
-        }
+            "file_size": file_size,
+            "content_hash": content_hash,
+            "upload_time": time.time(),
+            "document_type": document_type  # Set later when user selects document type, if not given
+        })
+    logger.info("Stored upload %s as document %s (%d bytes)", file.filename, document_id, file_size)
+    return document_id
+
+@app.post("/upload", response_model=DocumentUploadResponse)
+async def upload_document(file: UploadFile = File(...)):
+    """Upload a document (PDF, image) for processing"""
+    try:
+        document_id = await store_upload(file)
         
         return DocumentUploadResponse(
             document_id=document_id,
             message=f"Document {file.filename} uploaded successfully"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+async def get_document(document_id: str, document_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Look up a document, first setting its type if one is given
+
+    Returns:
+        The document record, or None if it does not exist or has expired
+    """
+    if document_type:
+        found = await run_in_threadpool(document_store.update, document_id, document_type=document_type)
+        if not found:
+            return None
+    return await run_in_threadpool(document_store.get, document_id)
+
+def require_file(document: Dict[str, Any]) -> str:
+    """
+    Get the path of a document's uploaded file, marking it as recently used
+
+    Raises:
+        HTTPException: 410 if the file has been evicted from storage
+    """
+    file_path = document["file_path"]
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=410, detail="Uploaded file has expired, please upload it again")
+    storage.touch(file_path)
+    return file_path
+
+async def store_extraction(document_id: str, result: Dict[str, Any]):
+    """Record OCR statistics for an extraction result and store its text and entities"""
+    engine_stats.record(result.get("ocr"))
+    for page in result.get("pages") or []:
+        engine_stats.record(page.get("ocr"))
+    await run_in_threadpool(document_store.update, document_id,
+                            extracted_text=result["extracted_text"], entities=result["entities"])
+
+def pdf_support_available() -> bool:
+    """Whether the PDF rasteriser is installed"""
+    return pdf_ingest.pdfium is not None
+
+async def read_pdf_pages(file_path: str, content_hash: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Read the pages of a PDF in parallel across the worker pool
+
+    Yields:
+        Result of each page (see pdf_ingest.extract_pdf_page) as soon as it finishes
+    """
+    count = await run_in_threadpool(page_count, file_path)
+    job_ids = [
+        job_queue.submit(extract_pdf_page, file_path, page_index, content_hash, kind="pdf-page")
+        for page_index in range(count)
+    ]
+    for next_page in asyncio.as_completed([job_queue.wait(job_id) for job_id in job_ids]):
+        yield await next_page
+
+async def extract_pdf_document(file_path: str, document_type: Optional[str] = None,
+                               content_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract text and entities from a PDF, reading its pages in parallel
+
+    Args:
+        file_path: Path to the PDF
+        document_type: Type of document (aadhaar, pan, voter) to help with extraction
+        content_hash: SHA-256 of the PDF, used for the OCR cache
+
+    Returns:
+        Result in the same shape as job_queue.run_extraction
+    """
+    pages = [page async for page in read_pdf_pages(file_path, content_hash)]
+    return await extract_pdf_entities(pages, document_type)
+
+def join_pages(pages: List[Dict[str, Any]]) -> str:
+    """Text of a PDF from the results of its pages, in page order"""
+    return " ".join(page["text"] for page in sorted(pages, key=lambda page: page["page"]) if page["text"])
+
+async def extract_pdf_entities(pages: List[Dict[str, Any]], document_type: Optional[str] = None,
+                               events=None) -> Dict[str, Any]:
+    """
+    Join the text of the pages of a PDF and extract entities from it in a worker
+
+    Args:
+        pages: Result of each page
+        document_type: Type of document (aadhaar, pan, voter) to help with extraction
+        events: Queue from job_queue.event_queue() the worker reports each entity on
+
+    Returns:
+        Result in the same shape as job_queue.run_extraction; the OCR timing
+        is the total time spent on the pages across all workers
+    """
+    pages = sorted(pages, key=lambda page: page["page"])
+    extracted_text = join_pages(pages)
+    ner = await job_queue.wait(job_queue.submit(run_entity_extraction, extracted_text, document_type, events,
+                                                kind="ner"))
+    return {
+        "extracted_text": extracted_text,
+        "entities": ner["entities"],
+        "timings": {"ocr": sum(page["seconds"] for page in pages), "ner": ner["timings"]["ner"]},
+        "ocr": None,
+        "pages": pages,
+    }
+
 @app.post("/extract", response_model=ExtractionResponse)
 async def extract_information(request: ExtractionRequest):
-    """Extract text and entities from the uploaded document"""
+    """
+    Extract text and entities from the uploaded document
+
+    OCR and NER run in the background worker pool. By default the request
+    waits for the result without blocking the server; with ``wait`` set to
+    false it returns the job ID right away for polling via ``/jobs/{job_id}``.
+    """
     try:
-        print(f"Starting extraction for document ID: {request.document_id}")
-        if request.document_id not in document_storage:
-            print(f"Document not found in storage: {request.document_id}")
+        logger.info("Starting extraction for document %s", request.document_id)
+        document = await get_document(request.document_id, request.document_type)
+        if document is None:
+            logger.info("Document not found in storage: %s", request.document_id)
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Extract text from the document
-        file_path = document_storage[request.document_id]["file_path"]
-        print(f"Extracting text from file: {file_path}")
-        extracted_text = extract_text_from_image(file_path)
-        print(f"Extracted text length: {len(extracted_text)}")
-        print(f"Extracted text preview: {extracted_text[:200]}...")
+        # Get document type from storage if available
+        file_path = require_file(document)
+        doc_type = document.get("document_type")
+        content_hash = document.get("content_hash")
         
-        # Update document type if provided in request
-        if request.document_type:
-            document_storage[request.document_id]["document_type"] = request.document_type
+        async def store_result(result: Dict[str, Any]):
+            # Store extracted data, even if the client is not waiting for it
+            await store_extraction(request.document_id, result)
         
-        # Extract entities from the text
-        # Get document type from storage if available
-        doc_type = document_storage.get(request.document_id, {}).get('document_type', None)
-        entities = extract_entities_from_text(extracted_text, doc_type)
-        print(f"Extracted entities: {entities}")
+        pdf = is_pdf(file_path)
+        if pdf and not pdf_support_available():
+            raise HTTPException(status_code=415, detail="PDF support is not installed on the server")
+        # Refuse the request now if too many extractions are waiting already
+        admission = extract_limiter.admit()
+        try:
+            if pdf:
+                # Pages are read in parallel across the worker pool
+                job_id = job_queue.submit_async(
+                    extract_pdf_document(file_path, doc_type, content_hash),
+                    kind="extract", document_id=request.document_id, on_success=store_result,
+                    admission=admission
+                )
+            else:
+                job_id = job_queue.submit(
+                    run_extraction, file_path, doc_type, content_hash,
+                    kind="extract", document_id=request.document_id, on_success=store_result,
+                    admission=admission
+                )
+        except BaseException:
+            # No job took the place, so give it back
+            admission.cancel()
+            raise
+        logger.debug("Queued extraction job %s for file: %s", job_id, file_path)
         
-        # Store extracted data
-        document_storage[request.document_id]["extracted_text"] = extracted_text
-        document_storage[request.document_id]["entities"] = entities
+        if not request.wait:
+            return JSONResponse(status_code=202, content=job_queue.get(job_id))
+        
+        result = await job_queue.wait(job_id)
+        logger.debug("Extracted text length: %d", len(result["extracted_text"]))
         
         return ExtractionResponse(
             document_id=request.document_id,
-            extracted_text=extracted_text,
-            entities=entities
+            extracted_text=result["extracted_text"],
+            entities=result["entities"]
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Extraction failed: {str(e)}")
+        logger.exception("Extraction failed")
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
+def submit_admitted(admission, fn, *args, **kwargs) -> str:
+    """
+    Submit a job that takes over a place admitted for it, giving the place
+    back if the job cannot be submitted
+    """
+    try:
+        return job_queue.submit(fn, *args, admission=admission, **kwargs)
+    except BaseException:
+        admission.cancel()
+        raise
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    Streaming response that calls ``release`` once it ends, however it ends
+
+    Unlike a background task, which Starlette skips when the client is gone
+    before the response starts, ``release`` also runs then.
+    """
+
+    def __init__(self, content: AsyncIterator[str], release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+@app.post("/extract-pages")
+async def extract_pages(request: ExtractionRequest):
+    """
+    Extract a document page by page, streaming each page as it is read
+
+    The response is NDJSON: one line per page with its text and where the
+    text came from (text layer or OCR), in completion order, then a final
+    line with the full text and entities. Images count as a single page.
+    """
+    document = await get_document(request.document_id, request.document_type)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    file_path = require_file(document)
+    doc_type = document.get("document_type")
+    content_hash = document.get("content_hash")
+    pdf = is_pdf(file_path)
+    if pdf and not pdf_support_available():
+        raise HTTPException(status_code=415, detail="PDF support is not installed on the server")
+    admission = extract_limiter.admit()
+    started = False
+    
+    async def stream_pages():
+        nonlocal started
+        started = True
+        try:
+            if pdf:
+                pages = []
+                async with admission:
+                    async for page in read_pdf_pages(file_path, content_hash):
+                        pages.append(page)
+                        yield json.dumps({"page": page["page"], "text": page["text"],
+                                          "source": page["source"]}) + "\n"
+                    result = await extract_pdf_entities(pages, doc_type)
+            else:
+                result = await job_queue.wait(submit_admitted(
+                    admission, run_extraction, file_path, doc_type, content_hash,
+                    kind="extract", document_id=request.document_id
+                ))
+                yield json.dumps({"page": 0, "text": result["extracted_text"], "source": "ocr"}) + "\n"
+            await store_extraction(request.document_id, result)
+            yield json.dumps({
+                "document_id": request.document_id,
+                "status": "completed",
+                "extracted_text": result["extracted_text"],
+                "entities": result["entities"],
+            }) + "\n"
+        except Exception as e:
+            logger.exception("Extraction failed")
+            yield json.dumps({"document_id": request.document_id, "status": "failed",
+                              "error": f"Extraction failed: {str(e)}"}) + "\n"
+    
+    def release_unstarted():
+        # Once started, the stream or its job holds the place and gives it back
+        if not started:
+            admission.cancel()
+    
+    return ReleasingStreamingResponse(stream_pages(), release_unstarted, media_type="application/x-ndjson")
+
+# How long a stream waits for the next progress event before checking whether the job is done
+EVENT_POLL_SECONDS = 0.1
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def relay_events(events, work: "asyncio.Future") -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yield the progress events a job puts on its queue until the job is done
+
+    Events put just before the job finished are still yielded; the job's
+    outcome is left in ``work``.
+    """
+    while True:
+        finished = work.done()
+        event = await run_in_threadpool(next_event, events, 0 if finished else EVENT_POLL_SECONDS)
+        if event is not None:
+            yield event
+        elif finished:
+            return
+
+@app.post("/extract-stream")
+async def extract_stream(request: ExtractionRequest):
+    """
+    Extract a document, sending progress as Server-Sent Events
+
+    Events, each with a JSON payload, as the stages finish:
+
+    - ``ocr``: the text, score and latency of each OCR engine run on the whole page
+    - ``page``: the text of each page of a PDF, in completion order
+    - ``text``: the text entity extraction runs on
+    - ``entity``: each entity, with ``field``, ``value`` and ``confidence``, once final
+    - ``result``: the document ID, full text and entities, as ``/extract`` returns them
+    - ``error``: ``detail`` of why extraction failed
+
+    The total work is the same as for ``/extract``; results are stored the
+    same way.
+    """
+    document = await get_document(request.document_id, request.document_type)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    file_path = require_file(document)
+    doc_type = document.get("document_type")
+    content_hash = document.get("content_hash")
+    pdf = is_pdf(file_path)
+    if pdf and not pdf_support_available():
+        raise HTTPException(status_code=415, detail="PDF support is not installed on the server")
+    events = await run_in_threadpool(job_queue.event_queue)
+    admission = extract_limiter.admit()
+    started = False
+    
+    async def stream_events():
+        nonlocal started
+        started = True
+        try:
+            if pdf:
+                async with admission:
+                    pages = []
+                    async for page in read_pdf_pages(file_path, content_hash):
+                        pages.append(page)
+                        yield sse_event("page", {"page": page["page"], "text": page["text"],
+                                                 "source": page["source"]})
+                    yield sse_event("text", {"text": join_pages(pages), "engine": None, "cached": False})
+                    work = asyncio.ensure_future(extract_pdf_entities(pages, doc_type, events))
+                    async for event, data in relay_events(events, work):
+                        yield sse_event(event, data)
+                    result = await work
+                await store_extraction(request.document_id, result)
+            else:
+                job_id = submit_admitted(
+                    admission, run_extraction, file_path, doc_type, content_hash, events,
+                    kind="extract", document_id=request.document_id,
+                    on_success=lambda result: store_extraction(request.document_id, result)
+                )
+                work = asyncio.ensure_future(job_queue.wait(job_id))
+                async for event, data in relay_events(events, work):
+                    yield sse_event(event, data)
+                result = await work
+            yield sse_event("result", {
+                "document_id": request.document_id,
+                "extracted_text": result["extracted_text"],
+                "entities": result["entities"],
+            })
+        except Exception as e:
+            logger.exception("Extraction failed")
+            yield sse_event("error", {"detail": f"Extraction failed: {str(e)}"})
+    
+    def release_unstarted():
+        # Once started, the stream or its job holds the place and gives it back
+        if not started:
+            admission.cancel()
+    
+    return ReleasingStreamingResponse(stream_events(), release_unstarted, media_type="text/event-stream",
+                                      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/extract-batch")
+async def extract_batch(files: List[UploadFile] = File(default=[]),
+                        document_ids: List[str] = Form(default=[]),
+                        document_type: Optional[str] = Form(None)):
+    """
+    Extract text and entities from many documents in one request
+
+    Accepts new files, IDs of already uploaded documents, or both. The
+    documents are split into chunks that run as batch jobs in the worker
+    pool, and the response streams one JSON line per document (NDJSON) as
+    each chunk finishes, followed by a summary line.
+    """
+    if not files and not document_ids:
+        raise HTTPException(status_code=400, detail="No files or document IDs given")
+    if len(files) + len(document_ids) > MAX_BATCH_DOCUMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many documents. Maximum is {MAX_BATCH_DOCUMENTS} per batch"
+        )
+    # One place per chunk, taken before anything is stored; unused places are given back below
+    admissions = extract_limiter.admit_many(-(-(len(files) + len(document_ids)) // EXTRACT_BATCH_SIZE))
+    
+    try:
+        try:
+            # Upload new files first so a bad file fails the request before any work is queued
+            new_ids = [await store_upload(file, document_type) for file in files]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+        
+        documents = []
+        records = {}
+        missing = []
+        for document_id in new_ids + document_ids:
+            record = await get_document(document_id, document_type)
+            if record is None or not os.path.exists(record["file_path"]):
+                missing.append(document_id)
+                continue
+            storage.touch(record["file_path"])
+            documents.append(document_id)
+            records[document_id] = record
+    except BaseException:
+        # Nothing was queued, so give all the places back
+        for admission in admissions:
+            admission.cancel()
+        raise
+    
+    def store_results(chunk: List[str]):
+        async def store(results: List[Dict[str, Any]]):
+            for document_id, result in zip(chunk, results):
+                await store_extraction(document_id, result)
+        return store
+    
+    chunks = [documents[i:i + EXTRACT_BATCH_SIZE] for i in range(0, len(documents), EXTRACT_BATCH_SIZE)]
+    for admission in admissions[len(chunks):]:
+        admission.cancel()
+    jobs = []
+    try:
+        for chunk, admission in zip(chunks, admissions):
+            items = [
+                (records[document_id]["file_path"],
+                 records[document_id].get("document_type"),
+                 records[document_id].get("content_hash"))
+                for document_id in chunk
+            ]
+            job_id = job_queue.submit(run_batch_extraction, items, kind="extract-batch",
+                                      on_success=store_results(chunk), admission=admission)
+            jobs.append((job_id, chunk))
+    except BaseException:
+        # Give back the places of the chunks that were not queued
+        for admission in admissions[len(jobs):len(chunks)]:
+            admission.cancel()
+        raise
+    logger.info("Queued %d document(s) for batch extraction in %d job(s)", len(documents), len(jobs))
+    
+    async def wait_for_chunk(job_id: str, chunk: List[str]):
+        try:
+            return chunk, await job_queue.wait(job_id), None
+        except Exception as e:
+            return chunk, None, e
+    
+    async def stream_results():
+        start = time.perf_counter()
+        failed = len(missing)
+        for document_id in missing:
+            yield json.dumps({"document_id": document_id, "status": "failed",
+                              "error": "Document not found"}) + "\n"
+        for next_chunk in asyncio.as_completed([wait_for_chunk(job_id, chunk) for job_id, chunk in jobs]):
+            chunk, results, error = await next_chunk
+            if error is not None:
+                failed += len(chunk)
+                logger.error("Batch extraction failed: %s", error)
+                for document_id in chunk:
+                    yield json.dumps({"document_id": document_id, "status": "failed",
+                                      "error": f"Extraction failed: {error}"}) + "\n"
+                continue
+            for document_id, result in zip(chunk, results):
+                yield json.dumps({
+                    "document_id": document_id,
+                    "status": "completed",
+                    "extracted_text": result["extracted_text"],
+                    "entities": result["entities"],
+                    "timings": result["timings"],
+                }) + "\n"
+        yield json.dumps({
+            "summary": {
+                "documents": len(documents) + len(missing),
+                "completed": len(documents) + len(missing) - failed,
+                "failed": failed,
+                "seconds": time.perf_counter() - start,
+            }
+        }) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Get the status, and result once finished, of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.post("/fill-form", response_model=FormFillResponse)
 async def fill_form(request: FormFillRequest):
     """Map extracted entities to form fields"""
     try:
-        if request.document_id not in document_storage:
+        document = await get_document(request.document_id)
+        if document is None:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        if "entities" not in document_storage[request.document_id]:
+        if "entities" not in document:
             raise HTTPException(status_code=400, detail="No entities extracted yet")
         
         # Map entities to form fields
         filled_form_data, confidence_scores = map_entities_to_form(
-            document_storage[request.document_id]["entities"], 
+            document["entities"], 
             request.form_type
         )
         
@@ -180,45 +842,284 @@ async def voice_input(request: VoiceInputRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Voice input processing failed: {str(e)}")
 
+async def get_form_data(document_id: str, form_type: str) -> Dict[str, Any]:
+    """
+    Map a document's extracted entities to the fields of a form
+
+    Raises:
+        HTTPException: 404 if the document does not exist, 400 if it has not been extracted yet
+    """
+    document = await get_document(document_id)
+    if document is None:
+        logger.info("Document %s not found in storage", document_id)
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if "entities" not in document:
+        logger.info("No entities found for document %s", document_id)
+        raise HTTPException(status_code=400, detail="No entities extracted yet")
+    
+    filled_form_data, _ = map_entities_to_form(document["entities"], form_type)
+    return filled_form_data
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match header lists the given ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def pdf_headers(etag: str, form_type: str) -> Dict[str, str]:
+    """Response headers of a PDF sent from memory"""
+    return {
+        "ETag": etag,
+        # Browsers may keep the PDF but have to revalidate it with the ETag
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="form_{form_type}.pdf"',
+    }
+
+async def send_pdf(form_data: Dict[str, Any], form_type: str) -> Response:
+    """Render a PDF in the thread pool and send it back directly"""
+    content, key = await run_in_threadpool(render_pdf, form_data, form_type)
+    logger.debug("PDF rendered in memory: %d bytes", len(content))
+    return Response(content=content, media_type="application/pdf",
+                    headers=pdf_headers(f'"{key}"', form_type))
+
 @app.post("/generate-pdf")
-async def generate_pdf(request: FormFillRequest):
-    """Generate a filled PDF form"""
+async def generate_pdf(request: GeneratePDFRequest):
+    """
+    Generate a filled PDF form
+
+    Uses the form data sent by the client, falling back to mapping the
+    document's extracted entities. With ``stream`` set, the PDF is rendered
+    in memory and returned in the response; otherwise it is saved and its
+    download path returned, and identical form data yields the same,
+    already generated file.
+    """
     try:
-        print(f"PDF generation requested for document ID: {request.document_id}")
-        print(f"Document storage keys: {list(document_storage.keys())}")
-        
-        if request.document_id not in document_storage:
-            print(f"Document {request.document_id} not found in storage")
-            raise HTTPException(status_code=404, detail="Document not found")
+        logger.info("PDF generation requested for document %s", request.document_id)
+        if request.form_data is not None:
+            filled_form_data = request.form_data
+        else:
+            filled_form_data = await get_form_data(request.document_id, request.form_type)
         
-        print(f"Document found: {document_storage[request.document_id].keys()}")
+        async with pdf_limiter.admit():
+            if request.stream:
+                return await send_pdf(filled_form_data, request.form_type)
+            
+            # Generate PDF, or reuse the one generated for the same data
+            pdf_path = await run_in_threadpool(create_downloadable_pdf, filled_form_data, request.form_type)
         
-        if "entities" not in document_storage[request.document_id]:
-            print(f"No entities found for document {request.document_id}")
-            raise HTTPException(status_code=400, detail="No entities extracted yet")
-        
-        # Map entities to form fields
-        filled_form_data, confidence_scores = map_entities_to_form(
-            document_storage[request.document_id]["entities"], 
-            request.form_type
+        # Return the path under /temp for the frontend to construct the download URL
+        url_path = "/temp/" + os.path.relpath(pdf_path, STORAGE_PDFS_DIR).replace(os.sep, "/")
+        logger.debug("PDF generated: %s", url_path)
+        return {"pdf_path": url_path, "message": "PDF generated successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("PDF generation failed")
+        raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
+
+async def render_bulk_pdfs(items: List[BulkPDFItem], output: str, progress: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Render many forms in parallel across the worker pool and combine them
+
+    Forms that cannot be rendered (document missing or not extracted,
+    rendering error) are reported and left out of the output.
+
+    Args:
+        items: Forms to render
+        output: "zip" or "merged"
+        progress: Updated with the number of completed and failed forms
+
+    Returns:
+        Dictionary with the download path of the output, the number of forms
+        in it and the forms that failed
+    """
+    start = time.perf_counter()
+    failed = []
+    
+    async def render(index: int, item: BulkPDFItem):
+        try:
+            form_data = item.form_data
+            if form_data is None:
+                form_data = await get_form_data(item.document_id, item.form_type)
+            content, _ = await job_queue.run(render_pdf, form_data, item.form_type, kind="pdf-bulk")
+            progress["completed"] += 1
+            return index, content
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            failed.append({"index": index, "document_id": item.document_id,
+                           "form_type": item.form_type, "error": error})
+            progress["failed"] += 1
+            return index, None
+    
+    rendered = sorted(await asyncio.gather(*(render(index, item) for index, item in enumerate(items))),
+                      key=lambda pair: pair[0])
+    rendered = [(index, content) for index, content in rendered if content is not None]
+    if not rendered:
+        raise RuntimeError("None of the forms could be rendered")
+    
+    if output == "merged":
+        filename = f"forms_{uuid.uuid4().hex}.pdf"
+        merged = await job_queue.run(merge_pdfs, [content for _, content in rendered], kind="pdf-bulk")
+    else:
+        filename = f"forms_{uuid.uuid4().hex}.zip"
+    
+    def save() -> str:
+        path = storage.path_for("pdfs", filename)
+        with open(path, "wb") as f:
+            if output == "merged":
+                f.write(merged)
+            else:
+                zip_pdfs([(f"{index + 1:04d}_{safe_form_type(items[index].form_type)}_{items[index].document_id}.pdf",
+                           content) for index, content in rendered], f)
+        storage.record_write("pdfs", os.path.getsize(path))
+        return path
+    
+    path = await run_in_threadpool(save)
+    failed.sort(key=lambda failure: failure["index"])
+    return {
+        "pdf_path": "/temp/" + os.path.relpath(path, STORAGE_PDFS_DIR).replace(os.sep, "/"),
+        "output": output,
+        "forms": len(rendered),
+        "failed": failed,
+        "seconds": time.perf_counter() - start,
+    }
+
+@app.post("/generate-pdf/bulk", status_code=202, response_model=JobStatusResponse)
+async def generate_pdf_bulk(request: BulkPDFRequest):
+    """
+    Generate the PDFs of many forms at once
+
+    Forms are rendered in parallel in the worker pool and combined into a
+    ZIP archive or a single merged PDF. Returns a job right away; its
+    progress and, once finished, the download path are available from
+    ``/jobs/{job_id}``.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="No forms given")
+    if len(request.items) > MAX_BULK_PDF_FORMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many forms. Maximum is {MAX_BULK_PDF_FORMS} per request"
         )
-        
-        # Generate PDF
-        pdf_path = create_downloadable_pdf(filled_form_data, request.form_type)
-        
-        # Return just the filename for the frontend to construct the download URL
-        filename = os.path.basename(pdf_path)
-        print(f"PDF generated successfully: /temp/{filename}")
-        return {"pdf_path": f"/temp/{filename}", "message": "PDF generated successfully"}
+    if request.output not in ("zip", "merged"):
+        raise HTTPException(status_code=400, detail="Output must be 'zip' or 'merged'")
+    if request.output == "merged" and not pdf_support_available():
+        raise HTTPException(status_code=501, detail="Merging PDFs is not supported on the server, use zip output")
+    
+    admission = pdf_limiter.admit()
+    progress = {"total": len(request.items), "completed": 0, "failed": 0}
+    try:
+        job_id = job_queue.submit_async(render_bulk_pdfs(request.items, request.output, progress),
+                                        kind="pdf-bulk", progress=progress, admission=admission)
+    except BaseException:
+        admission.cancel()
+        raise
+    logger.info("Queued bulk PDF job %s for %d form(s)", job_id, len(request.items))
+    return job_queue.get(job_id)
+
+@app.get("/documents/{document_id}/forms/{form_type}.pdf")
+async def download_form_pdf(document_id: str, form_type: str, request: Request):
+    """
+    Download the PDF of a form filled from a document's extracted entities
+
+    Supports conditional requests: when the client's ETag still matches the
+    form data, 304 is returned without rendering the PDF again.
+    """
+    try:
+        filled_form_data = await get_form_data(document_id, form_type)
+        etag = f'"{pdf_cache_key(filled_form_data, form_type)}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=pdf_headers(etag, form_type))
+        return await send_pdf(filled_form_data, form_type)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"PDF generation failed: {str(e)}")
+        logger.exception("PDF generation failed")
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
+def template_response(request: Request, content: Any, etag: str) -> Response:
+    """JSON response for template data, or 304 if the client's copy is current"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+@app.get("/templates")
+async def list_templates(request: Request):
+    """
+    Form templates by form type
+
+    The ETag changes whenever a template file does, so clients can keep
+    their copy and revalidate it cheaply.
+    """
+    return template_response(request, template_registry.all(), f'"{template_registry.etag()}"')
+
+@app.get("/templates/{form_type}")
+async def get_template(form_type: str, request: Request):
+    """Template of one form type"""
+    template = template_registry.get(form_type)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Form template not found")
+    return template_response(request, template, f'"{template_registry.version(form_type)}"')
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """OCR result cache statistics"""
+    return ocr_cache.stats()
+
+@app.get("/documents/stats")
+async def documents_stats():
+    """Document store statistics"""
+    return await run_in_threadpool(document_store.stats)
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """Slots in use, queue depth and refusals of each expensive stage, and the per-client rate limit"""
+    return admission_stats()
+
+@app.get("/storage/stats")
+async def storage_stats():
+    """Disk usage, quotas and evictions of the upload and PDF storage"""
+    return storage.stats()
+
+@app.get("/ocr/stats")
+async def ocr_stats():
+    """Per-engine OCR latency and win rate statistics"""
+    return engine_stats.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Metrics in the Prometheus text format
+
+    Stage and HTTP latency histograms, job queue depths, cache lookups and
+    hit ratios, in-flight requests and storage usage.
+    """
+    content = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "message": "AI Form Filling Assistant is running"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint
+
+    Unlike /health, which only reports that the server is up, this returns
+    503 until the workers have loaded and warmed up their models.
+    """
+    readiness = job_queue.readiness()
+    if not WARM_UP_MODELS:
+        # Models load on first use, so there is nothing to wait for
+        readiness["ready"] = True
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Registry of the heavy OCR and NLP models.
+
+EasyOCR pulls in torch and spaCy loads a trained pipeline, which takes
+several seconds. Instead of loading them at import time, modules register a
+loader here and the model is created on first use, or up front by an
+explicit warm-up. The registry also records which models are loaded and how
+long they took, for the readiness endpoint.
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, process-wide models
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._warmers: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        self._models: Dict[str, Any] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any],
+                 warm_up: Optional[Callable[[Any], Any]] = None):
+        """
+        Register a model loader
+
+        Args:
+            name: Name of the model
+            loader: Creates the model; may return None if the model is unavailable
+            warm_up: Runs one dummy inference on the loaded model
+        """
+        self._loaders[name] = loader
+        self._warmers[name] = warm_up
+        self._locks.setdefault(name, threading.Lock())
+        self._status.setdefault(name, {"loaded": False, "available": None, "warmed_up": False,
+                                       "load_seconds": None, "error": None})
+
+    def get(self, name: str) -> Any:
+        """Get a model, loading it on first use"""
+        if name in self._models:
+            return self._models[name]
+        with self._locks[name]:
+            if name not in self._models:
+                status = self._status[name]
+                start = time.perf_counter()
+                try:
+                    model = self._loaders[name]()
+                except Exception as e:
+                    logger.error("Failed to load model '%s': %s", name, e)
+                    status["error"] = str(e)
+                    model = None
+                status["load_seconds"] = time.perf_counter() - start
+                status["loaded"] = True
+                status["available"] = model is not None
+                self._models[name] = model
+        return self._models[name]
+
+    def warm_up(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Load every registered model and run one dummy inference on each
+
+        Returns:
+            Status of every model after warm-up
+        """
+        for name in self._loaders:
+            model = self.get(name)
+            warmer = self._warmers[name]
+            status = self._status[name]
+            if model is None or warmer is None or status["warmed_up"]:
+                continue
+            start = time.perf_counter()
+            try:
+                warmer(model)
+                status["warmed_up"] = True
+                status["warm_up_seconds"] = time.perf_counter() - start
+            except Exception as e:
+                logger.error("Warm-up of model '%s' failed: %s", name, e)
+                status["error"] = str(e)
+        return self.status()
+
+    def is_loaded(self, name: str) -> bool:
+        """Whether a model has been loaded in this process"""
+        return name in self._models
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Load status of every registered model"""
+        return {name: dict(status) for name, status in self._status.items()}
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,347 @@
+"""
+Logging, timing spans and Prometheus metrics.
+
+configure_logging() sets up leveled logging for the server and its worker
+processes: one readable line per record by default, or one JSON object per
+line with LOG_FORMAT=json. Records logged while handling an HTTP request
+carry its request ID.
+
+span(stage) times a block of code, observes the duration in a latency
+histogram per stage and logs it at debug level. Worker processes are never
+scraped, so they buffer their observations instead; the job queue sends
+the buffer back with each job result and merges it into the server's
+metrics.
+
+The /metrics endpoint renders every metric in the Prometheus text format.
+Values that live elsewhere, such as queue depths and storage usage, are
+read when the endpoint is scraped, through collector callbacks.
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "text" for readable lines, "json" for one JSON object per line
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+
+# Prefix of every metric name
+METRICS_NAMESPACE = "form_assistant"
+
+# Upper bounds, in seconds, of the latency histogram buckets; from regex
+# extractors (well under a millisecond) to whole-page OCR (tens of seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# ID of the HTTP request being handled, set by the server's middleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, including the fields passed with extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", "-") != "-":
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_logging_configured = False
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT):
+    """Send log records of the given level and above to stderr; only the first call has an effect"""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(_RequestIdFilter())
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _label_pairs(labelnames: Sequence[str], labels: Tuple[str, ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in zip(labelnames, labels))
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric(ABC):
+    """A metric with a value per combination of label values"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _record(self, labels: Tuple[str, ...], value: float):
+        """Add an observation to the value of a combination of labels"""
+
+    def _observe(self, labels: Tuple[str, ...], value: float):
+        """Record a value, or buffer it to send to the server when in a worker process"""
+        if _buffer is not None:
+            with _buffer_lock:
+                _buffer.append((self.name, labels, value))
+            return
+        self._record(labels, value)
+
+    @abstractmethod
+    def lines(self) -> Iterator[str]:
+        """The samples of the metric in the Prometheus text format"""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._observe(labels, amount)
+
+    def _record(self, labels: Tuple[str, ...], value: float):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            pairs = _label_pairs(self.labelnames, labels)
+            yield f"{self.name}{{{pairs}}} {_format_value(value)}" if pairs else f"{self.name} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """A value that goes up and down; only ever set in the server process"""
+
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self._record(labels, -amount)
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._record(labels, amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str):
+        self._observe(labels, value)
+
+    def _record(self, labels: Tuple[str, ...], value: float):
+        # Counts per bucket (not cumulative), with +Inf last, then the sum
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        for labels, counts in values:
+            pairs = _label_pairs(self.labelnames, labels)
+            prefix = pairs + "," if pairs else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}'
+            suffix = f"{{{pairs}}}" if pairs else ""
+            yield f"{self.name}_sum{suffix} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+# A collector returns, per metric: (name, type, documentation, label names,
+# [(label values, value), ...]), read each time the metrics are rendered
+Collector = Callable[[], Iterable[Tuple[str, str, str, Sequence[str], List[Tuple[Tuple[str, ...], float]]]]]
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered in the Prometheus text format"""
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _add(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.namespace}_{name}", documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.namespace}_{name}", documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.namespace}_{name}", documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Collector):
+        """Register a callback that reports metrics read from elsewhere at render time"""
+        self._collectors.append(collector)
+
+    def merge(self, observations: List[Tuple[str, Tuple[str, ...], float]]):
+        """Record observations buffered by a worker process"""
+        for name, labels, value in observations:
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric._record(labels, value)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.lines())
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception:
+                logger.exception("Metrics collector %s failed", getattr(collector, "__name__", collector))
+                continue
+            for name, metric_type, documentation, labelnames, samples in collected:
+                name = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    pairs = _label_pairs(labelnames, labels)
+                    lines.append(f"{name}{{{pairs}}} {_format_value(value)}" if pairs
+                                 else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram("stage_duration_seconds", "Duration of pipeline stages", ["stage"])
+STAGE_ERRORS = metrics.counter("stage_errors_total", "Pipeline stages that raised an exception", ["stage"])
+CACHE_REQUESTS = metrics.counter("cache_requests_total", "Cache lookups by cache and result (hit or miss)",
+                                 ["cache", "result"])
+
+# Observations of a worker process waiting to be sent to the server; None in the server
+_buffer: Optional[List[Tuple[str, Tuple[str, ...], float]]] = None
+_buffer_lock = threading.Lock()
+
+
+def buffer_observations():
+    """Buffer this process's observations from now on, for drain_observations to collect"""
+    global _buffer
+    _buffer = []
+
+
+def drain_observations() -> List[Tuple[str, Tuple[str, ...], float]]:
+    """Take the observations buffered so far; empty when not buffering"""
+    if _buffer is None:
+        return []
+    with _buffer_lock:
+        observations = list(_buffer)
+        _buffer.clear()
+    return observations
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block of code as a pipeline stage
+
+    The duration is observed in the stage latency histogram, including when
+    the block raises, which also counts as a stage error.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record the duration of a stage timed by other means, such as a share of a batch"""
+    STAGE_SECONDS.observe(seconds, stage)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s took %.1f ms", stage, seconds * 1000, extra={"stage": stage, "seconds": seconds})
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a lookup in one of the caches, for hit ratios"""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def cache_hit_ratios() -> Dict[str, float]:
+    """Share of lookups that hit, per cache"""
+    caches = {labels[0] for labels in CACHE_REQUESTS._values}
+    ratios = {}
+    for cache in sorted(caches):
+        hits = CACHE_REQUESTS.value(cache, "hit")
+        total = hits + CACHE_REQUESTS.value(cache, "miss")
+        ratios[cache] = hits / total if total else 0.0
+    return ratios
+
+
+def _collect_cache_ratios():
+    yield ("cache_hit_ratio", "gauge", "Share of cache lookups that hit since the server started", ["cache"],
+           [((cache,), ratio) for cache, ratio in cache_hit_ratios().items()])
+
+
+metrics.add_collector(_collect_cache_ratios)
@@ -0,0 +1,178 @@
+"""
+Persistent cache of OCR results.
+
+Citizens often upload the same scan several times. OCR results are stored in
+a small SQLite database keyed by the SHA-256 of the uploaded bytes together
+with the OCR configuration, so byte-identical files skip OCR entirely. The
+cache is bounded in size and evicts the least recently used entries first.
+SQLite makes it safe to share between the worker processes.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from observability import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.environ.get("OCR_CACHE_ENABLED", "1") not in ("0", "false", "False")
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", os.path.join("cache", "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """Compute the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash: str, config: Dict[str, Any]) -> str:
+    """
+    Build a cache key from the content hash and the OCR configuration
+
+    Any change to the configuration (engines, languages, options) yields a
+    different key, so stale results are never served after a config change.
+    """
+    config_json = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{content_hash}:{config_json}".encode("utf-8")).hexdigest()
+
+
+class OCRCache:
+    """
+    Size-bounded, disk-backed LRU cache for OCR text
+    """
+
+    def __init__(self, path: str = OCR_CACHE_PATH, max_bytes: int = OCR_CACHE_MAX_BYTES,
+                 enabled: bool = OCR_CACHE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, creating the database if needed"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def _increment(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached text for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            record_cache_lookup("ocr", row is not None)
+            if row is None:
+                self._increment(conn, "misses")
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._increment(conn, "hits")
+            return row[0]
+        except sqlite3.Error as e:
+            logger.error("OCR cache read failed: %s", e)
+            return None
+
+    def put(self, key: str, value: str):
+        """Store text for a key and evict old entries if the cache is over its size limit"""
+        if not self.enabled:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            conn = self._connect()
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.error("OCR cache write failed: %s", e)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._increment(conn, "evictions", len(evicted))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size of the cache"""
+        if not self.enabled:
+            return {"enabled": False}
+        try:
+            conn = self._connect()
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except sqlite3.Error as e:
+            logger.error("OCR cache stats failed: %s", e)
+            return {"enabled": True, "error": str(e)}
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "enabled": True,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        if not self.enabled:
+            return
+        conn = self._connect()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM stats")
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,361 @@
+"""
+Orchestration of the OCR engines.
+
+Tesseract and EasyOCR used to run one after the other on every image, and
+the longer text won. Here the engines run either concurrently or as a
+cascade, each result is scored by the engine's own word confidences and by
+how many form labels it contains, and as soon as one result is good enough
+the remaining engines are skipped or abandoned.
+
+The engines themselves are defined in ocr_utils; this module only decides
+which of them to run and which result to keep, and aggregates per-engine
+latency and win statistics on the server.
+"""
+import logging
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from observability import STAGE_ERRORS, observe_stage, span
+
+logger = logging.getLogger(__name__)
+
+# "concurrent" starts every engine at once and returns as soon as one result
+# reaches OCR_EARLY_EXIT_SCORE. "cascade" runs the engines in OCR_ENGINE_ORDER
+# and stops at the first good enough result. "all" always runs every engine.
+OCR_MODE = os.environ.get("OCR_MODE", "concurrent")
+OCR_ENGINE_ORDER = [name.strip() for name in os.environ.get("OCR_ENGINE_ORDER", "tesseract,easyocr").split(",")
+                    if name.strip()]
+OCR_EARLY_EXIT_SCORE = float(os.environ.get("OCR_EARLY_EXIT_SCORE", "0.75"))
+
+OCR_MODES = ("concurrent", "cascade", "all")
+
+# Words and phrases printed on the documents the assistant handles. Finding
+# them is a good sign the engine read the document correctly.
+LABEL_KEYWORDS_RE = re.compile(
+    r'\b(?:name|father|mother|husband|guardian|date of birth|dob|year of birth|birth|'
+    r'male|female|gender|sex|address|government|india|aadhaar|income tax|'
+    r'permanent account|election|elector|signature|pin|district|state)\b',
+    re.IGNORECASE,
+)
+KEYWORD_HITS_FOR_FULL_SCORE = 4
+CONFIDENCE_WEIGHT = 0.7
+KEYWORD_WEIGHT = 0.3
+# Assumed confidence for engines that do not report one
+DEFAULT_CONFIDENCE = 0.5
+
+# An engine takes an image (a file path or an array) and returns a dict with
+# the "text" it read and its mean word "confidence" between 0 and 1 (None if
+# unknown)
+OCREngine = Callable[[Any], Dict[str, Any]]
+# A batch engine takes many images and returns one such dict per image
+OCRBatchEngine = Callable[[List[Any]], List[Dict[str, Any]]]
+# Told the name and result of each engine as soon as it finishes
+EngineResultCallback = Callable[[str, Dict[str, Any]], None]
+
+# One single-threaded executor per engine, so an abandoned engine run never
+# overlaps with the next run of the same engine
+_engine_executors: Dict[str, ThreadPoolExecutor] = {}
+_engine_executors_lock = threading.Lock()
+
+
+def _get_engine_executor(name: str) -> ThreadPoolExecutor:
+    with _engine_executors_lock:
+        executor = _engine_executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ocr-{name}")
+            _engine_executors[name] = executor
+        return executor
+
+
+def score_result(text: str, confidence: Optional[float]) -> float:
+    """
+    Score an OCR result between 0 and 1
+
+    Args:
+        text: Text read by the engine
+        confidence: Mean word confidence reported by the engine, if any
+
+    Returns:
+        Weighted combination of engine confidence and label-keyword hits
+    """
+    if not text or not text.strip():
+        return 0.0
+    if confidence is None:
+        confidence = DEFAULT_CONFIDENCE
+    hits = len(LABEL_KEYWORDS_RE.findall(text))
+    keyword_score = min(1.0, hits / KEYWORD_HITS_FOR_FULL_SCORE)
+    return CONFIDENCE_WEIGHT * confidence + KEYWORD_WEIGHT * keyword_score
+
+
+def _run_engine(name: str, engine: OCREngine, image: Any) -> Dict[str, Any]:
+    """Run one engine, timing and scoring its result; failures are reported, not raised"""
+    start = time.perf_counter()
+    try:
+        with span(f"ocr_engine.{name}"):
+            output = engine(image)
+    except Exception as e:
+        logger.warning("OCR engine %s failed: %s", name, e)
+        return {"status": "failed", "seconds": time.perf_counter() - start, "error": str(e),
+                "text": "", "confidence": None, "score": 0.0}
+    seconds = time.perf_counter() - start
+    text = output.get("text") or ""
+    confidence = output.get("confidence")
+    score = score_result(text, confidence)
+    logger.debug("OCR engine %s: %d chars, confidence %s, score %.2f in %.2fs",
+                 name, len(text), confidence, score, seconds)
+    return {"status": "completed", "seconds": seconds, "text": text,
+            "confidence": confidence, "score": score}
+
+
+def orchestrate(engines: Dict[str, OCREngine], image: Any, mode: str = OCR_MODE,
+                order: Optional[List[str]] = None,
+                early_exit_score: float = OCR_EARLY_EXIT_SCORE,
+                on_result: Optional[EngineResultCallback] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Run the OCR engines on an image and pick the best result
+
+    Args:
+        engines: Available engines by name
+        image: Image handed to the engines, a file path or an array
+        mode: "concurrent", "cascade" or "all"
+        order: Engine names in order of preference, defaults to OCR_ENGINE_ORDER
+        early_exit_score: Score at which a result is accepted without waiting for other engines
+        on_result: Called with each engine's result, including its text, as
+            soon as it finishes; not called for abandoned engines
+
+    Returns:
+        Tuple of the chosen text and a report with the winning engine and the
+        status, latency and score of every engine
+    """
+    if mode not in OCR_MODES:
+        raise ValueError(f"Unknown OCR mode: {mode}")
+    names = [name for name in (order or OCR_ENGINE_ORDER) if name in engines]
+    names += [name for name in engines if name not in names]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    early_exit = False
+
+    if mode == "cascade":
+        for name in names:
+            results[name] = _run_engine(name, engines[name], image)
+            if on_result is not None:
+                on_result(name, results[name])
+            if results[name]["score"] >= early_exit_score:
+                early_exit = True
+                break
+        for name in names:
+            results.setdefault(name, {"status": "skipped"})
+    else:
+        futures: Dict[Future, str] = {
+            _get_engine_executor(name).submit(_run_engine, name, engines[name], image): name
+            for name in names
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+                if on_result is not None:
+                    on_result(futures[future], results[futures[future]])
+            if mode == "concurrent" and pending and any(
+                    result["score"] >= early_exit_score for result in results.values()):
+                early_exit = True
+                break
+        for future in pending:
+            # An engine that has not started yet is cancelled. One that is
+            # already running cannot be interrupted; it finishes in the
+            # background and its result is discarded.
+            results[futures[future]] = {"status": "skipped" if future.cancel() else "abandoned"}
+
+    return _build_result(names, results, mode, early_exit)
+
+
+def orchestrate_batch(engines: Dict[str, OCREngine], batch_engines: Dict[str, OCRBatchEngine],
+                      images: List[Any], order: Optional[List[str]] = None,
+                      early_exit_score: float = OCR_EARLY_EXIT_SCORE) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Run the OCR engines over a batch of images as a cascade
+
+    Each engine runs once over all images that no earlier engine read well
+    enough, using its batch form when it has one, so model overhead is paid
+    per batch instead of per image.
+
+    Args:
+        engines: Available single-image engines by name
+        batch_engines: Engines that can also process many images in one call
+        images: Images handed to the engines, file paths or arrays
+        order: Engine names in order of preference, defaults to OCR_ENGINE_ORDER
+        early_exit_score: Score at which a result is accepted without running later engines
+
+    Returns:
+        List with the chosen text and report for each image, in input order
+    """
+    names = [name for name in (order or OCR_ENGINE_ORDER) if name in engines]
+    names += [name for name in engines if name not in names]
+
+    results: List[Dict[str, Dict[str, Any]]] = [{} for _ in images]
+    remaining = list(range(len(images)))
+    for name in names:
+        if not remaining:
+            break
+        if name in batch_engines:
+            outputs = _run_batch_engine(name, batch_engines[name], [images[i] for i in remaining])
+        else:
+            outputs = [_run_engine(name, engines[name], images[i]) for i in remaining]
+        for i, result in zip(remaining, outputs):
+            results[i][name] = result
+        remaining = [i for i in remaining if results[i][name]["score"] < early_exit_score]
+
+    batch_results = []
+    for document_results in results:
+        early_exit = len(document_results) < len(names)
+        for name in names:
+            document_results.setdefault(name, {"status": "skipped"})
+        batch_results.append(_build_result(names, document_results, "batch", early_exit))
+    return batch_results
+
+
+def _run_batch_engine(name: str, engine: OCRBatchEngine, images: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Run a batch engine, scoring each result
+
+    The batch time is split evenly across the images, so latency statistics
+    show the amortised cost per image.
+    """
+    start = time.perf_counter()
+    try:
+        outputs = engine(images)
+    except Exception as e:
+        logger.warning("OCR engine %s failed on a batch of %d: %s", name, len(images), e)
+        STAGE_ERRORS.inc(f"ocr_engine.{name}")
+        seconds = (time.perf_counter() - start) / len(images)
+        return [{"status": "failed", "seconds": seconds, "error": str(e),
+                 "text": "", "confidence": None, "score": 0.0} for _ in images]
+    seconds = (time.perf_counter() - start) / len(images)
+    logger.debug("OCR engine %s: batch of %d in %.2fs", name, len(images), seconds * len(images))
+    for _ in images:
+        observe_stage(f"ocr_engine.{name}", seconds)
+    results = []
+    for output in outputs:
+        text = output.get("text") or ""
+        confidence = output.get("confidence")
+        results.append({"status": "completed", "seconds": seconds, "text": text,
+                        "confidence": confidence, "score": score_result(text, confidence)})
+    return results
+
+
+def _build_result(names: List[str], results: Dict[str, Dict[str, Any]], mode: str,
+                  early_exit: bool) -> Tuple[str, Dict[str, Any]]:
+    """Pick the winning engine and build the OCR report"""
+    # Highest score wins; on a tie the engine earlier in the order wins
+    winner = None
+    for name in names:
+        result = results[name]
+        if result["status"] == "completed" and result["text"].strip() and (
+                winner is None or result["score"] > results[winner]["score"]):
+            winner = name
+
+    report = {
+        "cached": False,
+        "mode": mode,
+        "engine": winner,
+        "score": results[winner]["score"] if winner else 0.0,
+        "early_exit": early_exit,
+        "engines": {
+            name: {key: value for key, value in result.items() if key != "text"}
+            for name, result in results.items()
+        },
+    }
+    return (results[winner]["text"] if winner else ""), report
+
+
+class EngineStats:
+    """
+    Per-engine latency and win statistics and preprocessing step timings,
+    aggregated from OCR reports
+    """
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded reports"""
+        with self._lock:
+            self.documents = 0
+            self.cached = 0
+            self.early_exits = 0
+            self.engines: Dict[str, Dict[str, Any]] = {}
+            self.preprocessing: Dict[str, Deque[float]] = {}
+
+    def _engine(self, name: str) -> Dict[str, Any]:
+        engine = self.engines.get(name)
+        if engine is None:
+            engine = {"completed": 0, "failed": 0, "skipped": 0, "abandoned": 0, "wins": 0,
+                      "latencies": deque(maxlen=self.max_samples)}
+            self.engines[name] = engine
+        return engine
+
+    def record(self, report: Optional[Dict[str, Any]]):
+        """Record the report of one OCR run"""
+        if not report:
+            return
+        with self._lock:
+            self.documents += 1
+            if report.get("cached"):
+                self.cached += 1
+                return
+            if report.get("early_exit"):
+                self.early_exits += 1
+            preprocessing = report.get("preprocessing") or {}
+            for step, seconds in preprocessing.get("timings", {}).items():
+                self.preprocessing.setdefault(step, deque(maxlen=self.max_samples)).append(seconds)
+            for name, result in report.get("engines", {}).items():
+                engine = self._engine(name)
+                engine[result["status"]] += 1
+                if result.get("seconds") is not None:
+                    engine["latencies"].append(result["seconds"])
+            if report.get("engine"):
+                self._engine(report["engine"])["wins"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the statistics with latency percentiles and win rates"""
+        with self._lock:
+            ocr_runs = self.documents - self.cached
+            engines = {}
+            for name, engine in self.engines.items():
+                latencies: Deque[float] = engine["latencies"]
+                ordered = sorted(latencies)
+                engines[name] = {
+                    "completed": engine["completed"],
+                    "failed": engine["failed"],
+                    "skipped": engine["skipped"],
+                    "abandoned": engine["abandoned"],
+                    "wins": engine["wins"],
+                    "win_rate": engine["wins"] / ocr_runs if ocr_runs else 0.0,
+                    "latency_mean_seconds": statistics.mean(ordered) if ordered else None,
+                    "latency_p50_seconds": ordered[len(ordered) // 2] if ordered else None,
+                    "latency_p95_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                    if ordered else None,
+                }
+            return {
+                "mode": OCR_MODE,
+                "early_exit_score": OCR_EARLY_EXIT_SCORE,
+                "documents": self.documents,
+                "cached": self.cached,
+                "early_exits": self.early_exits,
+                "engines": engines,
+                "preprocessing": {
+                    step: {"mean_seconds": statistics.mean(samples), "max_seconds": max(samples)}
+                    for step, samples in self.preprocessing.items()
+                },
+            }
+
+
+engine_stats = EngineStats()
@@ -1,111 +1,576 @@
 import pytesseract
+import logging
 import os
 # Set the path to the local Tesseract installation
 pytesseract.pytesseract_cmd = r'c:\Users\jthak\OneDrive\Attachments\Desktop\ai form filling assistance\Tesseract-OCR\tesseract.exe'
 
-from PIL import Image
+from PIL import Image, ImageOps
 import re
-from typing import Dict, Any, List
-import easyocr
-import spacy
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+import numpy as np
 from datetime import datetime
+from ocr_cache import ocr_cache, hash_file, make_cache_key
+from observability import span
+from model_registry import model_registry
+from image_preprocessing import preprocess_image, to_grayscale, PREPROCESS_ENABLED, PREPROCESS_CONFIG
+from layout_ocr import get_layout, layout_cache_config, read_layout
+from ocr_orchestrator import (orchestrate, orchestrate_batch, score_result, EngineResultCallback, OCR_MODE,
+                             OCR_ENGINE_ORDER, OCR_EARLY_EXIT_SCORE)
+from entity_extraction import (
+    ScanHit, scan_fields, extract_name as extract_name_by_pattern, extract_date_of_birth,
+    extract_gender, extract_address, extract_aadhaar_number, extract_pan_number,
+    extract_voter_id, extract_parent_name, calculate_age_from_dob, calculate_confidence,
+)
 
-# Initialize OCR and NLP tools
-reader = easyocr.Reader(['en', 'hi'])  # English and Hindi support
+logger = logging.getLogger(__name__)
+
+# OCR settings. Everything here is part of the OCR cache key, so bump
+# "version" whenever the OCR pipeline changes in a way that affects output.
+TESSERACT_CONFIG = r'--oem 3 --psm 6 -l eng+hin'
+# Layout fields hold Latin-script values (names, dates, numbers)
+TESSERACT_FIELD_LANGUAGES = 'eng'
+EASYOCR_LANGUAGES = ['en', 'hi']  # English and Hindi support
+# Number of text regions EasyOCR recognises per batch in batch extraction
+EASYOCR_BATCH_SIZE = int(os.environ.get("EASYOCR_BATCH_SIZE", "16"))
+OCR_CONFIG = {
+    "version": 3,
+    "tesseract_config": TESSERACT_CONFIG,
+    "easyocr_languages": EASYOCR_LANGUAGES,
+    "mode": OCR_MODE,
+    "engine_order": OCR_ENGINE_ORDER,
+    "early_exit_score": OCR_EARLY_EXIT_SCORE,
+    "preprocessing": PREPROCESS_CONFIG,
+}
+
+# The engines accept either a path to an image file or a preprocessed array
+ImageInput = Union[str, np.ndarray]
+
+# The OCR and NLP models are loaded lazily through the model registry, so
+# importing this module is cheap. Worker processes warm them up explicitly.
+def load_easyocr_reader():
+    import easyocr
+    return easyocr.Reader(EASYOCR_LANGUAGES)
+
+def warm_up_easyocr_reader(reader):
+    import numpy as np
+    # One dummy inference initialises the detector and recognizer weights
+    reader.readtext(np.full((64, 256, 3), 255, dtype=np.uint8))
+
+# NLP settings. Only the named entity recognizer is used, so the other
+# pipeline components are not loaded at all.
+NLP_MODEL = "en_core_web_sm"
+NLP_EXCLUDE = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", "32"))
+NLP_N_PROCESS = int(os.environ.get("NLP_N_PROCESS", "1"))
 
 # Load spaCy model for NER
 def load_nlp_model():
+    import spacy
     try:
-        return spacy.load("en_core_web_sm")
+        model = spacy.load(NLP_MODEL, exclude=NLP_EXCLUDE)
     except OSError:
-        print("spaCy model 'en_core_web_sm' not found. Please install it using: python -m spacy download en_core_web_sm")
+        logger.warning("spaCy model '%s' not found. Please install it using: python -m spacy download %s",
+                       NLP_MODEL, NLP_MODEL)
         return None
+    
+    # The shared tok2vec layer only feeds the excluded components unless
+    # the recognizer listens to it
+    if "tok2vec" in model.pipe_names and not model.get_pipe("tok2vec").listening_components:
+        model.remove_pipe("tok2vec")
+    return model
 
-nlp = load_nlp_model()
+def warm_up_nlp_model(model):
+    model("Name: Ramesh Kumar, Address: Sector 12, New Delhi")
 
-def extract_text_from_image(image_path: str) -> str:
+model_registry.register("easyocr", load_easyocr_reader, warm_up_easyocr_reader)
+model_registry.register("spacy", load_nlp_model, warm_up_nlp_model)
+
+def get_reader():
+    """Get the EasyOCR reader, loading it on first use"""
+    return model_registry.get("easyocr")
+
+def get_nlp():
+    """Get the spaCy pipeline, loading it on first use (None if unavailable)"""
+    return model_registry.get("spacy")
+
+def extract_text_from_image(image_path: str, content_hash: str = None, document_type: str = None) -> str:
     """
     Extract text from an image using OCR
     
+    Results are cached by file content, so OCR is skipped for files that
+    were already processed with the same OCR configuration.
+    
     Args:
         image_path: Path to the image file
+        content_hash: SHA-256 of the file contents, computed if not given
+        document_type: Type of document; known layouts are read field by field
         
     Returns:
         Extracted text as a string
     """
+    text, _ = extract_text_with_report(image_path, content_hash, document_type)
+    return text
+
+def _cache_keys(image_path: str, content_hash: Optional[str],
+                layout: Optional[Dict[str, Any]]) -> Tuple[Optional[str], str]:
+    """Cache keys of the layout reading (None without a layout) and of the whole-page reading"""
+    content_hash = content_hash or hash_file(image_path)
+    layout_key = None
+    if layout is not None:
+        layout_key = make_cache_key(content_hash, {**OCR_CONFIG, "layout": layout_cache_config(layout)})
+    return layout_key, make_cache_key(content_hash, OCR_CONFIG)
+
+def _cached_text(image_path: str, layout_key: Optional[str], page_key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Look up the layout reading, then the whole-page reading, in the OCR cache"""
+    for key in (layout_key, page_key):
+        if key is None:
+            continue
+        cached_text = ocr_cache.get(key)
+        if cached_text is not None:
+            logger.debug("OCR cache hit for image: %s", image_path)
+            return cached_text, {"cached": True, "engine": None, "engines": {}}
+    return None
+
+def extract_text_with_report(image_path: str, content_hash: str = None,
+                             document_type: str = None,
+                             on_engine_result: Optional[EngineResultCallback] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Extract text from an image using OCR, reporting which engines ran
+    
+    For document types with a layout template, only the field regions are
+    OCR'd; whole-page OCR is the fallback when the layout cannot be applied.
+    
+    Args:
+        image_path: Path to the image file
+        content_hash: SHA-256 of the file contents, computed if not given
+        document_type: Type of document (aadhaar, pan, voter)
+        on_engine_result: Called with the result of each whole-page OCR engine as it finishes
+        
+    Returns:
+        Tuple of the extracted text and the OCR report (see ocr_orchestrator)
+    """
+    layout = get_layout(document_type)
     try:
-        print(f"Starting OCR extraction for image: {image_path}")
+        layout_key, page_key = _cache_keys(image_path, content_hash, layout)
+    except OSError as e:
+        logger.error("Error reading image for OCR: %s", e)
+        return "", {"cached": False, "engine": None, "error": str(e), "engines": {}}
+    
+    cached = _cached_text(image_path, layout_key, page_key)
+    if cached is not None:
+        return cached
+    
+    prepared = prepare_image(image_path)
+    layout_report = None
+    if layout is not None:
+        text, report = run_layout_ocr(prepared, layout)
+        if text:
+            ocr_cache.put(layout_key, text)
+            return text, report
+        layout_report = report["layout"]
+        logger.info("Layout OCR not applicable (%s), reading the whole page", layout_report.get("reason"))
+    
+    text, report = run_ocr_with_report(image_path, prepared, on_engine_result)
+    report["layout"] = layout_report
+    # Empty results are not cached, since OCR errors also produce empty text
+    if text:
+        ocr_cache.put(page_key, text)
+    return text, report
+
+def extract_texts_with_report(image_paths: List[str],
+                              content_hashes: Optional[List[Optional[str]]] = None,
+                              document_types: Optional[List[Optional[str]]] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Extract text from many images, running the OCR engines over them in batches
+    
+    Cached images are served from the OCR cache and images of a known layout
+    are read field by field; the rest go through the engines as one batch.
+    
+    Args:
+        image_paths: Paths to the image files
+        content_hashes: SHA-256 of each file's contents, computed where missing
+        document_types: Type of each document, if known
         
-        # Open the image
-        image = Image.open(image_path)
-        print(f"Image opened successfully. Mode: {image.mode}, Size: {image.size}")
+    Returns:
+        List with the extracted text and OCR report of each image, in input order
+    """
+    if content_hashes is None:
+        content_hashes = [None] * len(image_paths)
+    if document_types is None:
+        document_types = [None] * len(image_paths)
+    
+    results: List[Tuple[str, Dict[str, Any]]] = [None] * len(image_paths)
+    page_keys: Dict[int, str] = {}
+    layout_reports: Dict[int, Dict[str, Any]] = {}
+    prepared: Dict[int, Tuple[ImageInput, Optional[Dict[str, Any]]]] = {}
+    for index, (image_path, content_hash, document_type) in enumerate(
+            zip(image_paths, content_hashes, document_types)):
+        layout = get_layout(document_type)
+        try:
+            layout_key, page_keys[index] = _cache_keys(image_path, content_hash, layout)
+        except OSError as e:
+            logger.error("Error reading image for OCR: %s", e)
+            results[index] = ("", {"cached": False, "engine": None, "error": str(e), "engines": {}})
+            continue
+        results[index] = _cached_text(image_path, layout_key, page_keys[index])
+        if results[index] is not None:
+            continue
+        
+        prepared[index] = prepare_image(image_path)
+        if layout is not None:
+            text, report = run_layout_ocr(prepared[index], layout)
+            if text:
+                ocr_cache.put(layout_key, text)
+                results[index] = (text, report)
+            else:
+                layout_reports[index] = report["layout"]
+    
+    pending = [index for index, result in enumerate(results) if result is None]
+    if pending:
+        logger.debug("Starting batch OCR extraction for %d image(s)", len(pending))
+        batch_results = orchestrate_batch(OCR_ENGINES, OCR_BATCH_ENGINES,
+                                          [prepared[index][0] for index in pending])
+        for index, (text, report) in zip(pending, batch_results):
+            report["preprocessing"] = prepared[index][1]
+            report["layout"] = layout_reports.get(index)
+            text = clean_extracted_text(text).strip()
+            # Empty results are not cached, since OCR errors also produce empty text
+            if text:
+                ocr_cache.put(page_keys[index], text)
+            results[index] = (text, report)
+    return results
+
+def prepare_image(image_path: str) -> Tuple[ImageInput, Optional[Dict[str, Any]]]:
+    """
+    Preprocess an image for the OCR engines, if preprocessing is enabled
+    
+    Returns:
+        Tuple of the preprocessed image array (or the path itself when
+        preprocessing is off or fails) and the preprocessing report
+    """
+    if not PREPROCESS_ENABLED:
+        return image_path, None
+    try:
+        with span("preprocess"):
+            image, report = preprocess_image(image_path)
+    except Exception as e:
+        # Let the engines try the original file
+        logger.warning("Preprocessing failed for %s: %s", image_path, e)
+        return image_path, {"error": str(e)}
+    logger.debug("Preprocessed %s: %s -> %s in %.2fs", image_path, report["input_size"],
+                 report["output_size"], report["seconds"])
+    return image, report
+
+def tesseract_engine(image: ImageInput) -> Dict[str, Any]:
+    """
+    Read an image with Tesseract
+    
+    Args:
+        image: Path to the image file or preprocessed image array
+    
+    Returns:
+        Dictionary with the text and the mean word confidence (0-1)
+    """
+    if isinstance(image, str):
+        image = Image.open(image)
+        logger.debug("Image opened. Mode: %s, Size: %s", image.mode, image.size)
         
         # Convert to RGB if necessary (for some image formats)
         if image.mode != 'RGB':
             image = image.convert('RGB')
+    else:
+        image = Image.fromarray(image)
+    
+    return read_tesseract_words(image, TESSERACT_CONFIG)
+
+def tesseract_field_reader(crop: np.ndarray, psm: int, whitelist: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read one field of a known layout with Tesseract
+    
+    Args:
+        crop: Grayscale crop of the field
+        psm: Tesseract page segmentation mode, usually 7 (single line)
+        whitelist: Characters the field can contain
+    
+    Returns:
+        Dictionary with the text and the mean word confidence (0-1)
+    """
+    config = f"--oem 3 --psm {psm} -l {TESSERACT_FIELD_LANGUAGES}"
+    if whitelist:
+        config += f" -c tessedit_char_whitelist={whitelist}"
+    return read_tesseract_words(Image.fromarray(crop), config)
+
+def read_tesseract_words(image: Image.Image, config: str) -> Dict[str, Any]:
+    """Run Tesseract and join its words, weighting word confidences by length"""
+    # Word-level output carries a confidence for every recognised word
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+    words = []
+    weighted_confidence = 0.0
+    total_weight = 0
+    for word, confidence in zip(data["text"], data["conf"]):
+        word = word.strip()
+        confidence = float(confidence)
+        if not word or confidence < 0:
+            continue
+        words.append(word)
+        weighted_confidence += confidence * len(word)
+        total_weight += len(word)
+    
+    return {
+        "text": " ".join(words),
+        "confidence": weighted_confidence / total_weight / 100 if total_weight else None,
+    }
+
+def easyocr_engine(image: ImageInput) -> Dict[str, Any]:
+    """
+    Read an image with EasyOCR
+    
+    Args:
+        image: Path to the image file or preprocessed image array
+    
+    Returns:
+        Dictionary with the text and the mean region confidence (0-1)
+    """
+    reader = get_reader()
+    if reader is None:
+        raise RuntimeError("EasyOCR reader is not available")
+    easy_results = reader.readtext(image)
+    logger.debug("EasyOCR found %d text regions", len(easy_results))
+    
+    weighted_confidence = 0.0
+    total_weight = 0
+    for _, region_text, confidence in easy_results:
+        weighted_confidence += float(confidence) * len(region_text)
+        total_weight += len(region_text)
+    
+    return {
+        "text": " ".join([result[1] for result in easy_results]),
+        "confidence": weighted_confidence / total_weight if total_weight else None,
+    }
+
+def easyocr_batch_engine(images: List[ImageInput]) -> List[Dict[str, Any]]:
+    """
+    Read many images with EasyOCR, batching detection and recognition
+    
+    EasyOCR can only batch images of the same size without resizing them,
+    which would hurt accuracy, so images are grouped by size. Scans from the
+    same scanner usually share one size; odd ones out are read one by one.
+    
+    Args:
+        images: Paths to the image files or preprocessed image arrays
+    
+    Returns:
+        One dictionary with the text and mean region confidence per image
+    """
+    reader = get_reader()
+    if reader is None:
+        raise RuntimeError("EasyOCR reader is not available")
+    
+    groups: Dict[Tuple[int, ...], List[int]] = {}
+    outputs: List[Dict[str, Any]] = [None] * len(images)
+    for index, image in enumerate(images):
+        if not isinstance(image, str):
+            groups.setdefault(image.shape, []).append(index)
+            continue
+        try:
+            with Image.open(image) as opened:
+                groups.setdefault((opened.size, opened.mode), []).append(index)
+        except Exception as e:
+            # An unreadable file must not fail the rest of the batch
+            logger.warning("EasyOCR could not open %s: %s", image, e)
+            outputs[index] = {"text": "", "confidence": None}
+    
+    for indices in groups.values():
+        if len(indices) == 1:
+            outputs[indices[0]] = easyocr_engine(images[indices[0]])
+            continue
+        batch_results = reader.readtext_batched([images[i] for i in indices],
+                                                batch_size=EASYOCR_BATCH_SIZE)
+        for index, easy_results in zip(indices, batch_results):
+            weighted_confidence = 0.0
+            total_weight = 0
+            for _, region_text, confidence in easy_results:
+                weighted_confidence += float(confidence) * len(region_text)
+                total_weight += len(region_text)
+            outputs[index] = {
+                "text": " ".join([result[1] for result in easy_results]),
+                "confidence": weighted_confidence / total_weight if total_weight else None,
+            }
+    return outputs
+
+OCR_ENGINES = {
+    "tesseract": tesseract_engine,
+    "easyocr": easyocr_engine,
+}
+OCR_BATCH_ENGINES = {
+    "easyocr": easyocr_batch_engine,
+}
+
+def run_ocr(image_path: str) -> str:
+    """
+    Run the OCR engines on an image, bypassing the cache
+    
+    Args:
+        image_path: Path to the image file
         
-        text = ""
+    Returns:
+        Extracted text as a string
+    """
+    text, _ = run_ocr_with_report(image_path)
+    return text
+
+def run_ocr_with_report(image_path: str,
+                        prepared: Optional[Tuple[ImageInput, Optional[Dict[str, Any]]]] = None,
+                        on_engine_result: Optional[EngineResultCallback] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Run the OCR engines on an image, bypassing the cache
+    
+    The image is preprocessed once, then the engines run as configured by
+    OCR_MODE and the best scoring result is kept.
+    
+    Args:
+        image_path: Path to the image file
+        prepared: Result of prepare_image for the file, if already available
+        on_engine_result: Called with each engine's result as soon as it finishes
         
-        # Try pytesseract for OCR
-        try:
-            print("Attempting pytesseract OCR...")
-            # Use pytesseract with custom configuration for better accuracy
-            custom_config = r'--oem 3 --psm 6 -l eng+hin'
-            text = pytesseract.image_to_string(image, config=custom_config)
-            print(f"Pytesseract result length: {len(text)}")
-            if len(text.strip()) > 0:
-                print(f"Pytesseract extracted: {text[:200]}...")  # Print first 200 chars
-        except Exception as tesseract_error:
-            print(f"Tesseract error: {tesseract_error}")
-            # If tesseract fails, continue with easyocr
-            pass
+    Returns:
+        Tuple of the extracted text and the orchestration report, which
+        includes the preprocessing report
+    """
+    try:
+        logger.debug("Starting OCR extraction for image: %s", image_path)
         
-        # Also try easyocr for better accuracy
-        try:
-            print("Attempting EasyOCR...")
-            easy_results = reader.readtext(image_path)
-            print(f"EasyOCR found {len(easy_results)} text regions")
-            easy_text = " ".join([result[1] for result in easy_results])
-            print(f"EasyOCR result length: {len(easy_text)}")
-            
-            # Use the longer text as it might be more complete
-            if len(easy_text) > len(text):
-                text = easy_text
-                print(f"Using EasyOCR result as it's longer")
-        except Exception as easy_error:
-            print(f"EasyOCR error: {easy_error}")
-            # If easyocr fails, fall back to pytesseract result (even if empty)
-            pass
+        image, preprocessing = prepared or prepare_image(image_path)
+        text, report = orchestrate(OCR_ENGINES, image, on_result=on_engine_result)
+        report["preprocessing"] = preprocessing
+        logger.debug("Using %s result (score %.2f)", report["engine"], report["score"])
         
         # Additional processing to clean up the text
         text = clean_extracted_text(text)
-        print(f"Final cleaned text length: {len(text)}")
+        logger.debug("Final cleaned text length: %d", len(text))
         
-        return text.strip()
+        return text.strip(), report
     
     except Exception as e:
-        print(f"Error extracting text from image: {e}")
-        return ""
+        logger.exception("Error extracting text from image: %s", e)
+        return "", {"cached": False, "engine": None, "error": str(e), "engines": {}}
 
-def extract_entities_from_text(text: str, document_type: str = None) -> Dict[str, Any]:
+def run_layout_ocr(prepared: Tuple[ImageInput, Optional[Dict[str, Any]]],
+                   layout: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Read the fields of a known layout from a preprocessed image
+    
+    Args:
+        prepared: Result of prepare_image
+        layout: Layout template of the document type
+        
+    Returns:
+        Tuple of the labelled field text (empty if the layout could not be
+        applied) and an OCR report with the layout details
+    """
+    image, preprocessing = prepared
+    report = {"cached": False, "mode": "layout", "engine": None, "score": 0.0, "early_exit": False,
+              "engines": {}, "preprocessing": preprocessing}
+    try:
+        if isinstance(image, str):
+            with Image.open(image) as opened:
+                gray = np.asarray(ImageOps.exif_transpose(opened).convert("L"))
+        else:
+            gray = to_grayscale(image)
+        with span("layout_ocr"):
+            layout_result = read_layout(gray, layout, tesseract_field_reader)
+    except Exception as e:
+        logger.warning("Layout OCR failed: %s", e)
+        report["layout"] = {"document_type": layout["document_type"], "aligned": False, "reason": str(e)}
+        return "", report
+    
+    report["layout"] = layout_result
+    if not layout_result["aligned"]:
+        return "", report
+    
+    confidences = [field["confidence"] for field in layout_result["fields"].values()
+                   if field["valid"] and field["confidence"] is not None]
+    confidence = sum(confidences) / len(confidences) if confidences else None
+    text = clean_extracted_text(layout_result["text"]).strip()
+    score = score_result(text, confidence)
+    report.update({
+        "engine": "tesseract",
+        "score": score,
+        "engines": {"tesseract": {"status": "completed", "seconds": layout_result["seconds"],
+                                  "confidence": confidence, "score": score}},
+    })
+    logger.debug("Read %s layout fields in %.2fs", layout["document_type"], layout_result["seconds"])
+    return text, report
+
+def extract_entities_batch(texts: List[str], document_types: Optional[List[str]] = None,
+                           batch_size: int = NLP_BATCH_SIZE,
+                           n_process: int = NLP_N_PROCESS) -> List[Dict[str, Any]]:
+    """
+    Extract entities from many texts, running spaCy over them in batches
+    
+    Args:
+        texts: Raw texts to extract entities from
+        document_types: Type of each document, if known
+        batch_size: Number of texts spaCy processes per batch
+        n_process: Number of processes spaCy uses
+        
+    Returns:
+        List with the extracted entities of each text, in input order
+    """
+    if document_types is None:
+        document_types = [None] * len(texts)
+    
+    nlp = get_nlp()
+    if nlp:
+        docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+    else:
+        docs = (None for _ in texts)
+    
+    return [
+        extract_entities_from_text(text, document_type, doc=doc)
+        for text, document_type, doc in zip(texts, document_types, docs)
+    ]
+
+def extract_entities_from_text(text: str, document_type: str = None, doc=None,
+                               on_entity: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     """
     Extract structured entities from text using rule-based and NLP approaches
     
+    The text is parsed by spaCy at most once, and the same Doc serves both
+    the NER pass and the name fallback.
+    
     Args:
         text: Raw text to extract entities from
         document_type: Type of document (aadhaar, pan, voter) to help with extraction
+        doc: spaCy Doc for the text, if it was already parsed
+        on_entity: Called with the name and entry of each entity once its value is final
         
     Returns:
         Dictionary with extracted entities and confidence scores
     """
     entities = {}
     
+    def settled(*names: str):
+        # Report entities once no later step can change them
+        if on_entity is not None:
+            for name in names:
+                if name in entities:
+                    on_entity(name, entities[name])
+    
     # Clean the text
     clean_text = text.lower()
     
+    # Find candidates for all labelled fields in one go
+    with span("extract.scan"):
+        fields = scan_fields(clean_text)
+    
     # Use NER if spaCy model is available
-    if nlp:
-        doc = nlp(text)
+    if doc is None:
+        nlp = get_nlp()
+        if nlp:
+            with span("spacy"):
+                doc = nlp(text)
+    if doc is not None:
         
         # Extract named entities using spaCy NER
         for ent in doc.ents:
@@ -119,15 +584,18 @@ def extract_entities_from_text(text: str, document_type: str = None) -> Dict[str
                 entities["address"] = {"value": ent.text, "confidence": 0.7}
     
     # Extract Name using rule-based approach (always try to extract)
-    name = extract_name(clean_text)
+    with span("extract.name"):
+        name = extract_name(clean_text, fields, doc)
     if name and "name" not in entities:
         entities["name"] = {"value": name, "confidence": calculate_confidence(name, clean_text)}
     elif "name" not in entities:
         # Add empty name entry if not found
         entities["name"] = {"value": "", "confidence": 0.0}
+    settled("name")
     
     # Extract Date of Birth (always try to extract)
-    dob = extract_date_of_birth(clean_text)
+    with span("extract.dob"):
+        dob = extract_date_of_birth(clean_text, fields)
     if dob and "dob" not in entities:
         entities["dob"] = {"value": dob, "confidence": calculate_confidence(dob, clean_text)}
         # Calculate age from date of birth
@@ -137,33 +605,41 @@ def extract_entities_from_text(text: str, document_type: str = None) -> Dict[str
     elif "dob" not in entities:
         # Add empty dob entry if not found
         entities["dob"] = {"value": "", "confidence": 0.0}
+    settled("dob", "age")
     
     # Extract Gender (always try to extract)
-    gender = extract_gender(clean_text)
+    with span("extract.gender"):
+        gender = extract_gender(clean_text)
     if gender:
         entities["gender"] = {"value": gender, "confidence": calculate_confidence(gender, clean_text)}
     elif "gender" not in entities:
         # Add empty gender entry if not found
         entities["gender"] = {"value": "", "confidence": 0.0}
+    settled("gender")
     
     # Extract Address (always try to extract)
-    address = extract_address(clean_text)
+    with span("extract.address"):
+        address = extract_address(clean_text)
     if address and "address" not in entities:
         entities["address"] = {"value": address, "confidence": calculate_confidence(address, clean_text)}
     elif "address" not in entities:
         # Add empty address entry if not found
         entities["address"] = {"value": "", "confidence": 0.0}
+    settled("address")
     
     # Extract Aadhaar Number (always try to extract)
-    aadhaar = extract_aadhaar_number(clean_text)
+    with span("extract.aadhaar"):
+        aadhaar = extract_aadhaar_number(clean_text, fields)
     if aadhaar:
         entities["aadhaar"] = {"value": aadhaar, "confidence": calculate_confidence(aadhaar, clean_text)}
     elif "aadhaar" not in entities:
         # Add empty aadhaar entry if not found
         entities["aadhaar"] = {"value": "", "confidence": 0.0}
+    settled("aadhaar")
     
     # Extract PAN Number (context-aware extraction)
-    pan = extract_pan_number(clean_text)
+    with span("extract.pan"):
+        pan = extract_pan_number(clean_text, fields)
     if pan:
         # Adjust confidence based on document type
         base_confidence = calculate_confidence(pan, clean_text)
@@ -179,78 +655,36 @@ def extract_entities_from_text(text: str, document_type: str = None) -> Dict[str
     elif "pan" not in entities:
         # Add empty pan entry if not found
         entities["pan"] = {"value": "", "confidence": 0.0}
+    settled("pan")
     
     # Extract Voter ID
-    voter_id = extract_voter_id(clean_text)
+    with span("extract.voter_id"):
+        voter_id = extract_voter_id(clean_text, fields)
     if voter_id:
         entities["voter_id"] = {"value": voter_id, "confidence": calculate_confidence(voter_id, clean_text)}
+    settled("voter_id")
     
     # Extract Parent/Guardian Name
-    parent_name = extract_parent_name(clean_text)
+    with span("extract.parent_name"):
+        parent_name = extract_parent_name(clean_text, fields)
     if parent_name:
         entities["parent_name"] = {"value": parent_name, "confidence": calculate_confidence(parent_name, clean_text)}
+    settled("parent_name")
     
     return entities
 
-def extract_name(text: str) -> str:
-    """Extract name using pattern matching and NLP"""
-    # Look for common name indicators in Indian documents
-    patterns = [
-        r'name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'nama[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'full\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'father[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'mother[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'spouse[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'husband[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'wife[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'candidate[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'applicant[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'surname[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'given\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'first\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'last\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'holder\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'cardholder\s+name[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'holder[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-        r'guardian[:\s]+([A-Z][a-zA-Z\s.\-\(\)]+)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            # Return the first match that looks like a name (not too long, has spaces)
-            for match in matches:
-                # Clean the match by removing extra punctuation at the end
-                clean_match = match.strip().rstrip(':.,;').strip()
-                if 3 <= len(clean_match) <= 100 and len(clean_match.split()) >= 1:
-                    return clean_match
-    
-    # If pattern matching fails, try looking for sequences of words with capital letters
-    # that might represent names
-    # Look for capitalized words that could be names
-    potential_names = re.findall(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z.\-\(\)]*)+)\b', text)
-    if potential_names:
-        # Return the most likely name (longest or most structured)
-        return max(potential_names, key=len).strip()
-    
-    # Look for capitalized words between 'name' and 'address' or other common fields
-    name_to_address_pattern = r'name[:\s]*([A-Z][a-zA-Z\s.\-\(\)]+?)(?:address|father|mother|dob|date|yob|year|gender|sex|age|ward|house|street|locality|city|state|pin|code|post|po|ps|district|village|taluka|tehsil|zone|circle|region|location|ward|building|house|door|flat|floor|apartment|residence|domicile|resident|citizen|id|number|no\.?|\d{4,}|\\n|\\r|\\t|\\v)'
-    name_to_address_matches = re.findall(name_to_address_pattern, text, re.IGNORECASE)
-    if name_to_address_matches:
-        # Return the longest match
-        return max(name_to_address_matches, key=len).strip()
-    
-    # Look for capitalized words between other common fields
-    address_to_name_pattern = r'(?:address|father|mother|dob|date|yob|year|gender|sex|age|ward|house|street|locality|city|state|pin|code|post|po|ps|district|village|taluka|tehsil|zone|circle|region|location|ward|building|house|door|flat|floor|apartment|residence|domicile|resident|citizen|id|number|no\.?|\d{4,}|\\n|\\r|\\t|\\v)[\s\S]*?([A-Z][a-zA-Z\s.\-\(\)]{10,})'
-    address_to_name_matches = re.findall(address_to_name_pattern, text, re.IGNORECASE)
-    if address_to_name_matches:
-        # Return the shortest match (most likely to be a name)
-        return min(address_to_name_matches, key=len).strip()
+def extract_name(text: str, fields: Dict[str, List[ScanHit]] = None, doc=None) -> str:
+    """Extract name using pattern matching and NLP, reusing the spaCy Doc if given"""
+    name = extract_name_by_pattern(text, fields)
+    if name:
+        return name
     
     # If pattern matching fails, try NLP approach
-    if nlp:
-        doc = nlp(text)
+    if doc is None:
+        nlp = get_nlp()
+        if nlp:
+            doc = nlp(text)
+    if doc is not None:
         # Look for person entities
         person_entities = []
         for ent in doc.ents:
@@ -263,297 +697,6 @@ def extract_name(text: str) -> str:
     
     return ""
 
-def extract_date_of_birth(text: str) -> str:
-    """Extract date of birth using regex patterns"""
-    # Common date patterns in Indian documents
-    patterns = [
-        r'date of birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
-        r'dob[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
-        r'birth[:\s]+date[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
-        r'date[:\s]+of[:\s]+birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
-        r'birth[:\s]+(\d{2}[-/]\d{2}[-/]\d{4})',
-        r'(\d{2}[-/]\d{2}[-/]\d{4})',  # General date pattern
-        r'(\d{1,2}[-/]\d{1,2}[-/]\d{4})',  # Less strict date pattern
-        r'(\d{2}-\d{2}-\d{2})',  # DD-MM-YY format
-        r'(\d{4}[-/]\d{2}[-/]\d{2})',  # YYYY-MM-DD format
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            # Validate if it's a reasonable date of birth
-            for match in matches:
-                try:
-                    # Handle different date formats
-                    date_str = match.replace('/', '-').replace(' ', '').strip()
-                    if len(date_str.split('-')[-1]) == 2:  # YY format
-                        date_obj = datetime.strptime(date_str, '%d-%m-%y')
-                    else:  # YYYY or DD-MM-YYYY format
-                        if len(date_str) == 10 and date_str[2] == '-':
-                            date_obj = datetime.strptime(date_str, '%d-%m-%Y')
-                        elif len(date_str) == 10 and date_str[4] == '-':
-                            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                        else:
-                            continue
-                    
-                    # Check if the date is reasonable (not in the future, not too old)
-                    current_year = datetime.now().year
-                    if 1900 <= date_obj.year <= current_year:
-                        return match
-                except ValueError:
-                    continue
-    
-    return ""
-
-def extract_gender(text: str) -> str:
-    """Extract gender"""
-    # More comprehensive gender patterns for Indian documents
-    gender_patterns = {
-        'male': [
-            r'\bmale\b',
-            r'\bm\.?\b',  # 'M' or 'M.' for male
-            r'\bgentleman\b',
-            r'\bman\b',
-            r'\bboy\b',
-            r'\bhusband\b',
-            r'\bson\b',
-            r'\bhe\b',
-            r'\bmasculine\b',
-            r'\bmales\b'
-        ],
-        'female': [
-            r'\bfemale\b',
-            r'\bf\.?\b',  # 'F' or 'F.' for female
-            r'\bwomen\b',
-            r'\bgirl\b',
-            r'\bwife\b',
-            r'\bdaughter\b',
-            r'\bshe\b',
-            r'\bfemales\b',
-            r'\bwoman\b',
-            r'\bfem\b'
-        ],
-        'other': [
-            r'\bother\b',
-            r'\btransgender\b',
-            r'\btrans\b'
-        ]
-    }
-    
-    # Check for gender indicators in order of priority
-    text_lower = text.lower()
-    
-    # Look for explicit gender labels first
-    for gender, patterns in gender_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, text_lower):
-                # Additional validation: make sure it's not part of a larger word or context
-                matches = re.finditer(pattern, text_lower)
-                for match in matches:
-                    # Check if the match is a complete word and not part of another word
-                    start, end = match.span()
-                    # Check if it's surrounded by word boundaries or common delimiters
-                    before_char = text_lower[start-1] if start > 0 else ' '
-                    after_char = text_lower[end] if end < len(text_lower) else ' '
-                    
-                    if (before_char in ' \t\n:,-' or before_char.isalpha() == False) and \
-                       (after_char in ' \t\n:,-' or after_char.isalpha() == False):
-                        return gender.capitalize()
-    
-    return ""
-
-def extract_address(text: str) -> str:
-    """Extract address"""
-    # Look for address indicators
-    address_indicators = [
-        r'address[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'permanent address[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'current address[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'residential address[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'addr[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'location[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-        r'place[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)',
-    ]
-    
-    for pattern in address_indicators:
-        matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-        if matches:
-            # Return the longest address match
-            longest_match = max(matches, key=len)
-            # Clean up the match to remove extra whitespace
-            return re.sub(r'\s+', ' ', longest_match.strip())
-    
-    # Look for postal code patterns followed by addresses
-    postal_patterns = [
-        r'(\d{6})[\s\n]+([A-Za-z\s,\.\n\r\-]+?)',  # 6-digit postal code followed by location
-        r'([A-Za-z\s,\.\n\r\-]+?)[\s\n]+(\d{6})',  # Location followed by 6-digit postal code
-    ]
-    
-    for pattern in postal_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE | re.DOTALL)
-        if matches:
-            for match in matches:
-                if isinstance(match, tuple):
-                    # Combine both parts if it's a tuple
-                    combined = " ".join(match).strip()
-                    if len(combined) > 10:  # Only return if it's a substantial address
-                        return re.sub(r'\s+', ' ', combined)
-                else:
-                    if len(match) > 10:
-                        return re.sub(r'\s+', ' ', match.strip())
-    
-    # Look for complete address blocks that span multiple lines
-    # Usually addresses have multiple components like house no, street, city, state, pin code
-    multi_line_address_pattern = r'([A-Za-z0-9\s,.\n\r\-]{30,}?)(?:\n\s*\n|DOB|Date|Gender|Age|Name|Father|Mother|Wife|Husband|Income|Annual|Signature|\d{12}|[A-Z]{3}[0-9]{7})'
-    multi_line_matches = re.findall(multi_line_address_pattern, text, re.IGNORECASE | re.DOTALL)
-    if multi_line_matches:
-        # Return the longest match
-        longest_addr = max(multi_line_matches, key=len)
-        return re.sub(r'\s+', ' ', longest_addr.strip())
-    
-    # If specific patterns don't work, look for Indian city/state patterns
-    indian_cities_states = r'(?:mumbai|delhi|bangalore|kolkata|chennai|hyderabad|pune|ahmedabad|jaipur|lucknow|patna|bhopal|chandigarh|nagpur|indore|thane|bhubaneswar|vadodara|nashik|agra|kanpur|noida|gurgaon|faridabad|meerut|varanasi|allahabad|amritsar|srinagar|jodhpur|raipur|vizag|coimbatore|mysore|ludhiana|aurangabad|gwalior|jalandhar|madurai|thane|mira bhayandar|kalyan|dombivli|bareilly|jammu|gulbarga|dhanbad|hubli|rohtak|kollam|thiruvananthapuram|kochi|kozhikode|tiruchirappalli|salem|warangal|guntur|vijayawada|rajahmundry|tiruppur|davanagere|bikaner|kakinada|nellore|bijapur|kota|tumkur|kharagpur|bhatpara|kulti|kamarhati|durgapur|siliguri|berhampur|rourkela|baharampur|mathura|amravati|nanded|nandyal|khammam|mahbubnagar|raichur|adoni|tadepalligudem|tirunelveli|danapur|bally|ahmednagar|cuddalore|tiruvannamalai|chittoor|karnal|bhagalpur|tirupati|saharanpur|eluru|bhavnagar|maharashtra|tamil nadu|karnataka|kerala|telangana|andhra pradesh|uttar pradesh|madhya pradesh|rajasthan|west bengal|bihar|gujarat|jharkhand|odisha|assam|haryana|punjab|himachal pradesh|uttarakhand|chhattisgarh|jammu and kashmir|ladakh|andaman and nicobar|dadra and nagar haveli|daman and diu|lakshadweep|puducherry)'
-    
-    # Look for text blocks that contain Indian locations
-    paragraphs = text.split('\n\n')  # Split by double newlines for better paragraph detection
-    for para in paragraphs:
-        if re.search(indian_cities_states, para, re.IGNORECASE) and len(para) > 20:
-            return re.sub(r'\s+', ' ', para.strip())
-    
-    # Look for blocks that might be addresses (contain numbers and Indian location indicators)
-    potential_addresses = re.findall(r'([A-Za-z0-9\s,.#\n\r\-]{20,})', text, re.DOTALL)
-    for addr in potential_addresses:
-        if (re.search(indian_cities_states, addr, re.IGNORECASE) or len(re.findall(r'\d+', addr)) >= 2) and len(addr.split()) > 5:
-            return re.sub(r'\s+', ' ', addr.strip())
-    
-    return ""
-
-def extract_aadhaar_number(text: str) -> str:
-    """Extract Aadhaar number"""
-    # Aadhaar patterns: 12 digits with or without spaces/dashes
-    patterns = [
-        r'(\d{4}[\s-]?\d{4}[\s-]?\d{4})',  # 12-digit pattern
-        r'(\d{12})',  # 12 consecutive digits
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            for match in matches:
-                # Validate Aadhaar format (basic validation)
-                clean_match = re.sub(r'[\s-]', '', match)
-                if len(clean_match) == 12 and clean_match.isdigit():
-                    # Format with spaces for readability
-                    formatted = f"{clean_match[:4]} {clean_match[4:8]} {clean_match[8:]}"
-                    return formatted
-    
-    return ""
-
-def extract_pan_number(text: str) -> str:
-    """Extract PAN number"""
-    # PAN pattern: 5 letters + 4 digits + 1 letter
-    pattern = r'([A-Z]{5}[0-9]{4}[A-Z])'
-    matches = re.findall(pattern, text, re.IGNORECASE)
-    
-    if matches:
-        # Validate that this is actually a PAN by looking for PAN indicators in the text
-        pan_indicators = ["pan", "permanent account number", "pan card", "income tax"]
-        text_lower = text.lower()
-        has_pan_indicator = any(indicator in text_lower for indicator in pan_indicators)
-        
-        # If we found a potential PAN and there are PAN indicators in the text, return it
-        if has_pan_indicator:
-            return matches[0].upper()
-        # If no PAN indicators but we still found a pattern, check if it's in a context that suggests it's a PAN
-        else:
-            # Look for context around the potential PAN
-            for match in matches:
-                # Find the match in the text and check surrounding context
-                match_upper = match.upper()
-                text_upper = text.upper()
-                start_idx = text_upper.find(match_upper)
-                if start_idx != -1:
-                    # Get context around the match
-                    context_start = max(0, start_idx - 50)
-                    context_end = min(len(text_upper), start_idx + len(match_upper) + 50)
-                    context = text_upper[context_start:context_end]
-                    
-                    # Check if context contains PAN-related terms
-                    pan_context_indicators = ["pan", "card", "number", "income", "tax", "govt", "government"]
-                    if any(indicator.upper() in context for indicator in pan_context_indicators):
-                        return match_upper
-    
-    return ""
-
-def extract_voter_id(text: str) -> str:
-    """Extract Voter ID"""
-    # Voter ID patterns: various formats
-    patterns = [
-        r'([A-Z]{3}[0-9]{7})',  # Standard format: 3 letters + 7 digits
-        r'(VOTER-[A-Z]{3}[0-9]{7})',  # With prefix
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            return matches[0].upper()
-    
-    return ""
-
-def extract_parent_name(text: str) -> str:
-    """Extract parent/guardian name"""
-    patterns = [
-        r'father[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-        r'mother[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-        r'guardian[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-        r'parent[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-        r'husband[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-        r'wife[\'\s]*s?\s+name[:\s]+([A-Z][a-zA-Z\s]+)',
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            # Return the first match that looks like a name
-            for match in matches:
-                if 3 <= len(match.strip()) <= 100 and len(match.split()) >= 1:
-                    return match.strip()
-    
-    return ""
-
-def calculate_age_from_dob(dob_str: str) -> int:
-    """
-    Calculate age from date of birth string
-    """
-    if not dob_str:
-        return None
-    
-    try:
-        # Handle different date formats
-        date_formats = [
-            '%d-%m-%Y',  # DD-MM-YYYY
-            '%d/%m/%Y',  # DD/MM/YYYY
-            '%d-%m-%y',  # DD-MM-YY
-            '%d/%m/%y',  # DD/MM/YY
-            '%Y-%m-%d',  # YYYY-MM-DD
-            '%Y/%m/%d',  # YYYY/MM/DD
-        ]
-        
-        dob_str = dob_str.strip()
-        
-        for fmt in date_formats:
-            try:
-                dob = datetime.strptime(dob_str, fmt)
-                today = datetime.now()
-                age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-                return age
-            except ValueError:
-                continue
-        
-        return None
-    except Exception:
-        return None
-
 def clean_extracted_text(text: str) -> str:
     """
     Clean and improve the extracted text
@@ -580,40 +723,11 @@ def clean_extracted_text(text: str) -> str:
         try:
             text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
         except re.error as e:
-            print(f"Regex error in clean_extracted_text: {e}")
+            logger.error("Regex error in clean_extracted_text: %s", e)
             continue  # Skip this replacement if there's an error
     
     return text
 
-def calculate_confidence(entity_value: str, text: str) -> float:
-    """
-    Calculate a basic confidence score based on entity characteristics
-    """
-    if not entity_value:
-        return 0.0
-    
-    # Base confidence
-    confidence = 0.7
-    
-    # Increase confidence based on entity validation
-    if entity_value in text:
-        confidence += 0.2
-    
-    # For dates, validate format
-    if re.match(r'\d{2}[-/]\d{2}[-/]\d{4}', entity_value):
-        confidence = min(0.95, confidence + 0.15)
-    
-    # For Aadhaar numbers
-    if re.match(r'\d{4}\s\d{4}\s\d{4}', entity_value):
-        confidence = min(0.95, confidence + 0.2)
-    
-    # For PAN numbers
-    if re.match(r'[A-Z]{5}[0-9]{4}[A-Z]', entity_value):
-        confidence = min(0.95, confidence + 0.2)
-    
-    # Ensure confidence is within bounds
-    return min(0.99, max(0.1, confidence))
-
 # Additional helper functions for Indian language processing
 def detect_language(text: str) -> str:
     """
@@ -7,72 +7,115 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 import os
-from typing import Dict, Any
+import hashlib
+import io
+import json
+import logging
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+from collections import OrderedDict
+from typing import Dict, Any, BinaryIO, List, Tuple, Union
+from storage_manager import storage
+from template_registry import template_registry
+from pdf_ingest import pdfium
+from observability import record_cache_lookup, span
 
-def generate_pdf_form(form_data: Dict[str, Any], form_type: str, output_path: str) -> str:
+logger = logging.getLogger(__name__)
+
+# Part of the PDF cache key; bump whenever the PDF layout changes
+PDF_LAYOUT_VERSION = 1
+
+# Number of PDFs rendered in memory that are kept for repeated downloads
+PDF_MEMORY_CACHE_SIZE = int(os.environ.get("PDF_MEMORY_CACHE_SIZE", "64"))
+
+# Fonts and paragraph styles, set up on first use and shared by all PDFs
+_styles = None
+_styles_lock = threading.Lock()
+
+def get_styles() -> Dict[str, ParagraphStyle]:
+    """
+    Register the fonts and build the paragraph styles, once per process
+    
+    Returns:
+        Dictionary with the title, heading and normal styles
+    """
+    global _styles
+    with _styles_lock:
+        if _styles is not None:
+            return _styles
+        
+        # Register fonts for Indian languages (optional)
+        try:
+            # Try to register common fonts
+            pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
+            pdfmetrics.registerFont(TTFont('ArialBold', 'arialbd.ttf'))
+        except:
+            # If custom fonts are not available, use default fonts
+            pass
+        
+        styles = getSampleStyleSheet()
+        normal_style = styles['Normal']
+        normal_style.fontSize = 10
+        _styles = {
+            "title": ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=18,
+                spaceAfter=30,
+                alignment=TA_CENTER,
+                textColor=colors.darkblue
+            ),
+            "heading": ParagraphStyle(
+                'CustomHeading',
+                parent=styles['Heading2'],
+                fontSize=14,
+                spaceAfter=12,
+                textColor=colors.darkred
+            ),
+            "normal": normal_style,
+        }
+        return _styles
+
+def generate_pdf_form(form_data: Dict[str, Any], form_type: str,
+                      output_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
     """
     Generate a PDF form with the filled data
     
     Args:
         form_data: Dictionary containing form field data
         form_type: Type of form (income_certificate, birth_certificate, ration_card)
-        output_path: Path where the PDF should be saved
+        output_path: Path where the PDF should be saved, or a binary buffer to write it to
         
     Returns:
-        Path to the generated PDF
+        Path to (or buffer of) the generated PDF
     """
-    # Register fonts for Indian languages (optional)
-    try:
-        # Try to register common fonts
-        pdfmetrics.registerFont(TTFont('Arial', 'arial.ttf'))
-        pdfmetrics.registerFont(TTFont('ArialBold', 'arialbd.ttf'))
-    except:
-        # If custom fonts are not available, use default fonts
-        pass
-    
+    with span("pdf_render"):
+        return _build_pdf_form(form_data, form_type, output_path)
+
+def _build_pdf_form(form_data: Dict[str, Any], form_type: str,
+                    output_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
+    """Lay out and write the PDF of generate_pdf_form"""
     # Create the PDF document
     doc = SimpleDocTemplate(output_path, pagesize=letter)
     elements = []
     
     # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=12,
-        textColor=colors.darkred
-    )
+    styles = get_styles()
+    title_style = styles["title"]
+    heading_style = styles["heading"]
+    normal_style = styles["normal"]
     
-    normal_style = styles['Normal']
-    normal_style.fontSize = 10
-    
-    # Add title based on form type
-    if form_type == "income_certificate":
-        title = "Income Certificate Application"
-        dept = "Revenue Department"
-    elif form_type == "birth_certificate":
-        title = "Birth Certificate Application"
-        dept = "Municipal Corporation / Revenue Department"
-    elif form_type == "ration_card":
-        title = "Ration Card Application"
-        dept = "Food and Civil Supplies Department"
-    else:
-        title = "Government Form Application"
-        dept = "Government Department"
+    # Title, labels, instructions and required documents come from the form template
+    template = template_registry.get(form_type) or {}
+    title = template.get("title", "Government Form Application")
+    dept = template.get("department", "Government Department")
+    labels = {field["name"]: field["label"] for field in template.get("fields", [])}
     
     # Title
-    elements.append(Paragraph(title, title_style))
-    elements.append(Paragraph(f"Department: {dept}", normal_style))
+    elements.append(Paragraph(escape(title), title_style))
+    elements.append(Paragraph(f"Department: {escape(dept)}", normal_style))
     elements.append(Spacer(1, 12))
     
     # Add form data as a table
@@ -80,17 +123,20 @@ def generate_pdf_form(form_data: Dict[str, Any], form_type: str, output_path: st
     
     for field_name, field_value in form_data.items():
         if field_value:  # Only include fields that have values
-            label = format_field_label(field_name)
+            label = labels.get(field_name) or format_field_label(field_name)
             value = str(field_value) if field_value is not None else ""
             
             # Format long text values
             if len(value) > 100:
                 # Split long text into multiple lines for better readability
                 lines = [value[i:i+60] for i in range(0, len(value), 60)]
-                value = "<br/>".join(lines)
+                value = "<br/>".join(escape(line) for line in lines)
+            else:
+                # Paragraphs are markup, so user input must not be read as tags
+                value = escape(value)
             
             form_table_data.append([
-                Paragraph(f"<b>{label}:</b>", normal_style),
+                Paragraph(f"<b>{escape(label)}:</b>", normal_style),
                 Paragraph(value, normal_style)
             ])
     
@@ -112,19 +158,19 @@ def generate_pdf_form(form_data: Dict[str, Any], form_type: str, output_path: st
         elements.append(Spacer(1, 20))
     
     # Add instructions if available
-    instructions = get_form_instructions(form_type)
+    instructions = template.get("instructions", [])
     if instructions:
         elements.append(Paragraph("Instructions:", heading_style))
         for instruction in instructions:
-            elements.append(Paragraph(f"• {instruction}", normal_style))
+            elements.append(Paragraph(f"• {escape(instruction)}", normal_style))
         elements.append(Spacer(1, 12))
     
     # Add required documents if available
-    required_docs = get_required_documents(form_type)
+    required_docs = template.get("required_documents", [])
     if required_docs:
         elements.append(Paragraph("Required Documents:", heading_style))
-        for doc in required_docs:
-            elements.append(Paragraph(f"• {doc}", normal_style))
+        for required_doc in required_docs:
+            elements.append(Paragraph(f"• {escape(required_doc)}", normal_style))
         elements.append(Spacer(1, 20))
     
     # Add signature area
@@ -150,109 +196,113 @@ def generate_pdf_form(form_data: Dict[str, Any], form_type: str, output_path: st
 
 def format_field_label(field_name: str) -> str:
     """
-    Format field name for display in PDF
+    Format field name for display in PDF, for fields without a template label
     """
-    label_map = {
-        'applicant_name': 'Applicant Name',
-        'father_or_husband_name': "Father's / Husband's Name",
-        'date_of_birth': 'Date of Birth',
-        'gender': 'Gender',
-        'permanent_address': 'Permanent Address',
-        'address': 'Address',
-        'aadhaar_number': 'Aadhaar Number',
-        'financial_year': 'Financial Year',
-        'annual_income': 'Annual Income',
-        'occupation': 'Occupation',
-        'signature': "Applicant's Signature",
-        'date': 'Date',
-        'place': 'Place',
-        'person_name': 'Person Name',
-        'place_of_birth': 'Place of Birth',
-        'father_name': "Father's Name",
-        'mother_name': "Mother's Name",
-        'present_address': 'Present Address',
-        'ration_card_number': 'Ration Card Number',
-        'applicant_relation': 'Applicant Relationship',
-        'application_date': 'Application Date',
-        'purpose': 'Purpose',
-        'head_of_family': 'Head of Family',
-        'card_type': 'Card Type',
-        'family_members': 'Family Members Details',
-        'total_family_members': 'Total Family Members',
-        'mobile_number': 'Mobile Number',
-        'email': 'Email Address',
-        'religion': 'Religion',
-        'category': 'Category'
-    }
-    
-    return label_map.get(field_name, field_name.replace('_', ' ').title())
+    return field_name.replace('_', ' ').title()
 
-def get_form_instructions(form_type: str) -> list:
-    """
-    Get form-specific instructions
+def safe_form_type(form_type: str) -> str:
+    """Form type reduced to characters that are safe in file names"""
+    return re.sub(r"[^A-Za-z0-9_-]", "", form_type)[:40]
+
+def pdf_cache_key(form_data: Dict[str, Any], form_type: str) -> str:
     """
-    instructions_map = {
-        "income_certificate": [
-            "All fields marked with * are mandatory",
-            "Provide authentic information as per your documents",
-            "Attach required documents as mentioned in the checklist",
-            "Submit with proper signature and date"
-        ],
-        "birth_certificate": [
-            "All fields marked with * are mandatory",
-            "Provide authentic information as per birth records",
-            "Attach required documents as mentioned in the checklist",
-            "Submit with proper signature and date"
-        ],
-        "ration_card": [
-            "All fields marked with * are mandatory",
-            "Provide authentic information as per your documents",
-            "Attach required documents as mentioned in the checklist",
-            "Submit with proper signature and date"
-        ]
-    }
+    Hash of everything that determines the content of a generated PDF,
+    including the version of the form template
     
-    return instructions_map.get(form_type, [])
+    Field order is kept, since it sets the order of the rows in the PDF.
+    """
+    content = json.dumps([PDF_LAYOUT_VERSION, template_registry.version(form_type), form_type, form_data],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
-def get_required_documents(form_type: str) -> list:
+def create_downloadable_pdf(form_data: Dict[str, Any], form_type: str) -> str:
     """
-    Get form-specific required documents
+    Create a PDF that can be downloaded by the user
+    
+    PDFs are named after a hash of the form type and data, so a request for
+    a PDF that was already generated returns the existing file.
+    
+    Returns:
+        Path to the PDF
     """
-    docs_map = {
-        "income_certificate": [
-            "Aadhaar Card (Aadhaar number)",
-            "Address Proof",
-            "Income Proof (if available)",
-            "Passport Size Photo"
-        ],
-        "birth_certificate": [
-            "Hospital Birth Record",
-            "Parent's ID Proof (Aadhaar, Voter ID, etc.)",
-            "Address Proof",
-            "Early School Certificate (if available)",
-            "Ration Card (if available)"
-        ],
-        "ration_card": [
-            "Aadhaar Card (for all family members)",
-            "Address Proof",
-            "Income Certificate (if applicable)",
-            "Caste Certificate (if applicable)",
-            "Passport Size Photos (2 for new card, 1 for update)",
-            "Bank Passbook (first page copy)"
-        ]
-    }
+    filename = f"form_{safe_form_type(form_type)}_{pdf_cache_key(form_data, form_type)[:32]}.pdf"
+    output_path = storage.path_for("pdfs", filename)
+    exists = os.path.exists(output_path)
+    record_cache_lookup("pdf_file", exists)
+    if exists:
+        logger.debug("PDF cache hit: %s", filename)
+        storage.touch(output_path)
+        return output_path
     
-    return docs_map.get(form_type, [])
+    # Render under a temporary name so a concurrent request never serves a
+    # partly written file
+    partial_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        generate_pdf_form(form_data, form_type, partial_path)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    storage.record_write("pdfs", os.path.getsize(output_path))
+    return output_path
 
-def create_downloadable_pdf(form_data: Dict[str, Any], form_type: str) -> str:
+_rendered: "OrderedDict[str, bytes]" = OrderedDict()
+_rendered_lock = threading.Lock()
+
+def render_pdf(form_data: Dict[str, Any], form_type: str) -> Tuple[bytes, str]:
     """
-    Create a PDF that can be downloaded by the user
+    Render a PDF into memory, without touching the disk
+    
+    The most recently rendered PDFs are kept in memory, so repeated
+    downloads of the same form data are not rendered again.
+    
+    Returns:
+        Tuple of the PDF bytes and its cache key, usable as an ETag
     """
-    import uuid
-    filename = f"form_{form_type}_{uuid.uuid4().hex[:8]}.pdf"
-    output_path = os.path.join("temp", filename)
+    key = pdf_cache_key(form_data, form_type)
+    with _rendered_lock:
+        content = _rendered.get(key)
+        record_cache_lookup("pdf_memory", content is not None)
+        if content is not None:
+            _rendered.move_to_end(key)
+            return content, key
     
-    # Ensure temp directory exists
-    os.makedirs("temp", exist_ok=True)
+    buffer = io.BytesIO()
+    generate_pdf_form(form_data, form_type, buffer)
+    content = buffer.getvalue()
+    with _rendered_lock:
+        _rendered[key] = content
+        while len(_rendered) > PDF_MEMORY_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return content, key
+
+def merge_pdfs(contents: List[bytes]) -> bytes:
+    """
+    Concatenate PDFs into one document
     
-    return generate_pdf_form(form_data, form_type, output_path)
\ No newline at end of file
+    Raises:
+        RuntimeError: If pypdfium2 is not installed
+    """
+    if pdfium is None:
+        raise RuntimeError("Merging PDFs requires pypdfium2. Install it using: pip install pypdfium2")
+    merged = pdfium.PdfDocument.new()
+    try:
+        for content in contents:
+            source = pdfium.PdfDocument(content)
+            try:
+                merged.import_pages(source)
+            finally:
+                source.close()
+        buffer = io.BytesIO()
+        merged.save(buffer)
+        return buffer.getvalue()
+    finally:
+        merged.close()
+
+def zip_pdfs(files: List[Tuple[str, bytes]], output: BinaryIO):
+    """Write PDFs to a ZIP archive, given (file name, content) pairs"""
+    # PDF page content is already compressed, so the files are stored as is
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
@@ -0,0 +1,205 @@
+"""
+Bounded on-disk storage for uploaded documents and generated PDFs.
+
+Files are grouped into categories, each with its own directory, byte quota
+and time to live:
+
+- uploads: documents uploaded for extraction (STORAGE_UPLOADS_DIR)
+- pdfs: generated forms, served to the browser under /temp (STORAGE_PDFS_DIR)
+
+Within a category, files are spread over 256 shard directories named after
+the first two hex digits of a hash of the file name, so no directory grows
+large enough to slow down listings.
+
+The file modification time doubles as the last-use time: touch() marks a
+file as used. A sweep deletes files older than the category's TTL, then the
+least recently used files until the category fits in its quota. Sweeps run
+periodically in the background and immediately when a write would push a
+category over its quota. Since the state lives on disk, several server
+processes can share the same directories.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from observability import metrics
+
+STORAGE_UPLOADS_DIR = os.environ.get("STORAGE_UPLOADS_DIR", "uploads")
+STORAGE_UPLOADS_MAX_BYTES = int(os.environ.get("STORAGE_UPLOADS_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+STORAGE_UPLOADS_TTL_SECONDS = float(os.environ.get("STORAGE_UPLOADS_TTL_SECONDS", str(24 * 60 * 60)))
+STORAGE_PDFS_DIR = os.environ.get("STORAGE_PDFS_DIR", "temp")
+STORAGE_PDFS_MAX_BYTES = int(os.environ.get("STORAGE_PDFS_MAX_BYTES", str(512 * 1024 * 1024)))
+STORAGE_PDFS_TTL_SECONDS = float(os.environ.get("STORAGE_PDFS_TTL_SECONDS", str(60 * 60)))
+# Seconds between background sweeps
+STORAGE_SWEEP_INTERVAL = float(os.environ.get("STORAGE_SWEEP_INTERVAL", "300"))
+
+logger = logging.getLogger(__name__)
+
+
+class StorageCategory:
+    """A directory of files with a byte quota and a time to live"""
+
+    def __init__(self, name: str, directory: str, max_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Size found by the last sweep plus what this process wrote since
+        self.bytes_used = 0
+        self.files = 0
+        self.evicted_files = {"ttl": 0, "lru": 0}
+        self.evicted_bytes = 0
+        self.sweeps = 0
+        self.last_sweep_seconds = 0.0
+
+
+class StorageManager:
+    """
+    Places files in sharded category directories and keeps each category
+    within its quota and TTL
+    """
+
+    def __init__(self):
+        self.categories: Dict[str, StorageCategory] = {}
+        self._lock = threading.Lock()
+
+    def add_category(self, name: str, directory: str, max_bytes: int, ttl_seconds: float):
+        """Register a category of files"""
+        self.categories[name] = StorageCategory(name, directory, max_bytes, ttl_seconds)
+
+    def path_for(self, category: str, filename: str) -> str:
+        """
+        Get the path to store a new file at, creating its shard directory
+
+        Args:
+            category: Category of the file
+            filename: Unique file name
+        """
+        shard = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+        directory = os.path.join(self.categories[category].directory, shard)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+    def record_write(self, category: str, size: int):
+        """Account for a file just written, sweeping the category if it is now over quota"""
+        storage = self.categories[category]
+        with self._lock:
+            storage.bytes_used += size
+            storage.files += 1
+            over_quota = storage.bytes_used > storage.max_bytes
+        if over_quota:
+            self.sweep(category)
+
+    def touch(self, file_path: str):
+        """Mark a file as used, so LRU eviction keeps it longer"""
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+
+    def _scan(self, storage: StorageCategory) -> List[Tuple[float, int, str]]:
+        """List (last use, size, path) of every file in a category"""
+        files = []
+        if not os.path.isdir(storage.directory):
+            return files
+        with os.scandir(storage.directory) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue  # Removed meanwhile
+                        if entry.is_file():
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False  # Removed by another server process
+
+    def sweep(self, category: str) -> Dict[str, int]:
+        """
+        Delete expired files, then least recently used files until the
+        category fits in its quota
+
+        Returns:
+            Number of files evicted for each reason
+        """
+        storage = self.categories[category]
+        with self._lock:
+            start = time.perf_counter()
+            files = sorted(self._scan(storage))
+            expire_before = time.time() - storage.ttl_seconds
+            total = sum(size for _, size, _ in files)
+            evicted = {"ttl": 0, "lru": 0}
+            kept = 0
+            for last_use, size, path in files:
+                if last_use < expire_before:
+                    reason = "ttl"
+                elif total > storage.max_bytes:
+                    reason = "lru"
+                else:
+                    kept += 1
+                    continue
+                if self._remove(path):
+                    evicted[reason] += 1
+                    storage.evicted_bytes += size
+                total -= size
+
+            for reason, count in evicted.items():
+                storage.evicted_files[reason] += count
+            storage.bytes_used = total
+            storage.files = kept
+            storage.sweeps += 1
+            storage.last_sweep_seconds = time.perf_counter() - start
+        if evicted["ttl"] or evicted["lru"]:
+            logger.info("Storage sweep of %s: evicted %d expired and %d least recently used file(s)",
+                        category, evicted["ttl"], evicted["lru"])
+        return evicted
+
+    def sweep_all(self):
+        """Sweep every category"""
+        for category in self.categories:
+            self.sweep(category)
+
+    def stats(self) -> Dict[str, Any]:
+        """Bytes used, quota and eviction counters of each category"""
+        with self._lock:
+            return {
+                storage.name: {
+                    "directory": storage.directory,
+                    "bytes_used": storage.bytes_used,
+                    "max_bytes": storage.max_bytes,
+                    "files": storage.files,
+                    "ttl_seconds": storage.ttl_seconds,
+                    "evicted_files": dict(storage.evicted_files),
+                    "evicted_bytes": storage.evicted_bytes,
+                    "sweeps": storage.sweeps,
+                    "last_sweep_seconds": storage.last_sweep_seconds,
+                }
+                for storage in self.categories.values()
+            }
+
+
+storage = StorageManager()
+storage.add_category("uploads", STORAGE_UPLOADS_DIR, STORAGE_UPLOADS_MAX_BYTES, STORAGE_UPLOADS_TTL_SECONDS)
+storage.add_category("pdfs", STORAGE_PDFS_DIR, STORAGE_PDFS_MAX_BYTES, STORAGE_PDFS_TTL_SECONDS)
+
+
+def _collect_storage():
+    categories = storage.stats()
+    yield ("storage_used_bytes", "gauge", "Bytes stored per category", ["category"],
+           [((name,), stats["bytes_used"]) for name, stats in categories.items()])
+    yield ("storage_quota_bytes", "gauge", "Byte quota per category", ["category"],
+           [((name,), stats["max_bytes"]) for name, stats in categories.items()])
+
+
+metrics.add_collector(_collect_storage)
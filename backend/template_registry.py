@@ -0,0 +1,174 @@
+"""
+Registry of the form templates in templates/*.json.
+
+Templates are parsed and validated once and kept in memory. At most every
+TEMPLATE_RELOAD_INTERVAL seconds the registry compares the modification
+time and size of the template files with what it loaded, and reparses only
+the files that changed, so templates can be edited without restarting the
+server. A file that fails to parse or validate is reported and its previous
+version stays in use.
+
+Form mapping, PDF generation and the /templates endpoint all read from the
+registry. Templates it returns are shared and must not be modified.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+FORM_TEMPLATES_DIR = os.environ.get(
+    "FORM_TEMPLATES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+)
+# Seconds between checks of the template files for changes; 0 checks on every access
+TEMPLATE_RELOAD_INTERVAL = float(os.environ.get("TEMPLATE_RELOAD_INTERVAL", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+def validate_template(template: Any):
+    """
+    Check the structure of a form template
+
+    Raises:
+        ValueError: Describing the first problem found
+    """
+    # Imported here because form_mapping reads its templates from this registry
+    from form_mapping import TRANSFORMS
+    if not isinstance(template, dict):
+        raise ValueError("template must be an object")
+    for key in ("form_type", "title"):
+        if not isinstance(template.get(key), str) or not template[key]:
+            raise ValueError(f"'{key}' must be a non-empty string")
+    fields = template.get("fields")
+    if not isinstance(fields, list) or not fields:
+        raise ValueError("'fields' must be a non-empty list")
+    names = set()
+    for index, field in enumerate(fields):
+        if not isinstance(field, dict):
+            raise ValueError(f"field {index} must be an object")
+        for key in ("name", "label", "type"):
+            if not isinstance(field.get(key), str) or not field[key]:
+                raise ValueError(f"field {index}: '{key}' must be a non-empty string")
+        if field["name"] in names:
+            raise ValueError(f"duplicate field '{field['name']}'")
+        names.add(field["name"])
+        # Checked here rather than when a form is first mapped, so a bad file never replaces a good one
+        transform = field.get("transform")
+        if transform is not None and transform not in TRANSFORMS:
+            raise ValueError(f"field {index}: unknown transform '{transform}'")
+        # Defaults are shared by every filled form, so they must be immutable
+        if isinstance(field.get("default"), (list, dict)):
+            raise ValueError(f"field {index}: 'default' must be a string, number or null")
+        confidence_factor = field.get("confidence_factor", 1.0)
+        if isinstance(confidence_factor, bool) or not isinstance(confidence_factor, (int, float)):
+            raise ValueError(f"field {index}: 'confidence_factor' must be a number")
+    for key in ("instructions", "required_documents"):
+        value = template.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"'{key}' must be a list of strings")
+
+
+class TemplateRegistry:
+    """
+    Parsed and validated form templates, reloaded when their files change
+    """
+
+    def __init__(self, directory: str = FORM_TEMPLATES_DIR, reload_interval: float = TEMPLATE_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        # Per file: (mtime_ns, size) when loaded, form type, template and version
+        self._files: Dict[str, Tuple[Tuple[int, int], str, Dict[str, Any], str]] = {}
+        # Per file that failed to load: (mtime_ns, size), so it is retried only once it changes
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._versions: Dict[str, str] = {}
+        self._etag = ""
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load_file(self, path: str) -> Tuple[str, Dict[str, Any], str]:
+        """Parse and validate one template file, returning its form type, template and version"""
+        with open(path, "rb") as f:
+            content = f.read()
+        template = json.loads(content)
+        validate_template(template)
+        return template["form_type"], template, hashlib.sha256(content).hexdigest()[:16]
+
+    def _refresh(self):
+        """Reload the template files that were added, changed or removed since the last check"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return
+            changed = False
+            seen = set()
+            for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # Removed meanwhile
+                seen.add(path)
+                file_stat = (stat.st_mtime_ns, stat.st_size)
+                loaded = self._files.get(path)
+                if (loaded is not None and loaded[0] == file_stat) or self._failed.get(path) == file_stat:
+                    continue
+                try:
+                    form_type, template, version = self._load_file(path)
+                except (OSError, ValueError) as e:
+                    # json.JSONDecodeError is a ValueError too
+                    logger.error("Invalid form template %s, keeping the previous version: %s", path, e)
+                    self._failed[path] = file_stat
+                    continue
+                self._failed.pop(path, None)
+                self._files[path] = (file_stat, form_type, template, version)
+                changed = True
+                if loaded is not None:
+                    logger.info("Reloaded form template %s", form_type)
+            for path in set(self._files) - seen:
+                del self._files[path]
+                changed = True
+
+            if changed or self._checked_at is None:
+                templates = {}
+                versions = {}
+                for path, (_, form_type, template, version) in sorted(self._files.items()):
+                    if form_type in templates:
+                        logger.warning("Form type %s is defined twice, ignoring %s", form_type, path)
+                        continue
+                    templates[form_type] = template
+                    versions[form_type] = version
+                self._templates = templates
+                self._versions = versions
+                self._etag = hashlib.sha256(
+                    json.dumps(sorted(versions.items())).encode("utf-8")
+                ).hexdigest()[:32]
+            self._checked_at = now
+
+    def get(self, form_type: str) -> Optional[Dict[str, Any]]:
+        """Get the template of a form type, or None if there is none"""
+        self._refresh()
+        return self._templates.get(form_type)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Get every template, by form type"""
+        self._refresh()
+        return dict(self._templates)
+
+    def version(self, form_type: str) -> Optional[str]:
+        """Hash of a template's file contents; changes whenever the template does"""
+        self._refresh()
+        return self._versions.get(form_type)
+
+    def etag(self) -> str:
+        """Hash covering every template, for HTTP caching of the whole set"""
+        self._refresh()
+        return self._etag
+
+
+template_registry = TemplateRegistry()
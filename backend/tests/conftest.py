@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+# Settings read when the server modules are imported: jobs run in-process,
+# nothing is loaded or cached up front and files go to a scratch directory
+_scratch = tempfile.mkdtemp(prefix="form-filling-tests-")
+os.environ.update({
+    "OCR_WORKERS": "0",
+    "WARM_UP_MODELS": "0",
+    "OCR_CACHE_ENABLED": "0",
+    "DOCUMENT_STORE": "memory",
+    "RATE_LIMIT_PER_SECOND": "0",
+    "STORAGE_UPLOADS_DIR": os.path.join(_scratch, "uploads"),
+    "STORAGE_PDFS_DIR": os.path.join(_scratch, "temp"),
+})
@@ -0,0 +1,41 @@
+"""Representative OCR output of the supported documents, shared by the extraction tests"""
+
+DOCUMENTS = {
+    "aadhaar": (
+        "Government of India Unique Identification Authority of India Name: Ravi Kumar Sharma "
+        "DOB: 15-08-1985 Male Father's Name: Mohan Lal Sharma Address: 12, MG Road, Shivaji Nagar, "
+        "Pune, Maharashtra 411005 1234 5678 9012 Aadhaar - Aam Aadmi ka Adhikar"
+    ),
+    "pan": (
+        "INCOME TAX DEPARTMENT GOVT. OF INDIA Permanent Account Number Card ABCDE1234F "
+        "Name RAHUL VERMA Father's Name SURESH VERMA Date of Birth 01/01/1990 Signature"
+    ),
+    "voter": (
+        "ELECTION COMMISSION OF INDIA IDENTITY CARD ABC1234567 Elector's Name: Sita Devi "
+        "Husband's Name: Ram Lal Sex: Female Date of Birth: 12-05-1978 Address: House No 42, "
+        "Sector 15, Noida, Uttar Pradesh 201301"
+    ),
+    "freeform": (
+        "To whom it may concern. This is to certify that the applicant resides at the address "
+        "mentioned below and is known to the undersigned for several years. " * 12
+        + "Applicant Name: Anita Rao Guardian: K Rao Place: Mysore Karnataka 570001 Date 03-03-2001"
+    ),
+    "aadhaar_lines": (
+        "GOVERNMENT OF INDIA\nName: Priya Nair\nDOB: 23/11/1992\nFEMALE\n"
+        "Address: Flat 7, Lake View Apartments, Kakkanad,\nKochi, Kerala 682030\n\n4321 8765 2109\n"
+    ),
+    "voter_lines": (
+        "ELECTION COMMISSION OF INDIA\nXYZ7654321\nName : Arjun Singh\n"
+        "Father's Name : Baldev Singh\nSex : Male\nAge as on 01-01-2020 : 35\n"
+        "Address : Village Rampur, Tehsil Sadar, District Meerut\n"
+    ),
+    "pan_lines": (
+        "INCOME TAX DEPARTMENT\nGOVT. OF INDIA\nPermanent Account Number\nFGHIJ5678K\n"
+        "Name\nMEERA IYER\nFather's Name\nVENKAT IYER\nDate of Birth\n30/06/1988\n"
+    ),
+    "application": (
+        "Application for Income Certificate\nApplicant Name: Deepak Patil\n"
+        "Mother's Name: Sunita Patil\nDate of Birth: 05-09-1979\nGender: M\n"
+        "Permanent Address: 221 B, Station Road, Nashik, Maharashtra 422001\nAnnual Income: 120000\n"
+    ),
+}
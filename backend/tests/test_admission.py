@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import StageLimiter
+
+
+async def hold_slot(admission, release: asyncio.Event):
+    async with admission:
+        await release.wait()
+
+
+def test_cancel_while_waiting_for_a_slot_keeps_queue_count():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrent=1, max_queued=1)
+        release = asyncio.Event()
+        first = asyncio.ensure_future(hold_slot(limiter.admit(), release))
+        await asyncio.sleep(0)
+        second = limiter.admit()
+        waiting = asyncio.ensure_future(hold_slot(second, release))
+        await asyncio.sleep(0)
+        assert second.state == "waiting"
+
+        # The waiter owns its place now; giving it up must not count it twice
+        second.cancel()
+        assert limiter.queued == 1
+        release.set()
+        await asyncio.gather(first, waiting)
+        assert (limiter.running, limiter.queued) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue_once():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrent=1, max_queued=1)
+        release = asyncio.Event()
+        first = asyncio.ensure_future(hold_slot(limiter.admit(), release))
+        await asyncio.sleep(0)
+        second = limiter.admit()
+        waiting = asyncio.ensure_future(hold_slot(second, release))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        second.cancel()
+        assert limiter.queued == 0
+        release.set()
+        await first
+        assert (limiter.running, limiter.queued) == (0, 0)
+
+        # The place is free again
+        async with limiter.admit():
+            assert limiter.running == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_admission_cannot_be_entered():
+    async def scenario():
+        limiter = StageLimiter("test", max_concurrent=1, max_queued=0)
+        admission = limiter.admit()
+        admission.cancel()
+        admission.cancel()
+        assert limiter.queued == 0
+        with pytest.raises(RuntimeError):
+            async with admission:
+                pass
+        assert (limiter.running, limiter.queued) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_refused_with_retry_after():
+    limiter = StageLimiter("test", max_concurrent=1, max_queued=1)
+    limiter.admit_many(2)
+    with pytest.raises(HTTPException) as refused:
+        limiter.admit()
+    assert refused.value.status_code == 503
+    assert int(refused.value.headers["Retry-After"]) >= 1
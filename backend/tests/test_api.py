@@ -0,0 +1,129 @@
+import asyncio
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.requests import ClientDisconnect
+
+import main
+import ocr_utils
+from admission import ClientRateLimiter, StageLimiter
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = StageLimiter("extract", max_concurrent=1, max_queued=0)
+    monkeypatch.setattr(main, "extract_limiter", limiter)
+    return limiter
+
+
+def upload_image(client) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 20), "white").save(buffer, format="PNG")
+    response = client.post("/upload", files={"file": ("card.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 200
+    return response.json()["document_id"]
+
+
+def test_client_over_its_burst_gets_429(client, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", ClientRateLimiter(rate=0.01, burst=2))
+
+    statuses = [client.post("/extract", json={"document_id": "missing"}).status_code for _ in range(3)]
+    limited = client.post("/extract-stream", json={"document_id": "missing"})
+
+    assert statuses == [404, 404, 429]
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    # Only the expensive endpoints are limited
+    assert client.get("/admission/stats").status_code == 200
+
+
+def test_full_extract_queue_gets_503(client, limiter):
+    document_id = upload_image(client)
+    held = limiter.admit()
+    try:
+        response = client.post("/extract", json={"document_id": document_id})
+        stream = client.post("/extract-stream", json={"document_id": document_id})
+    finally:
+        held.cancel()
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert stream.status_code == 503
+    assert "Retry-After" in stream.headers
+    assert limiter.rejected == 2
+    assert (limiter.running, limiter.queued) == (0, 0)
+
+
+def test_failed_submit_gives_its_place_back(client, limiter, monkeypatch):
+    document_id = upload_image(client)
+
+    def refuse(*args, **kwargs):
+        raise RuntimeError("worker pool is shut down")
+
+    monkeypatch.setattr(main.job_queue, "submit", refuse)
+    response = client.post("/extract", json={"document_id": document_id})
+    stream = client.post("/extract-stream", json={"document_id": document_id})
+
+    assert response.status_code == 500
+    assert stream.text.startswith("event: error\n")
+    assert (limiter.running, limiter.queued) == (0, 0)
+    # The place is free again for the next request
+    limiter.admit().cancel()
+
+
+def read_events(response) -> list:
+    events = []
+    for block in response.text.split("\n\n"):
+        if block:
+            event, data = block.split("\n", 1)
+            events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_extract_stream_sends_events_in_stage_order(client, limiter, monkeypatch):
+    def fake_engine(image):
+        return {"text": "Name: Ravi Kumar\nDOB: 15/08/1985\nMale", "confidence": 0.9}
+
+    monkeypatch.setattr(ocr_utils, "OCR_ENGINES", {"fake": fake_engine})
+    document_id = upload_image(client)
+
+    with client.stream("POST", "/extract-stream", json={"document_id": document_id}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        response.read()
+    events = read_events(response)
+    # Each stage's events, with repeats of the same event collapsed
+    stages = [event for i, (event, _) in enumerate(events) if i == 0 or events[i - 1][0] != event]
+
+    assert stages == ["ocr", "text", "entity", "result"]
+    assert events[0][1]["text"].startswith("Name: Ravi Kumar")
+    assert events[-1][1]["document_id"] == document_id
+    assert (limiter.running, limiter.queued) == (0, 0)
+
+
+@pytest.mark.parametrize("spec_version", ["2.0", "2.4"])
+def test_extract_stream_gives_its_place_back_if_the_client_is_gone(client, limiter, spec_version):
+    document_id = upload_image(client)
+
+    async def disconnect():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("Connection reset by peer")
+
+    async def scenario():
+        response = await main.extract_stream(main.ExtractionRequest(document_id=document_id))
+        assert limiter.queued == 1
+        with pytest.raises((OSError, ClientDisconnect)):
+            await response({"type": "http", "asgi": {"spec_version": spec_version}}, disconnect, send)
+
+    asyncio.run(scenario())
+    assert (limiter.running, limiter.queued) == (0, 0)
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from document_store import DocumentStore, MemoryDocumentStore, SQLiteDocumentStore
+
+
+def test_incomplete_store_cannot_be_created():
+    class GetOnlyStore(DocumentStore):
+        def get(self, document_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_factory(request, tmp_path):
+    def make(ttl_seconds):
+        if request.param == "memory":
+            return MemoryDocumentStore(ttl_seconds=ttl_seconds)
+        return SQLiteDocumentStore(os.path.join(tmp_path, "documents.sqlite3"), ttl_seconds=ttl_seconds)
+    return make
+
+
+def test_stats_count_only_documents_get_returns(store_factory):
+    store = store_factory(ttl_seconds=0.2)
+    store.create("old", {"file_path": "old.png"})
+    time.sleep(0.3)
+    store.create("new", {"file_path": "new.png"})
+    assert store.get("old") is None
+    assert store.stats()["documents"] == 1
+
+    assert [record["file_path"] for record in store.purge_expired()] == ["old.png"]
+    assert store.stats()["documents"] == 1
+
+
+def test_sqlite_store_uses_wal(tmp_path):
+    store = SQLiteDocumentStore(os.path.join(tmp_path, "documents.sqlite3"))
+    store.create("doc", {})
+    assert store._connect().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_sqlite_reads_are_not_blocked_by_a_writer(tmp_path):
+    path = os.path.join(tmp_path, "documents.sqlite3")
+    store = SQLiteDocumentStore(path)
+    store.create("doc", {"document_type": "pan"})
+
+    # Another server process in the middle of an update
+    writer = sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        assert SQLiteDocumentStore(path).get("doc") == {"document_type": "pan"}
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+def test_concurrent_sqlite_updates_keep_each_others_fields(tmp_path):
+    path = os.path.join(tmp_path, "documents.sqlite3")
+    SQLiteDocumentStore(path).create("doc", {"file_path": "doc.png"})
+    updates = 50
+
+    def update_fields(prefix: str):
+        # A store of its own, as in a separate worker process
+        store = SQLiteDocumentStore(path)
+        for i in range(updates):
+            assert store.update("doc", **{f"{prefix}_{i}": i})
+
+    threads = [threading.Thread(target=update_fields, args=(prefix,)) for prefix in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = SQLiteDocumentStore(path).get("doc")
+    assert record["file_path"] == "doc.png"
+    for prefix in ("a", "b"):
+        assert all(record[f"{prefix}_{i}"] == i for i in range(updates))
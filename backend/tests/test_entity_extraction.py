@@ -0,0 +1,126 @@
+"""
+Golden outputs of the rule-based extractors on representative documents.
+
+The expected values are what the per-pattern extractors the combined scans
+replaced returned for the same lower-cased text, as extract_entities_from_text
+passes it. A change to a scan that makes a different candidate win shows up
+here.
+"""
+import pytest
+
+import entity_extraction
+from entity_extraction import scan_fields
+from sample_documents import DOCUMENTS
+
+# Entities of each document, as the baseline extractors found them
+GOLDEN = {
+    "aadhaar": {
+        "name": "ravi kumar sharma dob",
+        "dob": "15-08-1985",
+        "gender": "Male",
+        "address": "12, mg road, shivaji nagar, pune, maharashtra 411005 1234 5678 9012 aadhaar - aam aadmi ka adhikar",
+        "aadhaar": "1005 1234 5678",
+        "pan": "",
+        "voter_id": "",
+        "parent_name": "mohan lal sharma address",
+    },
+    "pan": {
+        "name": "rahul verma father",
+        "dob": "01/01/1990",
+        "gender": "",
+        "address": "income tax department govt. of india permanent account number card abcde1234f",
+        "aadhaar": "",
+        "pan": "ABCDE1234F",
+        "voter_id": "",
+        "parent_name": "suresh verma date of birth",
+    },
+    "voter": {
+        "name": "sita devi husband",
+        "dob": "12-05-1978",
+        "gender": "Male",
+        "address": "house no 42, sector 15, noida, uttar pradesh 201301",
+        "aadhaar": "",
+        "pan": "",
+        "voter_id": "ABC1234567",
+        "parent_name": "ram lal sex",
+    },
+    "freeform": {
+        "name": "anita rao guardian",
+        "dob": "03-03-2001",
+        "gender": "",
+        "address": "mysore karnataka 570001 date 03-03-2001",
+        "aadhaar": "",
+        "pan": "",
+        "voter_id": "",
+        "parent_name": "",
+    },
+    "aadhaar_lines": {
+        "name": "priya nair\ndob",
+        "dob": "23/11/1992",
+        "gender": "Female",
+        "address": "flat 7, lake view apartments, kakkanad,",
+        "aadhaar": "4321 8765 2109",
+        "pan": "",
+        "voter_id": "",
+        "parent_name": "",
+    },
+    "voter_lines": {
+        "name": "arjun singh\nfather",
+        "dob": "01-01-2020",
+        "gender": "Male",
+        "address": "village rampur, tehsil sadar, district meerut",
+        "aadhaar": "",
+        "pan": "",
+        "voter_id": "XYZ7654321",
+        "parent_name": "baldev singh\nsex",
+    },
+    "pan_lines": {
+        "name": "meera iyer\nfather",
+        "dob": "30/06/1988",
+        "gender": "",
+        "address": "income tax department govt. of india permanent account number fghij5678k",
+        "aadhaar": "",
+        "pan": "FGHIJ5678K",
+        "voter_id": "",
+        "parent_name": "venkat iyer\ndate of birth",
+    },
+    "application": {
+        "name": "deepak patil\nmother",
+        "dob": "05-09-1979",
+        "gender": "Male",
+        "address": "221 b, station road, nashik, maharashtra 422001",
+        "aadhaar": "",
+        "pan": "",
+        "voter_id": "",
+        "parent_name": "sunita patil\ndate of birth",
+    },
+}
+
+
+EXTRACTORS = {
+    "name": entity_extraction.extract_name,
+    "dob": entity_extraction.extract_date_of_birth,
+    "gender": entity_extraction.extract_gender,
+    "address": entity_extraction.extract_address,
+    "aadhaar": entity_extraction.extract_aadhaar_number,
+    "pan": entity_extraction.extract_pan_number,
+    "voter_id": entity_extraction.extract_voter_id,
+    "parent_name": entity_extraction.extract_parent_name,
+}
+# Extractors that can take the hits of scan_fields instead of scanning again
+SCANNED = ("name", "dob", "aadhaar", "pan", "voter_id", "parent_name")
+
+
+@pytest.mark.parametrize("document", sorted(DOCUMENTS))
+def test_extractors_match_golden_output(document):
+    text = DOCUMENTS[document].lower()
+    extracted = {field: extract(text) for field, extract in EXTRACTORS.items()}
+    assert extracted == GOLDEN[document]
+
+
+@pytest.mark.parametrize("document", sorted(DOCUMENTS))
+def test_shared_scan_gives_the_same_entities(document):
+    text = DOCUMENTS[document].lower()
+    fields = scan_fields(text)
+    for field in SCANNED:
+        assert EXTRACTORS[field](text, fields) == GOLDEN[document][field], field
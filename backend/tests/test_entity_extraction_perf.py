@@ -0,0 +1,125 @@
+"""
+Latency and parity checks of the linear-time extraction fallbacks.
+
+Each fallback replaced a regex that backtracked over the rest of the text
+from every candidate position, which took seconds to minutes on the
+pathological inputs below. They must stay linear: every ~20 KB input has to
+finish under EXTRACTION_CEILING_SECONDS (they take a few milliseconds).
+They must also keep returning what the old regexes did, which is checked
+against those regexes on ordinary text, where they are fast enough to run.
+"""
+import random
+import re
+import time
+
+import pytest
+
+import entity_extraction
+from entity_extraction import (ADDRESS_LABEL_PATTERNS, NAME_TO_ADDRESS_RE, _address_blocks, _labelled_addresses,
+                               _names_after_fields, _names_before_fields, _places_before_postal_codes, scan_fields)
+from sample_documents import DOCUMENTS
+
+SIZE = 20000
+EXTRACTION_CEILING_SECONDS = 0.5
+
+# The regexes the fallbacks replaced
+_FIELD_WORDS = (
+    r'(?:address|father|mother|dob|date|yob|year|gender|sex|age|ward|house|street|locality|city|state|pin|code|post|'
+    r'po|ps|district|village|taluka|tehsil|zone|circle|region|location|ward|building|house|door|flat|floor|'
+    r'apartment|residence|domicile|resident|citizen|id|number|no\.?|\d{4,}|\\n|\\r|\\t|\\v)'
+)
+OLD_ADDRESS_TO_NAME_RE = re.compile(_FIELD_WORDS + r'[\s\S]*?([A-Z][a-zA-Z\s.\-\(\)]{10,})', re.IGNORECASE)
+OLD_ADDRESS_LABEL_RES = [
+    re.compile(label + r'[:\s]+([A-Za-z0-9\s,\.\n\r\-]+?)(?:\n|\r|$)', re.IGNORECASE | re.DOTALL)
+    for label in ('address', 'permanent address', 'current address', 'residential address', 'addr', 'location',
+                  'place')
+]
+OLD_PLACE_THEN_POSTAL_CODE_RE = re.compile(r'([A-Za-z\s,\.\n\r\-]+?)[\s\n]+(\d{6})', re.IGNORECASE | re.DOTALL)
+OLD_ADDRESS_BLOCK_RE = re.compile(
+    r'([A-Za-z0-9\s,.\n\r\-]{30,}?)(?:\n\s*\n|DOB|Date|Gender|Age|Name|Father|Mother|Wife|Husband|Income|Annual|'
+    r'Signature|\d{12}|[A-Z]{3}[0-9]{7})',
+    re.IGNORECASE | re.DOTALL
+)
+
+NOISE_TOKENS = [
+    "name", "Name:", "address", "Address:", "place", "DOB", "date", "father", "po", "no.", "id",
+    "Ravi", "Kumar", "Pune", "sector", "411005", "1234", "123456789012", "ABC1234567",
+    ",", ".", "-", ":", ";", "(", ")", "|", "~", "\n", "\n\n", " ", "   ",
+]
+
+
+def repeat_to(unit: str, size: int = SIZE) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def noise(size: int, seed: int) -> str:
+    """Random OCR-like text built from labels, values and punctuation"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        token = rng.choice(NOISE_TOKENS) + rng.choice(["", " ", " ", "\n"])
+        parts.append(token)
+        length += len(token)
+    return "".join(parts)[:size]
+
+
+def labelled_addresses(text: str) -> list:
+    return [_labelled_addresses(label_re, value_re, text) for label_re, value_re in ADDRESS_LABEL_PATTERNS]
+
+
+def extract_all(text: str):
+    """Run every extractor the way extract_entities_from_text does"""
+    text = text.lower()
+    fields = scan_fields(text)
+    entity_extraction.extract_name(text, fields)
+    entity_extraction.extract_date_of_birth(text, fields)
+    entity_extraction.extract_gender(text)
+    entity_extraction.extract_address(text)
+    entity_extraction.extract_aadhaar_number(text, fields)
+    entity_extraction.extract_pan_number(text, fields)
+    entity_extraction.extract_voter_id(text, fields)
+    entity_extraction.extract_parent_name(text, fields)
+
+
+# Inputs on which each replaced regex backtracked over the rest of the text
+PATHOLOGICAL = [
+    (_names_before_fields, "name labels", repeat_to("Name ")),
+    (_names_before_fields, "names without field", repeat_to("Name Ab ")),
+    (_names_after_fields, "field words", repeat_to("no 12; ")),
+    (_names_after_fields, "short words", repeat_to("po ab; ")),
+    (labelled_addresses, "unterminated values", repeat_to("address ", SIZE - 1) + "#"),
+    (_places_before_postal_codes, "letters", "a" * SIZE),
+    (_places_before_postal_codes, "words", repeat_to("ab ")),
+    (_address_blocks, "letters", "a" * SIZE),
+    (_address_blocks, "blank-free lines", repeat_to("x" + " " * 50 + "\n")),
+    (extract_all, "noise", noise(SIZE, seed=11)),
+    (extract_all, "digits", "1" * SIZE),
+    (extract_all, "newlines", "\n" * SIZE),
+    (extract_all, "parent labels", repeat_to("father name ")),
+]
+
+
+@pytest.mark.parametrize("extract,text", [(extract, text) for extract, _, text in PATHOLOGICAL],
+                         ids=[f"{extract.__name__}-{case}" for extract, case, _ in PATHOLOGICAL])
+def test_pathological_input_stays_under_ceiling(extract, text):
+    start = time.perf_counter()
+    extract(text)
+    assert time.perf_counter() - start < EXTRACTION_CEILING_SECONDS
+
+
+SAMPLES = {}
+for name, document in DOCUMENTS.items():
+    SAMPLES[name] = document
+    SAMPLES[f"{name}-lower"] = document.lower()
+for seed in range(50):
+    SAMPLES[f"noise-{seed}"] = noise(400, seed)
+
+
+@pytest.mark.parametrize("text", SAMPLES.values(), ids=SAMPLES.keys())
+def test_fallbacks_match_the_regexes_they_replaced(text):
+    assert _names_before_fields(text) == NAME_TO_ADDRESS_RE.findall(text)
+    assert _names_after_fields(text) == OLD_ADDRESS_TO_NAME_RE.findall(text)
+    assert labelled_addresses(text) == [regex.findall(text) for regex in OLD_ADDRESS_LABEL_RES]
+    assert list(_places_before_postal_codes(text)) == OLD_PLACE_THEN_POSTAL_CODE_RE.findall(text)
+    assert _address_blocks(text) == OLD_ADDRESS_BLOCK_RE.findall(text)
@@ -0,0 +1,28 @@
+import pytest
+
+from form_mapping import compile_template, map_entities_to_form
+
+
+def make_template(**field):
+    field = {"name": "place", "label": "Place", "type": "text", **field}
+    return {"form_type": "test_form", "title": "Test Form", "fields": [field]}
+
+
+def test_compile_template_rejects_what_the_registry_rejects():
+    with pytest.raises(ValueError, match="unknown transform 'no_such_transform'"):
+        compile_template(make_template(source="address", transform="no_such_transform"))
+    with pytest.raises(ValueError, match="'default' must be"):
+        compile_template(make_template(default=["a"]))
+
+
+def test_compile_template_applies_transform_and_default():
+    plan = compile_template(make_template(source="address", transform="place_from_address", default="-"))
+    assert plan.defaults == {"place": "-"}
+    assert [field.name for field in plan.mapped] == ["place"]
+
+
+def test_map_entities_to_form_fills_template_fields():
+    entities = {"name": {"value": "Ravi Kumar", "confidence": 0.9}}
+    form, confidence = map_entities_to_form(entities, "income_certificate")
+    assert "Ravi Kumar" in form.values()
+    assert max(confidence.values()) > 0
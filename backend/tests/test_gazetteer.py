@@ -0,0 +1,79 @@
+import pytest
+
+from gazetteer import Gazetteer, get_gazetteer
+
+PLACES = [
+    {"name": "Maharashtra", "kind": "state", "state": "Maharashtra"},
+    {"name": "Mumbai", "kind": "city", "district": "Mumbai", "state": "Maharashtra", "aliases": ["Bombay"]},
+    {"name": "Navi Mumbai", "kind": "city", "district": "Thane", "state": "Maharashtra"},
+    {"name": "Pune", "kind": "city", "district": "Pune", "state": "Maharashtra"},
+    {"name": "Delhi", "kind": "state", "state": "Delhi"},
+    {"name": "Delhi", "kind": "city", "district": "New Delhi", "state": "Delhi"},
+]
+PIN_CODES = {
+    "41": {"state": "Maharashtra"},
+    "411": {"district": "Pune", "state": "Maharashtra"},
+    "40": {"state": "Maharashtra"},
+    # Shared by several districts: no answer rather than the state of "40"
+    "401": None,
+    "401107": {"district": "Thane", "state": "Maharashtra"},
+}
+
+
+@pytest.fixture
+def gazetteer():
+    return Gazetteer(PLACES, PIN_CODES)
+
+
+def names(gazetteer, text):
+    return [(text[match.start:match.end], match.place.name) for match in gazetteer.find_places(text)]
+
+
+def test_longest_of_overlapping_names_wins(gazetteer):
+    assert names(gazetteer, "Sector 5, Navi Mumbai 400703") == [("Navi Mumbai", "Navi Mumbai")]
+    assert names(gazetteer, "Andheri, Mumbai") == [("Mumbai", "Mumbai")]
+
+
+def test_names_match_whole_words_only(gazetteer):
+    assert names(gazetteer, "Punekar Road, Pimpri-Pune.") == [("Pune", "Pune")]
+    assert names(gazetteer, "Superpune, mumbai2, xdelhi") == []
+
+
+def test_names_match_ignoring_case_and_by_alias(gazetteer):
+    assert names(gazetteer, "PUNE and old bombay") == [("PUNE", "Pune"), ("bombay", "Mumbai")]
+
+
+def test_multi_word_names_match_across_a_line_break(gazetteer):
+    assert names(gazetteer, "Plot 4, Navi\nMumbai") == [("Navi\nMumbai", "Navi Mumbai")]
+    assert names(gazetteer, "Plot 4, Navi\r\nMumbai") == [("Mumbai", "Mumbai")]
+
+
+def test_most_specific_place_keeps_a_shared_name(gazetteer):
+    assert [match.place.kind for match in gazetteer.find_places("Karol Bagh, Delhi")] == ["city"]
+
+
+def test_pin_lookup_falls_back_to_shorter_prefixes(gazetteer):
+    assert gazetteer.lookup_pin("411005") == {"district": "Pune", "state": "Maharashtra"}
+    assert gazetteer.lookup_pin("418 001") == {"state": "Maharashtra"}
+    assert gazetteer.lookup_pin("999999") is None
+
+
+def test_shared_pin_prefix_stored_as_null_gives_no_answer(gazetteer):
+    assert gazetteer.lookup_pin("401203") is None
+    # A full code listed under the shared prefix is still known
+    assert gazetteer.lookup_pin("401107") == {"district": "Thane", "state": "Maharashtra"}
+
+
+def test_invalid_pin_codes_are_rejected(gazetteer):
+    assert gazetteer.lookup_pin("041100") is None
+    assert gazetteer.lookup_pin("41100") is None
+    assert gazetteer.lookup_pin("41100a") is None
+
+
+def test_bundled_gazetteer_resolves_addresses():
+    gazetteer = get_gazetteer()
+    assert gazetteer.place_from_address("Flat 2, Vashi, Navi Mumbai, Maharashtra 400703") == "Navi Mumbai"
+    assert gazetteer.place_from_address("House 9, Ward 3, 411 005") == "Pune"
+    # 605 is shared by Puducherry and Tamil Nadu, except for listed codes
+    assert gazetteer.lookup_pin("605002") is None
+    assert gazetteer.lookup_pin("605001") == {"district": "Puducherry", "state": "Puducherry"}
@@ -0,0 +1,107 @@
+import pytest
+
+import observability
+from observability import (Counter, Histogram, Metric, MetricsRegistry, buffer_observations,
+                           drain_observations)
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(namespace="test")
+
+
+@pytest.fixture
+def worker_buffer(monkeypatch):
+    """Buffer observations as a worker process does, restoring the server's state afterwards"""
+    monkeypatch.setattr(observability, "_buffer", None)
+    buffer_observations()
+
+
+def samples(registry):
+    return [line for line in registry.render().splitlines() if not line.startswith("#")]
+
+
+def test_metric_without_record_and_lines_cannot_be_created():
+    class Incomplete(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("test_incomplete", "Incomplete metric")
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    histogram = registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "ocr")
+    assert samples(registry) == [
+        'test_latency_seconds_bucket{stage="ocr",le="0.1"} 2',
+        'test_latency_seconds_bucket{stage="ocr",le="1"} 3',
+        'test_latency_seconds_bucket{stage="ocr",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="ocr"} 2.65',
+        'test_latency_seconds_count{stage="ocr"} 4',
+    ]
+
+
+def test_counter_renders_with_and_without_labels(registry):
+    registry.counter("jobs_total", "Jobs").inc()
+    registry.counter("errors_total", "Errors", ["route"]).inc("/extract", amount=2)
+    assert samples(registry) == ['test_jobs_total 1', 'test_errors_total{route="/extract"} 2']
+    assert "# TYPE test_errors_total counter" in registry.render()
+
+
+def test_label_values_are_escaped(registry):
+    registry.counter("requests_total", "Requests", ["path"]).inc('a"b\\c\nd')
+    assert samples(registry) == ['test_requests_total{path="a\\"b\\\\c\\nd"} 1']
+
+
+def test_collectors_are_rendered_and_failures_skipped(registry):
+    def depth():
+        yield ("queue_depth", "gauge", "Queue depth", ["stage"], [(("extract",), 3)])
+
+    def broken():
+        raise RuntimeError("collector failed")
+
+    registry.add_collector(broken)
+    registry.add_collector(depth)
+    assert samples(registry) == ['test_queue_depth{stage="extract"} 3']
+
+
+def test_duplicate_metric_names_are_refused(registry):
+    registry.counter("jobs_total", "Jobs")
+    with pytest.raises(ValueError):
+        registry.counter("jobs_total", "Jobs again")
+
+
+def test_worker_observations_round_trip_to_the_server(registry, worker_buffer):
+    counter = registry.counter("pages_total", "Pages", ["source"])
+    histogram = registry.histogram("ocr_seconds", "OCR time", buckets=(1.0,))
+    counter.inc("ocr")
+    counter.inc("text", amount=3)
+    histogram.observe(0.5)
+
+    # Buffered in the worker, not recorded
+    assert counter.value("ocr") == 0
+    observations = drain_observations()
+    assert observations == [("test_pages_total", ("ocr",), 1.0), ("test_pages_total", ("text",), 3.0),
+                            ("test_ocr_seconds", (), 0.5)]
+    assert drain_observations() == []
+
+    # Merged into the server's metrics; unknown metrics are ignored
+    observability._buffer = None
+    registry.merge(observations + [("test_unknown_total", (), 1.0)])
+    assert counter.value("ocr") == 1
+    assert counter.value("text") == 3
+    assert 'test_ocr_seconds_count 1' in samples(registry)
+
+
+def test_drain_without_buffering_is_empty(monkeypatch):
+    monkeypatch.setattr(observability, "_buffer", None)
+    Counter("test_direct_total", "Direct").inc()
+    assert drain_observations() == []
+
+
+def test_histogram_records_the_sum():
+    histogram = Histogram("test_sizes", "Sizes", buckets=(10,))
+    histogram.observe(4)
+    histogram.observe(20)
+    assert list(histogram.lines())[-2:] == ["test_sizes_sum 24", "test_sizes_count 2"]
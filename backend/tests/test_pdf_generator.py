@@ -0,0 +1,26 @@
+import pypdfium2 as pdfium
+
+from pdf_generator import render_pdf
+
+
+def pdf_text(content: bytes) -> str:
+    document = pdfium.PdfDocument(content)
+    return "\n".join(page.get_textpage().get_text_range() for page in document)
+
+
+def test_markup_characters_in_values_are_rendered_as_text():
+    form_data = {
+        "applicant_name": "Ram <Kumar>",
+        "address": "12 & 14, Lane a<b",
+    }
+    content, _ = render_pdf(form_data, "income_certificate")
+    text = pdf_text(content)
+    assert "Ram <Kumar>" in text
+    assert "12 & 14, Lane a<b" in text
+
+
+def test_markup_characters_in_long_values_are_rendered_as_text():
+    value = "Flat 3 & 4 <rear>, " + "x" * 120
+    content, _ = render_pdf({"address": value}, "ration_card")
+    text = pdf_text(content).replace("\r", "").replace("\n", "")
+    assert "Flat 3 & 4 <rear>," in text
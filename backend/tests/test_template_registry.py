@@ -0,0 +1,26 @@
+import json
+import os
+
+from template_registry import TemplateRegistry
+
+
+def write_template(path, transform):
+    field = {"name": "place", "label": "Place", "type": "text", "source": "address", "transform": transform}
+    with open(path, "w") as f:
+        json.dump({"form_type": "test_form", "title": "Test Form", "fields": [field]}, f)
+
+
+def test_unknown_transform_is_rejected_on_reload(tmp_path):
+    path = os.path.join(tmp_path, "test_form.json")
+    write_template(path, "place_from_address")
+    registry = TemplateRegistry(str(tmp_path), reload_interval=0)
+    loaded = registry.get("test_form")
+    assert loaded["fields"][0]["transform"] == "place_from_address"
+
+    write_template(path, "no_such_transform")
+    assert registry.get("test_form") is loaded
+
+
+def test_template_with_unknown_transform_is_not_loaded(tmp_path):
+    write_template(os.path.join(tmp_path, "test_form.json"), "no_such_transform")
+    assert TemplateRegistry(str(tmp_path), reload_interval=0).get("test_form") is None
@@ -4,6 +4,7 @@ let currentDocumentType = null;
 let extractedEntities = {};
 let currentFormType = null;
 let filledFormData = {};
+let formTemplates = null;
 
 // DOM Elements
 const uploadSection = document.getElementById('upload-section');
@@ -93,6 +94,8 @@ const translations = {
         'upload_failed': 'Upload failed',
         // Extraction messages
         'extracting_information': 'Extracting information...',
+        'reading_document': 'Reading your document',
+        'finding_details': 'Finding your details...',
         'information_extracted_successfully': 'Information extracted successfully',
         'extraction_failed': 'Extraction failed',
         'extraction_error': 'Extraction error',
@@ -180,6 +183,8 @@ const translations = {
         'upload_failed': 'अपलोड विफल रहा',
         // Extraction messages
         'extracting_information': 'जानकारी निकाली जा रही है...',
+        'reading_document': 'आपका दस्तावेज़ पढ़ा जा रहा है',
+        'finding_details': 'आपकी जानकारी खोजी जा रही है...',
         'information_extracted_successfully': 'जानकारी सफलतापूर्वक निकाली गई',
         'extraction_failed': 'निष्कर्षण विफल रहा',
         'extraction_error': 'निष्कर्षण त्रुटि',
@@ -267,6 +272,8 @@ const translations = {
         'upload_failed': 'अपलोड अयशस्वी झाले',
         // Extraction messages
         'extracting_information': 'माहिती काढली जात आहे...',
+        'reading_document': 'तुमचा दस्तऐवज वाचला जात आहे',
+        'finding_details': 'तुमची माहिती शोधली जात आहे...',
         'information_extracted_successfully': 'माहिती यशस्वीरित्या काढली गेली',
         'extraction_failed': 'माहिती काढणे अयशस्वी झाले',
         'extraction_error': 'माहिती काढताना त्रुटी',
@@ -736,6 +743,7 @@ async function handleDocumentUpload() {
 }
 
 // Handle information extraction
+// Results stream in as Server-Sent Events, so each field appears as soon as it is found
 async function handleInformationExtraction() {
     if (!currentDocumentId) {
         showStatus(extractionStatus, translate('no_document_uploaded'), 'error');
@@ -744,8 +752,9 @@ async function handleInformationExtraction() {
     
     try {
         showStatus(extractionStatus, translate('extracting_information'), 'info');
+        extractBtn.disabled = true;
         
-        const response = await fetch('/extract', {
+        const response = await fetch('/extract-stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -756,23 +765,94 @@ async function handleInformationExtraction() {
             })
         });
         
-        const result = await response.json();
-        
-        if (response.ok) {
-            extractedEntities = result.entities;
-            showStatus(extractionStatus, translate('information_extracted_successfully'), 'success');
-            
-            // Display entities
-            displayEntities();
-            
-            // Show review section
-            processingSection.classList.add('hidden');
-            reviewSection.classList.remove('hidden');
-        } else {
+        if (!response.ok) {
+            const result = await response.json();
             showStatus(extractionStatus, `${translate('extraction_failed')}: ${result.detail}`, 'error');
+            return;
+        }
+        
+        extractedEntities = {};
+        entitiesDisplay.innerHTML = '';
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let finished = false;
+        while (!finished) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = parseServerSentEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (event && handleExtractionEvent(event.name, event.data)) {
+                    finished = true;
+                }
+            }
+        }
+        if (!finished) {
+            showStatus(extractionStatus, `${translate('extraction_error')}: connection closed`, 'error');
         }
     } catch (error) {
         showStatus(extractionStatus, `${translate('extraction_error')}: ${error.message}`, 'error');
+    } finally {
+        extractBtn.disabled = false;
+    }
+}
+
+// Parse one Server-Sent Event into its name and JSON data
+function parseServerSentEvent(block) {
+    let name = 'message';
+    const data = [];
+    block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            name = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data.push(line.slice(5).trim());
+        }
+    });
+    return data.length ? { name, data: JSON.parse(data.join('\n')) } : null;
+}
+
+// Update the page for one extraction event; returns true once extraction has ended
+function handleExtractionEvent(name, data) {
+    switch (name) {
+        case 'ocr':
+        case 'page':
+            showStatus(extractionStatus, `${translate('reading_document')}...`, 'info');
+            return false;
+        case 'text':
+            showStatus(extractionStatus, translate('finding_details'), 'info');
+            // Show the review section while fields arrive, but only let the user go on once all are in
+            reviewSection.classList.remove('hidden');
+            editEntitiesBtn.disabled = true;
+            continueBtn.disabled = true;
+            return false;
+        case 'entity':
+            extractedEntities[data.field] = { value: data.value, confidence: data.confidence };
+            entitiesDisplay.appendChild(createEntityItem(data.field, extractedEntities[data.field], 0));
+            return false;
+        case 'result':
+            extractedEntities = data.entities;
+            const count = Object.keys(extractedEntities).length;
+            if (count === 0 || entitiesDisplay.children.length !== count) {
+                displayEntities();
+            }
+            showStatus(extractionStatus, translate('information_extracted_successfully'), 'success');
+            editEntitiesBtn.disabled = false;
+            continueBtn.disabled = false;
+            processingSection.classList.add('hidden');
+            reviewSection.classList.remove('hidden');
+            return true;
+        case 'error':
+            showStatus(extractionStatus, `${translate('extraction_failed')}: ${data.detail}`, 'error');
+            reviewSection.classList.add('hidden');
+            editEntitiesBtn.disabled = false;
+            continueBtn.disabled = false;
+            return true;
+        default:
+            return false;
     }
 }
 
@@ -787,29 +867,33 @@ function displayEntities() {
     
     const entities = Object.entries(extractedEntities);
     entities.forEach(([key, entity], index) => {
-        const entityDiv = document.createElement('div');
-        entityDiv.className = `entity-item ${entity.confidence < 0.8 ? 'low-confidence' : ''}`;
-        entityDiv.style.setProperty('--item-index', index);
-        
-        const label = document.createElement('label');
-        label.textContent = formatEntityLabel(key);
-        
-        const valueDiv = document.createElement('div');
-        valueDiv.className = 'entity-value';
-        valueDiv.textContent = entity.value;
-        
-        const confidenceDiv = document.createElement('div');
-        confidenceDiv.className = 'entity-confidence';
-        confidenceDiv.textContent = `Confidence: ${(entity.confidence * 100).toFixed(1)}%`;
-        
-        entityDiv.appendChild(label);
-        entityDiv.appendChild(valueDiv);
-        entityDiv.appendChild(confidenceDiv);
-        
-        entitiesDisplay.appendChild(entityDiv);
+        entitiesDisplay.appendChild(createEntityItem(key, entity, index));
     });
 }
 
+// Create the display of one extracted entity
+function createEntityItem(key, entity, index) {
+    const entityDiv = document.createElement('div');
+    entityDiv.className = `entity-item ${entity.confidence < 0.8 ? 'low-confidence' : ''}`;
+    entityDiv.style.setProperty('--item-index', index);
+    
+    const label = document.createElement('label');
+    label.textContent = formatEntityLabel(key);
+    
+    const valueDiv = document.createElement('div');
+    valueDiv.className = 'entity-value';
+    valueDiv.textContent = entity.value;
+    
+    const confidenceDiv = document.createElement('div');
+    confidenceDiv.className = 'entity-confidence';
+    confidenceDiv.textContent = `Confidence: ${(entity.confidence * 100).toFixed(1)}%`;
+    
+    entityDiv.appendChild(label);
+    entityDiv.appendChild(valueDiv);
+    entityDiv.appendChild(confidenceDiv);
+    return entityDiv;
+}
+
 // Format entity label for display
 function formatEntityLabel(key) {
     // Use translations if available, otherwise fallback to formatting the key
@@ -945,7 +1029,7 @@ async function selectFormType(formType) {
             fillSection.classList.remove('hidden');
             
             // Populate form fields
-            populateFormFields(formType, filledFormData);
+            await populateFormFields(formType, filledFormData);
         } else {
             alert(`${translate('error')}: ${result.detail}`);
         }
@@ -954,29 +1038,48 @@ async function selectFormType(formType) {
     }
 }
 
+// Get the form templates from the backend. The browser revalidates its
+// cached copy with the ETag, so unchanged templates are not downloaded again.
+async function getFormTemplate(formType) {
+    if (formTemplates === null) {
+        try {
+            const response = await fetch('/templates');
+            formTemplates = response.ok ? await response.json() : {};
+        } catch (error) {
+            formTemplates = {};
+        }
+    }
+    return formTemplates[formType] || null;
+}
+
 // Populate form fields based on form type
-function populateFormFields(formType, data) {
-    // Get form template from backend (in a real app, this would be fetched)
-    // For now, we'll use a simplified approach
-    formTitle.textContent = getFormTitle(formType);
+async function populateFormFields(formType, data) {
+    const template = await getFormTemplate(formType);
+    const templateFields = {};
+    (template ? template.fields : []).forEach(field => {
+        templateFields[field.name] = field;
+    });
+    formTitle.textContent = template ? template.title : 'Government Form';
     
     formFields.innerHTML = '';
     
     // Create form fields based on the form type
     for (const [fieldName, value] of Object.entries(data)) {
+        const field = templateFields[fieldName] || {};
         const fieldDiv = document.createElement('div');
         fieldDiv.className = 'form-field';
         
         // Create label
         const label = document.createElement('label');
-        label.textContent = formatFieldLabel(fieldName);
-        if (isRequiredField(fieldName)) {
+        label.textContent = formatFieldLabel(fieldName, field.label);
+        if (field.required) {
             label.innerHTML += '<span class="required">*</span>';
         }
         
         // Create input/textarea
         let input;
-        if (fieldName.includes('address') || fieldName.includes('reason') || fieldName.includes('remarks')) {
+        if (field.type ? field.type === 'textarea' :
+                (fieldName.includes('address') || fieldName.includes('reason') || fieldName.includes('remarks'))) {
             input = document.createElement('textarea');
         } else {
             input = document.createElement('input');
@@ -993,26 +1096,6 @@ function populateFormFields(formType, data) {
     }
 }
 
-// Format field label for display
-function formatFieldLabel(fieldName) {
-    return fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-}
-
-// Check if field is required
-function isRequiredField(fieldName) {
-    const requiredFields = ['applicant_name', 'person_name', 'head_of_family', 'financial_year', 'annual_income'];
-    return requiredFields.includes(fieldName);
-}
-
-// Get form title based on type
-function getFormTitle(formType) {
-    const titles = {
-        'income_certificate': 'Income Certificate Application',
-        'birth_certificate': 'Birth Certificate Application',
-        'ration_card': 'Ration Card Application'
-    };
-    return titles[formType] || 'Government Form';
-}
 
 // Open voice input modal - REMOVED
 // function openVoiceModal() {
@@ -1173,22 +1256,25 @@ async function generatePdf() {
             },
             body: JSON.stringify({
                 document_id: currentDocumentId,
-                form_type: currentFormType
+                form_type: currentFormType,
+                form_data: formData,
+                stream: true
             })
         });
         
-        const result = await response.json();
-        
         if (response.ok) {
-            // Create a download link for the PDF
-            const downloadUrl = `/${result.pdf_path}`;
+            // The PDF comes back in the response; download it from memory
+            const pdfBlob = await response.blob();
+            const downloadUrl = URL.createObjectURL(pdfBlob);
             const link = document.createElement('a');
             link.href = downloadUrl;
             link.download = `form_${currentFormType}_${new Date().getTime()}.pdf`;
             link.click();
+            setTimeout(() => URL.revokeObjectURL(downloadUrl), 0);
             
             alert(translate('pdf_generated'));
         } else {
+            const result = await response.json();
             alert(`${translate('error')}: ${result.detail}`);
         }
     } catch (error) {
@@ -1212,27 +1298,8 @@ function showStatus(element, message, type) {
     }
 }
 
-// Update the formatFieldLabel function to use translations where appropriate
-function formatFieldLabel(fieldName) {
-    // Use translations if available, otherwise fallback to formatting the field name
-    switch(fieldName) {
-        case 'applicant_name':
-            return translate('applicant_name') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'father_or_husband_name':
-            return translate('father_or_husband_name') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'date_of_birth':
-            return translate('date_of_birth') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'permanent_address':
-            return translate('permanent_address') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'annual_income':
-            return translate('annual_income') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'person_name':
-            return translate('person_name') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'place_of_birth':
-            return translate('place_of_birth') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        case 'head_of_family':
-            return translate('head_of_family') || fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-        default:
-            return fieldName.replace('_', ' ').replace(/\b\w/g, l => l.toUpperCase());
-    }
+// Format field label for display: the translation if there is one, then
+// the template label, then the field name
+function formatFieldLabel(fieldName, templateLabel) {
+    return translate(fieldName) || templateLabel || fieldName.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
 }
\ No newline at end of file